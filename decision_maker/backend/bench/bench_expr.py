@@ -0,0 +1,59 @@
+# backend/bench/bench_expr.py
+"""
+Per-evaluation cost of flow conditions: the original string-splitting parser vs. the compiled
+expressions in flow_expr. Run from backend/:  python bench/bench_expr.py
+"""
+import operator
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flow_expr import compile_expr, eval_expr  # noqa: E402
+
+OPS = {"<=": operator.le, "<": operator.lt, ">=": operator.ge, ">": operator.gt, "==": operator.eq}
+
+
+def legacy_eval_expr(expr, answers):
+    """The pre-compiler evaluator, kept verbatim for comparison."""
+    if not expr:
+        return True
+    expr = str(expr).strip()
+    if expr.startswith("max("):
+        inside = expr[4:expr.index(")")]
+        keys = [k.strip() for k in inside.split(",")]
+        rest = expr[expr.index(")")+1:].strip()
+        op, thresh = rest.split()[0], float(rest.split()[1])
+        val = max(float(answers.get(k, 0)) for k in keys)
+        return OPS[op](val, thresh)
+    raise ValueError("unsupported expr")
+
+
+def per_call_ns(fn, number):
+    best = min(timeit.repeat(fn, number=number, repeat=5))
+    return best / number * 1e9
+
+
+def main(number: int = 100_000):
+    expr = "max(year,month,day) <= 2"
+    answers = {"year": "3", "month": 2, "day": 1}
+    compiled = compile_expr(expr)
+    assert legacy_eval_expr(expr, answers) == compiled(answers)
+
+    rows = [
+        ("legacy parser", per_call_ns(lambda: legacy_eval_expr(expr, answers), number)),
+        ("eval_expr (cached compile)", per_call_ns(lambda: eval_expr(expr, answers), number)),
+        ("precompiled Expr", per_call_ns(lambda: compiled(answers), number)),
+    ]
+    richer = compile_expr('avg(year, month) > 1.5 and day in (1, 2) or not (year == "5")')
+    rows.append(("precompiled, richer expr", per_call_ns(lambda: richer(answers), number)))
+
+    base = rows[0][1]
+    for name, ns in rows:
+        print(f"{name:<28} {ns:8.0f} ns/eval   x{base / ns:4.1f}")
+    return {name: ns for name, ns in rows}
+
+
+if __name__ == "__main__":
+    main()
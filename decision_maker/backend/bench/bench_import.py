@@ -0,0 +1,90 @@
+# backend/bench/bench_import.py
+"""
+Worker cold start: wall time of `import main` in a fresh interpreter, with the compiled-flow
+artifact missing (first start: YAML parse + compile) and present (later starts), plus the
+heaviest imports from `python -X importtime`.
+
+Run from backend/:  python bench/bench_import.py [--runs 5] [--out FILE]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from common import BACKEND_DIR, write_result
+
+PROBE = "import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+
+
+def _env(artifact: str) -> dict:
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "bench")
+    env["FLOWS_ARTIFACT"] = artifact
+    return env
+
+
+def time_import(module: str, env: dict) -> float:
+    out = subprocess.check_output([sys.executable, "-c", PROBE.format(module=module)],
+                                  cwd=BACKEND_DIR, env=env, text=True)
+    return float(out.strip().splitlines()[-1])
+
+
+def top_imports(module: str, env: dict, n: int = 10):
+    """Largest self-time imports (ms) from -X importtime."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = [p.strip() for p in line[len("import time:"):].split("|")]
+        rows.append((int(self_us), int(cum_us), name))
+    rows.sort(reverse=True)
+    return [{"module": name, "self_ms": round(s / 1000, 1), "cumulative_ms": round(c / 1000, 1)}
+            for s, c, name in rows[:n]]
+
+
+def summarize(samples):
+    return {"median_ms": round(statistics.median(samples) * 1000, 1),
+            "min_ms": round(min(samples) * 1000, 1), "runs": len(samples)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--out", help="result file (default: bench/results/import-<git>-<time>.json)")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        artifact = os.path.join(tmp, "flows.pickle")
+        env = _env(artifact)
+        cold = []
+        for _ in range(args.runs):
+            if os.path.exists(artifact):
+                os.remove(artifact)
+            cold.append(time_import("main", env))
+        warm = [time_import("main", env) for _ in range(args.runs)]
+        registry = [time_import("flow_registry", env) for _ in range(args.runs)]
+        no_artifact = _env("")
+        engine = [time_import("flow_engine", no_artifact) for _ in range(args.runs)]
+        results = {
+            "main_no_artifact": summarize(cold),
+            "main_with_artifact": summarize(warm),
+            "flow_registry": summarize(registry),
+            "flow_engine": summarize(engine),
+            "top_imports": top_imports("main", env),
+        }
+
+    for name in ("main_no_artifact", "main_with_artifact", "flow_registry", "flow_engine"):
+        r = results[name]
+        print(f"import {name:<20} median {r['median_ms']:8.1f} ms   min {r['min_ms']:8.1f} ms")
+    print("heaviest imports (self time):")
+    for row in results["top_imports"]:
+        print(f"  {row['module']:<40} {row['self_ms']:8.1f} ms")
+    write_result("import", results, args.out, runs=args.runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# backend/bench/bench_intent.py
+"""
+Helper-vs-answer routing: accuracy and per-message latency of the keyword heuristic, the n-gram
+classifier alone, and the classifier with heuristic fallback below the confidence threshold.
+
+    python bench/bench_intent.py [--eval bench/intent_eval.jsonl] [--threshold 0.65] [--out FILE]
+
+Build an eval set from logged transcripts (the session event log, SQLite or JSON lines):
+
+    python bench/bench_intent.py --from-events events.db --export bench/intent_logged.jsonl
+
+Each logged user message is labelled with the route it took: "question" if the helper answered it,
+"answer" if it went to the validator. Those labels are the router's decisions, not ground truth;
+review the file (low-confidence rows first) before evaluating on it or adding it to INTENT_TRAIN.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+from collections import defaultdict
+
+from common import BACKEND_DIR, write_result
+from intent import ANSWER, QUESTION, QuestionClassifier, heuristic_is_question, load_examples
+
+
+def iter_events(path: str):
+    """(session_id, type, data) in log order, from an events.db or an events.jsonl file."""
+    if path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    ev = json.loads(line)
+                except ValueError:
+                    continue
+                yield ev["session_id"], ev["type"], ev["data"]
+        return
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    for sid, kind, data in db.execute("SELECT session_id, type, data FROM events ORDER BY seq"):
+        yield sid, kind, json.loads(data)
+
+
+def examples_from_events(path: str):
+    """User messages labelled by what the router did with them (helper reply vs. validator verdict)."""
+    pending = {}
+    out = {}
+    for sid, kind, data in iter_events(path):
+        if kind == "user":
+            pending[sid] = data
+            continue
+        msg = pending.pop(sid, None)
+        if msg is None:
+            continue
+        if kind == "assistant" and data.get("kind") == "helper":
+            label = QUESTION
+        elif kind == "verdict":
+            label = ANSWER
+        else:
+            continue
+        key = (" ".join(msg["message"].lower().split()), label)
+        if key in out:
+            out[key]["count"] += 1
+        else:
+            out[key] = {"text": msg["message"], "label": label, "ask": msg.get("ask"), "source": "routed", "count": 1}
+    return list(out.values())
+
+
+def score(predict, texts, labels):
+    tp = fp = fn = tn = 0
+    for text, label in zip(texts, labels):
+        pred, actual = predict(text), label == QUESTION
+        tp += pred and actual
+        fp += pred and not actual
+        fn += actual and not pred
+        tn += not pred and not actual
+    n = len(texts)
+    return {
+        "accuracy": round((tp + tn) / n, 4) if n else None,
+        "question_precision": round(tp / (tp + fp), 4) if tp + fp else None,
+        "question_recall": round(tp / (tp + fn), 4) if tp + fn else None,
+        "answers_sent_to_helper": fp,          # each one a wasted helper call + a retry turn
+        "questions_sent_to_validator": fn,     # each one a wasted validator call
+    }
+
+
+def latency_us(fn, texts, runs: int):
+    samples = []
+    for _ in range(runs):
+        for text in texts:
+            t0 = time.perf_counter()
+            fn(text)
+            samples.append(time.perf_counter() - t0)
+    samples.sort()
+    n = len(samples)
+    return {f"p{int(q * 100)}_us": round(samples[min(n - 1, int(q * n))] * 1e6, 2) for q in (0.5, 0.99)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--eval", default=os.path.join(BACKEND_DIR, "bench", "intent_eval.jsonl"),
+                    help="comma-separated labelled JSONL files")
+    ap.add_argument("--train", default=os.path.join(BACKEND_DIR, "intent_train.jsonl"),
+                    help="comma-separated labelled JSONL files")
+    ap.add_argument("--threshold", type=float, default=0.65)
+    ap.add_argument("--runs", type=int, default=20, help="latency passes over the eval set")
+    ap.add_argument("--from-events", help="build labelled examples from an event log instead of benchmarking")
+    ap.add_argument("--export", help="with --from-events: output JSONL (default: stdout)")
+    ap.add_argument("--out", help="result file (default: bench/results/intent-<git>-<time>.json)")
+    args = ap.parse_args()
+
+    if args.from_events:
+        rows = examples_from_events(args.from_events)
+        clf = QuestionClassifier().fit_files(args.train.split(","))
+        for r in rows:
+            r["model_p_question"] = round(clf.prob(r["text"]), 4)
+        rows.sort(key=lambda r: abs(r["model_p_question"] - 0.5))     # least certain first
+        lines = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rows)
+        if args.export:
+            with open(args.export, "w", encoding="utf-8") as f:
+                f.write(lines)
+            counts = defaultdict(int)
+            for r in rows:
+                counts[r["label"]] += 1
+            print(f"wrote {len(rows)} examples ({dict(counts)}) to {args.export}")
+        else:
+            print(lines, end="")
+        return
+
+    texts, labels = load_examples(args.eval.split(","))
+    t0 = time.perf_counter()
+    clf = QuestionClassifier(threshold=args.threshold).fit_files(args.train.split(","))
+    fit_ms = round((time.perf_counter() - t0) * 1000, 1)
+    model_only = lambda text: clf.prob(text) >= 0.5
+
+    results = {
+        "eval_examples": len(texts),
+        "train_examples": clf.trained_on,
+        "fit_ms": fit_ms,
+        "heuristic": {**score(heuristic_is_question, texts, labels),
+                      **latency_us(heuristic_is_question, texts, args.runs)},
+        "model": {**score(model_only, texts, labels), **latency_us(model_only, texts, args.runs)},
+        "model_with_fallback": {**score(clf.is_question, texts, labels),
+                                **latency_us(clf.is_question, texts, args.runs),
+                                "model_share": round(sum(clf.decide(t)[2] == "model" for t in texts) / len(texts), 4)},
+    }
+    print(f"{len(texts)} eval / {clf.trained_on} train examples, fit {fit_ms} ms, threshold {args.threshold}")
+    for name in ("heuristic", "model", "model_with_fallback"):
+        r = results[name]
+        print(f"  {name:<20} accuracy {r['accuracy']:.3f}  answers->helper {r['answers_sent_to_helper']:>3}  "
+              f"questions->validator {r['questions_sent_to_validator']:>3}  p50 {r['p50_us']:>7} us  p99 {r['p99_us']:>7} us")
+    write_result("intent", results, args.out, threshold=args.threshold, eval=args.eval, train=args.train)
+
+
+if __name__ == "__main__":
+    main()
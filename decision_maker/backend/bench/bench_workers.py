@@ -0,0 +1,157 @@
+# backend/bench/bench_workers.py
+"""
+Throughput vs. worker count for the prefork server (serve.py) with the LLM stubbed out.
+
+    python bench/bench_workers.py --workers 1,2,4 --sessions 64 --concurrency 32
+
+Starts bench/fake_llm.py as its own process (zero latency by default, so the backend's CPU is the
+bottleneck), then for each worker count starts `serve.py --workers N` on a fresh sqlite session
+store and runs the load.py workload against it: scripted /dialogue sessions and a /flow/next burst.
+Reports requests/s per worker count, the speedup over the first count, and the workers' summed RSS
+next to their PSS (proportional set size: pages shared copy-on-write are split between the
+processes that map them, so RSS - PSS is what forking from a warmed-up master saves).
+
+Speedup is capped by the cores the workers actually get: the load generator and the fake LLM each
+take one. On a host with fewer cores than max(--workers) + 2 the curve flattens early.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from common import BACKEND_DIR, write_result
+from flow_engine import load_flows
+from load import _free_port, dialogue_level, flow_next_level, wait_ready
+from scripts import build_scripts
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def start_fake_llm(latency_ms: float, tps: float):
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, "fake_llm.py"), "--port", str(port),
+         "--latency-ms", str(latency_ms), "--tokens-per-sec", str(tps)],
+        stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/")
+            return proc, port
+        except httpx.TransportError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("fake LLM did not start")
+
+
+def start_server(workers: int, llm_port: int, port: int, tmp: str) -> subprocess.Popen:
+    base = f"http://127.0.0.1:{llm_port}/v1"
+    env = dict(os.environ)
+    env.update({"OPENAI_API_KEY": "bench", "OPENAI_BASE_URL": base, "OPENAI_API_BASE": base,
+                "SESSION_BACKEND": "sqlite", "SESSION_DB": os.path.join(tmp, f"sessions-{workers}.db"),
+                "EVENT_LOG_PATH": os.path.join(tmp, f"events-{workers}.db"),
+                "LLM_CACHE_SIZE": "0", "LLM_CACHE_DB": ""})
+    return subprocess.Popen(
+        [sys.executable, "serve.py", "--workers", str(workers), "--port", str(port)],
+        cwd=BACKEND_DIR, env=env)
+
+
+def memory_mb(master_pid: int) -> dict:
+    """Summed RSS and PSS of the master's worker processes (Linux /proc)."""
+    rss = pss = 0
+    try:
+        with open(f"/proc/{master_pid}/task/{master_pid}/children") as f:
+            pids = f.read().split()
+        for pid in pids:
+            with open(f"/proc/{pid}/smaps_rollup") as f:
+                for line in f:
+                    if line.startswith("Rss:"):
+                        rss += int(line.split()[1])
+                    elif line.startswith("Pss:"):
+                        pss += int(line.split()[1])
+    except OSError:
+        return {"workers_rss_mb": None, "workers_pss_mb": None}
+    return {"workers_rss_mb": round(rss / 1024, 1), "workers_pss_mb": round(pss / 1024, 1)}
+
+
+def stop(proc: subprocess.Popen):
+    proc.terminate()
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+async def run_one(workers, llm_port, tmp, flows, args):
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    proc = start_server(workers, llm_port, port, tmp)
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+            health = await wait_ready(client, url, timeout=60)
+            scripts = build_scripts(flows, health.get("tools") or {}, args.sessions, seed=args.seed)
+            await flow_next_level(client, url, flows, args.concurrency, args.concurrency * 4, args.seed)  # warm
+            dialogue = await dialogue_level(client, url, scripts, args.concurrency, False, f"w{workers}")
+            flow_next = await flow_next_level(client, url, flows, args.concurrency, args.flow_next, args.seed)
+            return {"workers": workers, "dialogue": dialogue, "flow_next": flow_next, **memory_mb(proc.pid)}
+    finally:
+        stop(proc)
+
+
+async def run(args):
+    flows = load_flows(os.path.join(BACKEND_DIR, "flows"))
+    fake, llm_port = start_fake_llm(args.latency_ms, args.tokens_per_sec)
+    rows = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for n in args.workers:
+                row = await run_one(n, llm_port, tmp, flows, args)
+                base = rows[0] if rows else row
+                for kind in ("dialogue", "flow_next"):
+                    if base[kind]["rps"] and row[kind]["rps"]:
+                        row[kind]["speedup"] = round(row[kind]["rps"] / base[kind]["rps"], 2)
+                rows.append(row)
+                print(f"workers={n:<3} dialogue {row['dialogue']['rps']:>7} req/s "
+                      f"(x{row['dialogue'].get('speedup')}, p99 {row['dialogue']['p99_ms']} ms, "
+                      f"sessions {row['dialogue']['sessions']}/{args.sessions}) | "
+                      f"flow/next {row['flow_next']['rps']:>8} req/s (x{row['flow_next'].get('speedup')}) | "
+                      f"rss {row['workers_rss_mb']} MB, pss {row['workers_pss_mb']} MB")
+    finally:
+        stop(fake)
+    return {"rows": rows}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", default=None,
+                    help="comma-separated worker counts (default 1,2,4,... up to the CPU count)")
+    ap.add_argument("--sessions", type=int, default=64, help="scripted sessions per worker count")
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--flow-next", type=int, default=2000, help="/flow/next calls per worker count")
+    ap.add_argument("--latency-ms", type=float, default=0, help="fake LLM time to first token")
+    ap.add_argument("--tokens-per-sec", type=float, default=100_000, help="fake LLM streaming rate")
+    ap.add_argument("--timeout", type=float, default=60)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+    if args.workers:
+        args.workers = [int(x) for x in args.workers.split(",")]
+    else:
+        cpus, n, args.workers = os.cpu_count() or 1, 1, []
+        while n <= cpus:
+            args.workers.append(n)
+            n *= 2
+        if args.workers[-1] != cpus:
+            args.workers.append(cpus)
+    results = asyncio.run(run(args))
+    write_result("workers", results, args.out, **{k: v for k, v in vars(args).items() if k != "out"})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# backend/bench/common.py
+"""Shared helpers for the bench scripts: import path, percentiles, RSS, JSON results."""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "bench", "results")
+
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def percentiles(samples: List[float], qs=(0.5, 0.95, 0.99)) -> Dict[str, float]:
+    """Nearest-rank percentiles in ms (samples in seconds)."""
+    if not samples:
+        return {f"p{int(q * 100)}_ms": None for q in qs}
+    xs = sorted(samples)
+    n = len(xs)
+    return {f"p{int(q * 100)}_ms": round(xs[min(n - 1, int(q * n))] * 1000, 2) for q in qs}
+
+
+def rss_mb(pid: Optional[int] = None) -> Optional[float]:
+    """Resident set size from /proc (Linux); None elsewhere."""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+    return None
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def meta() -> Dict[str, Any]:
+    return {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "git": _git_rev(),
+            "python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()}
+
+
+def write_result(kind: str, results: Dict[str, Any], out: Optional[str] = None, **config) -> str:
+    """Write {"kind", "meta", "config", "results"} to `out` (default bench/results/<kind>-<git>-<time>.json)."""
+    m = meta()
+    if not out:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = m["time"].replace(":", "").replace("-", "")
+        out = os.path.join(RESULTS_DIR, f"{kind}-{m['git'] or 'nogit'}-{stamp}.json")
+    with open(out, "w") as f:
+        json.dump({"kind": kind, "meta": m, "config": config, "results": results}, f, indent=2)
+    print(f"wrote {out}")
+    return out
@@ -0,0 +1,58 @@
+# backend/bench/compare.py
+"""
+Compare two bench result files (micro or load) metric by metric.
+
+    python bench/compare.py bench/results/micro-abc123-....json bench/results/micro-def456-....json
+
+Every numeric leaf under "results" is matched by path (load levels by concurrency) and printed
+with the relative change; --threshold flags changes larger than that many percent.
+"""
+import argparse
+import json
+from typing import Any, Dict
+
+
+def flatten(node: Any, prefix: str = "") -> Dict[str, float]:
+    out = {}
+    if isinstance(node, dict):
+        for k, v in node.items():
+            out.update(flatten(v, f"{prefix}.{k}" if prefix else str(k)))
+    elif isinstance(node, list):
+        for i, v in enumerate(node):
+            tag = f"c{v['concurrency']}" if isinstance(v, dict) and "concurrency" in v else str(i)
+            out.update(flatten(v, f"{prefix}[{tag}]"))
+    elif isinstance(node, (int, float)) and not isinstance(node, bool):
+        out[prefix] = float(node)
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("old")
+    ap.add_argument("new")
+    ap.add_argument("--threshold", type=float, default=10.0, help="percent change to flag")
+    args = ap.parse_args()
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    if old.get("kind") != new.get("kind"):
+        raise SystemExit(f"different result kinds: {old.get('kind')} vs {new.get('kind')}")
+
+    print(f"old: {old['meta'].get('git')} {old['meta'].get('time')}")
+    print(f"new: {new['meta'].get('git')} {new['meta'].get('time')}")
+    a, b = flatten(old["results"]), flatten(new["results"])
+    width = max((len(k) for k in a.keys() | b.keys()), default=10)
+    for key in sorted(a.keys() | b.keys()):
+        va, vb = a.get(key), b.get(key)
+        if va is None or vb is None:
+            print(f"{key:<{width}}  {va!s:>12}  {vb!s:>12}")
+            continue
+        change = (vb - va) / va * 100 if va else 0.0
+        flag = "  <--" if abs(change) >= args.threshold else ""
+        print(f"{key:<{width}}  {va:>12.2f}  {vb:>12.2f}  {change:+7.1f}%{flag}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# backend/bench/fake_llm.py
+"""
+Deterministic local stand-in for the OpenAI chat-completions API, for benchmarks and load tests.
+
+    python bench/fake_llm.py --port 8099 --latency-ms 300 --tokens-per-sec 80
+
+Point the backend at it with OPENAI_BASE_URL=http://127.0.0.1:8099/v1 (and OPENAI_API_BASE,
+which langchain-openai reads). Replies depend only on the request, so runs are repeatable:
+  - JSON-mode / validator prompts get a verdict: sufficient unless the answer is under 3 words;
+    multi-question validator prompts read the answer as ";"-separated parts, one per question
+  - axes prompts get a fixed axes list
+  - everything else gets a short canned sentence
+Latency = latency_ms before the first token, then completion tokens at tokens_per_sec
+(streamed as SSE chunks when "stream": true).
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+AXES = {"axes": [
+    {"key": "company_size", "label": "Company size", "aim": "growth vs. stability",
+     "options": ["startup", "mid-size", "enterprise"]},
+    {"key": "work_model", "label": "Work model", "aim": "fit & lifestyle",
+     "options": ["onsite", "hybrid", "remote"]},
+]}
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _last_user_answer(prompt: str) -> str:
+    """Latest USER: line of the validator transcript section."""
+    section = prompt.split("TRANSCRIPT FOR", 1)[-1].split(":", 1)[-1]
+    users = [ln[5:].strip() for ln in section.splitlines() if ln.startswith("USER:")]
+    return users[-1] if users else section.strip()
+
+
+def _verdict(answer: str) -> dict:
+    if len(answer.split()) < 3:
+        return {"status": "insufficient",
+                "followup": "Could you add a timeframe and how you'd know it's done?", "extract": ""}
+    return {"status": "sufficient", "followup": "", "extract": " ".join(answer.split())}
+
+
+def _multi_verdict(prompt: str) -> dict:
+    """Part i of the answer (split on ';') answers question i; questions without a part stay open."""
+    qids = [ln.split(":", 1)[1].strip() for ln in prompt.splitlines() if ln.startswith("QUESTION_ID:")]
+    parts = [p.strip() for p in _last_user_answer(prompt).split(";")]
+    return {"answers": {qid: _verdict(parts[i] if i < len(parts) else "") for i, qid in enumerate(qids)}}
+
+
+def reply_for(body: dict) -> str:
+    msgs = body.get("messages") or []
+    system = " ".join(str(m.get("content", "")) for m in msgs if m.get("role") == "system")
+    prompt = str(msgs[-1].get("content", "")) if msgs else ""
+
+    if "DECISION AXES" in system:
+        return json.dumps(AXES)
+    if (body.get("response_format") or {}).get("type") == "json_object" or "validator" in system:
+        if "CURRENT QUESTION_ID:" in prompt:
+            return json.dumps(_multi_verdict(prompt))
+        return json.dumps(_verdict(_last_user_answer(prompt)))
+    digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:6]
+    return (f"Imagine the scenario in which this goes well ({digest}). "
+            "That might look like a clear, checkable result. Would you be okay with that?")
+
+
+class FakeLLM:
+    def __init__(self, latency_ms: float = 200, tokens_per_sec: float = 100):
+        self.latency = latency_ms / 1000
+        self.tokens_per_sec = tokens_per_sec
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with fake._lock:
+                    fake.requests += 1
+                content = reply_for(body)
+                prompt_tokens = sum(_tokens(str(m.get("content", ""))) for m in body.get("messages") or [])
+                completion_tokens = _tokens(content)
+                time.sleep(fake.latency)
+                if body.get("stream"):
+                    self._stream(body, content, prompt_tokens, completion_tokens)
+                else:
+                    time.sleep(completion_tokens / fake.tokens_per_sec)
+                    self._json(body, content, prompt_tokens, completion_tokens)
+
+            def _base(self, body):
+                return {"id": "chatcmpl-fake", "created": int(time.time()), "model": body.get("model", "fake")}
+
+            def _json(self, body, content, prompt_tokens, completion_tokens):
+                data = json.dumps({
+                    **self._base(body),
+                    "object": "chat.completion",
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": content}}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                              "total_tokens": prompt_tokens + completion_tokens},
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, body, content, prompt_tokens, completion_tokens):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                words = content.split(" ")
+                delay = completion_tokens / fake.tokens_per_sec / max(1, len(words))
+                for i, w in enumerate(words):
+                    chunk = {**self._base(body), "object": "chat.completion.chunk",
+                             "choices": [{"index": 0, "finish_reason": None,
+                                          "delta": {"content": w if i == 0 else " " + w}}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    time.sleep(delay)
+                last = {**self._base(body), "object": "chat.completion.chunk",
+                        "choices": [{"index": 0, "finish_reason": "stop", "delta": {}}]}
+                self.wfile.write(f"data: {json.dumps(last)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+    def serve(self, port: int = 0) -> ThreadingHTTPServer:
+        """Start in a daemon thread; returns the server (server.server_port has the bound port)."""
+        server = ThreadingHTTPServer(("127.0.0.1", port), self.handler())
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--port", type=int, default=8099)
+    ap.add_argument("--latency-ms", type=float, default=200)
+    ap.add_argument("--tokens-per-sec", type=float, default=100)
+    args = ap.parse_args()
+    server = FakeLLM(args.latency_ms, args.tokens_per_sec).serve(args.port)
+    print(f"fake LLM on http://127.0.0.1:{server.server_port}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+# backend/bench/load.py
+"""
+Load test for /dialogue and /flow/next against the local fake LLM.
+
+    python bench/load.py --levels 1,4,16,64 --sessions 64 --latency-ms 200
+
+Starts bench/fake_llm.py in-process and the backend (uvicorn main:app) as a subprocess pointed at
+it, then for each concurrency level runs scripted sessions (bench/scripts.py) and a burst of
+stateless /flow/next calls. Reports per level: throughput, latency percentiles, errors and the
+server's RSS before/after; plus the server-side per-stage latency from /health.
+Pass --url to load an already running backend instead (memory then comes from --pid, if given).
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+from common import BACKEND_DIR, percentiles, rss_mb, write_result
+from fake_llm import FakeLLM
+from flow_engine import load_flows
+from scripts import answer_for, build_scripts
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_backend(llm_port: int, port: int, extra_env=None) -> subprocess.Popen:
+    env = dict(os.environ)
+    base = f"http://127.0.0.1:{llm_port}/v1"
+    env.update({"OPENAI_API_KEY": "bench", "OPENAI_BASE_URL": base, "OPENAI_API_BASE": base})
+    env.update(extra_env or {})
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env)
+
+
+async def wait_ready(client: httpx.AsyncClient, url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            r = await client.get(url + "/health")
+            if r.status_code == 200:
+                return r.json()
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"backend at {url} not ready after {timeout}s")
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = []
+        self.errors = {}
+        self.busy = 0
+
+    def add(self, dt: float, status: int):
+        if status == 200:
+            self.latencies.append(dt)
+        elif status == 429:
+            self.busy += 1
+        else:
+            self.errors[str(status)] = self.errors.get(str(status), 0) + 1
+
+    def summary(self, elapsed: float) -> dict:
+        n = len(self.latencies)
+        return {"requests": n, "rps": round(n / elapsed, 2) if elapsed else None,
+                **percentiles(self.latencies), "busy_429": self.busy, "errors": self.errors}
+
+
+async def run_session(client, url, script, sid, rec: Recorder, stream: bool):
+    path = "/dialogue/stream" if stream else "/dialogue"
+    for msg in script["messages"]:
+        body = {"session_id": sid, "message": msg, "tool": script["tool"]}
+        t0 = time.perf_counter()
+        try:
+            r = await client.post(url + path, json=body)
+            status = r.status_code
+            if stream and status == 200 and '"type": "error"' in r.text:
+                status = 429
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        rec.add(time.perf_counter() - t0, status)
+        if status != 200:
+            return False
+    return True
+
+
+async def dialogue_level(client, url, scripts, concurrency, stream, level_tag):
+    rec = Recorder()
+    queue = asyncio.Queue()
+    for i, s in enumerate(scripts):
+        queue.put_nowait((i, s))
+    completed = 0
+
+    async def worker():
+        nonlocal completed
+        while True:
+            try:
+                i, s = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            if await run_session(client, url, s, f"bench-{level_tag}-{i}", rec, stream):
+                completed += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    return {**rec.summary(elapsed), "sessions": completed,
+            "sessions_per_s": round(completed / elapsed, 2), "elapsed_s": round(elapsed, 2)}
+
+
+async def flow_next_level(client, url, flows, concurrency, n, seed):
+    rng = random.Random(seed)
+    bodies = []
+    for _ in range(n):
+        fid = rng.choice(sorted(flows))
+        flow = flows[fid]
+        answers = {q.id: answer_for(q.type, rng) for node in flow.nodes.values() for q in node.asks
+                   if rng.random() < 0.7}
+        bodies.append({"flow_id": fid, "answers": answers})
+    rec = Recorder()
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(body):
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                status = (await client.post(url + "/flow/next", json=body)).status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            rec.add(time.perf_counter() - t0, status)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(b) for b in bodies))
+    return rec.summary(time.perf_counter() - t0)
+
+
+async def run(args):
+    fake = fake_server = proc = None
+    url, pid = args.url, args.pid
+    if not url:
+        fake = FakeLLM(args.latency_ms, args.tokens_per_sec)
+        fake_server = fake.serve()
+        port = _free_port()
+        env = {"LLM_CACHE_SIZE": "0", "LLM_CACHE_DB": ""} if args.no_cache else {}
+        proc = start_backend(fake_server.server_port, port, env)
+        url, pid = f"http://127.0.0.1:{port}", proc.pid
+
+    limits = httpx.Limits(max_connections=max(args.levels) * 2, max_keepalive_connections=max(args.levels))
+    try:
+        async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+            health = await wait_ready(client, url)
+            flows = load_flows(os.path.join(BACKEND_DIR, "flows"))
+            tools = health.get("tools") or {}
+            scripts = build_scripts(flows, tools, args.sessions, seed=args.seed,
+                                    only=args.flows.split(",") if args.flows else None)
+
+            levels = []
+            for c in args.levels:
+                before = rss_mb(pid) if pid else None
+                dialogue = await dialogue_level(client, url, scripts, c, args.stream, c)
+                flow_next = await flow_next_level(client, url, flows, c, args.flow_next, args.seed + c)
+                after = rss_mb(pid) if pid else None
+                levels.append({"concurrency": c, "dialogue": dialogue, "flow_next": flow_next,
+                               "rss_mb_before": before, "rss_mb_after": after})
+                print(f"c={c:<4} dialogue {dialogue['rps']:>7} req/s  p50 {dialogue['p50_ms']} ms  "
+                      f"p99 {dialogue['p99_ms']} ms  sessions {dialogue['sessions']}/{len(scripts)} | "
+                      f"flow/next {flow_next['rps']:>8} req/s  p99 {flow_next['p99_ms']} ms | "
+                      f"rss {before} -> {after} MB")
+
+            health = (await client.get(url + "/health")).json()
+            return {"levels": levels, "server_stages": health.get("latency"),
+                    "server_tokens": health.get("tokens"),
+                    "fake_llm_requests": fake.requests if fake else None}
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        if fake_server is not None:
+            fake_server.shutdown()
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--levels", default="1,4,16", help="comma-separated concurrency levels")
+    ap.add_argument("--sessions", type=int, default=32, help="scripted sessions per level")
+    ap.add_argument("--flow-next", type=int, default=500, help="/flow/next calls per level")
+    ap.add_argument("--flows", help="comma-separated flow ids to script (default: all)")
+    ap.add_argument("--stream", action="store_true", help="use /dialogue/stream")
+    ap.add_argument("--no-cache", action="store_true", help="disable the response cache in the started backend")
+    ap.add_argument("--latency-ms", type=float, default=200, help="fake LLM time to first token")
+    ap.add_argument("--tokens-per-sec", type=float, default=100, help="fake LLM completion speed")
+    ap.add_argument("--url", help="load an already running backend instead of starting one")
+    ap.add_argument("--pid", type=int, help="with --url: server pid for RSS readings")
+    ap.add_argument("--timeout", type=float, default=60)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", help="result file (default: bench/results/load-<git>-<time>.json)")
+    args = ap.parse_args()
+    args.levels = [int(x) for x in args.levels.split(",")]
+
+    results = asyncio.run(run(args))
+    config = {k: v for k, v in vars(args).items() if k not in ("out", "pid")}
+    write_result("load", results, args.out, **config)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# backend/bench/micro.py
+"""
+Micro-benchmarks for the flow layer (no network): load_flows, next_node per flow, eval_expr,
+prompt rendering.
+Run from backend/:  python bench/micro.py [--out FILE]   -> JSON in bench/results/
+"""
+import argparse
+import os
+import random
+import time
+import timeit
+
+from common import BACKEND_DIR, write_result
+import bench_expr
+from flow_engine import load_flows, next_node
+from scripts import answer_for
+
+
+def bench_load_flows(flows_dir: str, repeat: int = 5):
+    best = min(timeit.repeat(lambda: load_flows(flows_dir), number=1, repeat=repeat))
+    return {"ms": round(best * 1000, 3), "flows": len(load_flows(flows_dir))}
+
+
+def _answer_sets(flow, rng, n):
+    """Complete answer sets for every ask in the flow, so next_node runs its routing."""
+    asks = [(q.id, q.type) for node in flow.nodes.values() for q in node.asks]
+    yesno = [nid for nid, node in flow.nodes.items() if node.kind == "yesno"]
+    out = []
+    for _ in range(n):
+        answers = {qid: answer_for(t, rng) for qid, t in asks}
+        answers.update({nid: rng.choice(["yes", "no"]) for nid in yesno})
+        out.append(answers)
+    return out
+
+
+def bench_next_node(flows, number: int = 20_000, seed: int = 0):
+    """ns per next_node call on each flow's start node (asks answered -> routing path)."""
+    rng = random.Random(seed)
+    results = {}
+    for fid, flow in sorted(flows.items()):
+        sets = _answer_sets(flow, rng, 64)
+        start = flow.start.id
+
+        def run():
+            for answers in sets:
+                next_node(flow, start, answers)
+
+        loops = max(1, number // len(sets))
+        best = min(timeit.repeat(run, number=loops, repeat=5))
+        results[fid] = {"ns_per_call": round(best / (loops * len(sets)) * 1e9, 1)}
+    return results
+
+
+def bench_render(flows, number: int = 20_000):
+    """ns per prompt render for every templated ask (compiled template, as the app renders them)."""
+    items = [q for flow in flows.values() for node in flow.nodes.values() for q in node.asks if q.template.fields]
+    if not items:
+        return {}
+    ctxs = [{"axis": f"axis {i}", "persona": ""} for i in range(8)]
+
+    def run():
+        for ctx in ctxs:
+            for q in items:
+                q.template.render(ctx)
+
+    calls = len(ctxs) * len(items)
+    loops = max(1, number // calls)
+    best = min(timeit.repeat(run, number=loops, repeat=5))
+    return {"templates": len(items), "template": {"ns_per_call": round(best / (loops * calls) * 1e9, 1)}}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--out", help="result file (default: bench/results/micro-<git>-<time>.json)")
+    ap.add_argument("--number", type=int, default=20_000, help="calls per timing for next_node / eval_expr")
+    args = ap.parse_args()
+
+    flows_dir = os.path.join(BACKEND_DIR, "flows")
+    t0 = time.perf_counter()
+    results = {
+        "load_flows": bench_load_flows(flows_dir),
+        "next_node": bench_next_node(load_flows(flows_dir), args.number),
+        "render": bench_render(load_flows(flows_dir), args.number),
+        "eval_expr": {name: {"ns_per_call": round(ns, 1)}
+                      for name, ns in bench_expr.main(args.number).items()},
+    }
+    print(f"load_flows: {results['load_flows']['ms']} ms for {results['load_flows']['flows']} flows")
+    for fid, r in results["next_node"].items():
+        print(f"next_node {fid:<22} {r['ns_per_call']:8.0f} ns/call")
+    for name in ("template", "cache_hit"):
+        if name in results["render"]:
+            print(f"render {name:<25} {results['render'][name]['ns_per_call']:8.0f} ns/call")
+    print(f"({time.perf_counter() - t0:.1f}s)")
+    write_result("micro", results, args.out, number=args.number)
+
+
+if __name__ == "__main__":
+    main()
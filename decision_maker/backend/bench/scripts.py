@@ -0,0 +1,68 @@
+# backend/bench/scripts.py
+"""
+Scripted multi-turn sessions built from the YAML flows, for load tests.
+
+A script is the list of user messages one session sends to /dialogue: "__init__", then for each
+ask the flow reaches (walked with next_node exactly as main._dialogue_events does) an optional
+clarifying question (helper path), an optional too-short answer (follow-up path) and a final
+answer that passes. Scripts are reproducible from the seed.
+"""
+import random
+from typing import Dict, List, Optional
+
+from flow_engine import FlowGraph, next_node
+
+CLARIFY = ["what do you mean by that?", "can you give an example?", "how specific should this be?"]
+TOO_SHORT = ["a job", "not yet", "maybe"]
+# with a timeframe + evidence the goal passes prevalidation locally; the rest reaches the validator
+SUFFICIENT_TEXT = [
+    "Get an AI engineering job by Dec 1, proven by a signed offer letter",
+    "Ship a live demo of the planner this quarter, proven by a public link",
+    "I would like to settle which team to join, weighing growth against stability and commute",
+    "Reduce weekly stress noticeably while keeping the current role and the side project going",
+]
+
+
+def answer_for(ask_type: str, rng: random.Random) -> str:
+    if ask_type == "scale_1_5":
+        return str(rng.randint(1, 5))
+    if ask_type == "yesno":
+        return rng.choice(["yes", "no"])
+    return rng.choice(SUFFICIENT_TEXT)
+
+
+def build_script(flow: FlowGraph, rng: random.Random, p_clarify: float = 0.2,
+                 p_short: float = 0.2, max_turns: int = 50) -> List[str]:
+    messages = ["__init__"]
+    answers: Dict[str, str] = {}
+    step = next_node(flow, flow.start.id, answers)
+    while "ask" in step and len(messages) < max_turns:
+        ask = step["ask"]
+        if rng.random() < p_clarify:
+            messages.append(rng.choice(CLARIFY))
+        if ask.get("type", "text") == "text" and rng.random() < p_short:
+            messages.append(rng.choice(TOO_SHORT))
+        value = answer_for(ask.get("type", "text"), rng)
+        messages.append(value)
+        answers[step["awaiting"]] = value
+
+        node_id = step["node_id"]
+        step = next_node(flow, node_id, answers)
+        while "goto" in step:
+            node_id = step["goto"]
+            step = next_node(flow, node_id, answers)
+    return messages
+
+
+def build_scripts(flows: Dict[str, FlowGraph], tools: Dict[str, str], n: int, seed: int = 0,
+                  only: Optional[List[str]] = None) -> List[Dict[str, object]]:
+    """n sessions spread round-robin over the flows -> [{"tool", "flow_id", "messages"}]."""
+    rng = random.Random(seed)
+    flow_to_tool = {}
+    for tool, fid in tools.items():
+        flow_to_tool.setdefault(fid, tool)
+    ids = sorted(fid for fid in flows if fid in flow_to_tool and (not only or fid in only))
+    if not ids:
+        raise ValueError("no flows with a tool mapping to script")
+    return [{"tool": flow_to_tool[ids[i % len(ids)]], "flow_id": ids[i % len(ids)],
+             "messages": build_script(flows[ids[i % len(ids)]], rng)} for i in range(n)]
@@ -0,0 +1,424 @@
+# backend/event_log.py
+"""
+Append-only log of dialogue events per session, for crash recovery and session history.
+
+append() only puts the event on an in-memory queue; a writer thread drains the queue and commits
+everything waiting in one transaction (SQLite) or one write + fsync (JSON lines file), so a turn
+never waits on disk and a burst of turns costs one commit. When the queue is full events are
+dropped and counted rather than blocking the request.
+
+Every `snapshot_every` events a session's full state is logged as a "snapshot" event, so replay
+starts from the latest snapshot (or "init") instead of the beginning of the session.
+
+Events older than `retention` seconds are pruned by the writer thread every `prune_every` seconds
+(SQLite); a session idle past the retention can no longer be replayed or recovered.
+
+Event types and their effect on the session state (see apply_event):
+    init      {flow_id, flow_version, node_id, awaiting, context}   starts a fresh session
+    context   {values}                                     prompt placeholder values ({axis}, ...)
+    user      {ask, message}                               user line for the current ask
+    assistant {ask, content, kind}                         helper reply / validator followup
+    verdict   {ask, status, source, ...}                   history only
+    answer    {values, accepted}                           answers set; accepted resets the field chat
+    route     {node_id, awaiting, flow_version}            position in the flow
+    end       {recommendation}                             flow finished; not recoverable
+    snapshot  {state}                                      full state at that point
+"""
+import copy
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+from session_store import new_session
+
+CHECKPOINTS = ("init", "snapshot")
+_STOP = object()
+
+
+def apply_event(state: Optional[Dict[str, Any]], ev: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """State after `ev`; None until the first init/snapshot."""
+    kind, data = ev["type"], ev["data"]
+    if kind == "snapshot":
+        return copy.deepcopy(data["state"])
+    if kind == "init":
+        state = new_session()
+        state.update({k: data.get(k) for k in ("flow_id", "flow_version", "node_id", "awaiting")})
+        state["context"] = dict(data.get("context") or {})
+        return state
+    if state is None:
+        return None
+    if kind == "user":
+        state["field_chat"].append({"role": "user", "content": data["message"]})
+    elif kind == "assistant":
+        chat = state["field_chat"]
+        if data.get("kind") == "helper" and chat and chat[-1]["role"] == "user":
+            chat[-1]["kind"] = "question"
+        chat.append({"role": "assistant", "content": data["content"]})
+    elif kind == "answer":
+        state["answers"].update(data["values"])
+        if data.get("accepted"):
+            state["field_chat"] = []
+            state["field_summary"] = []
+    elif kind == "context":
+        state["context"] = dict(data["values"])
+    elif kind == "route":
+        state["node_id"] = data["node_id"]
+        state["awaiting"] = data.get("awaiting")
+        if data.get("flow_version"):
+            state["flow_version"] = data["flow_version"]
+    elif kind == "end":
+        state["awaiting"] = None
+        state["ended"] = True
+    return state
+
+
+def replay(events: Iterable[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    state = None
+    for ev in events:
+        state = apply_event(state, ev)
+    return state
+
+
+class EventLog:
+    """
+    Base class: queue + group-commit writer thread. Backends implement _commit(batch) and
+    read(session_id, after, upto); events come back as {seq, ts, session_id, type, data}.
+    """
+
+    def __init__(self, batch_size: int = 256, linger: float = 0.005, max_queue: int = 10_000,
+                 snapshot_every: int = 20, max_tracked: int = 50_000,
+                 retention: Optional[float] = None, prune_every: float = 60.0):
+        self.batch_size = batch_size
+        self.retention = retention
+        self.prune_every = prune_every
+        self.linger = linger
+        self.snapshot_every = snapshot_every
+        self.max_tracked = max_tracked
+        self._q: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._since: "OrderedDict[str, int]" = OrderedDict()    # session -> events since checkpoint
+        self._lock = threading.Lock()
+        self._written_cv = threading.Condition()
+        self.appended = 0
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.failed = 0
+        self.snapshots = 0
+        self.recovered = 0
+        self.pruned = 0
+        self._start_writer()
+
+    def _start_writer(self):
+        self._thread = threading.Thread(target=self._run, name="event-log-writer", daemon=True)
+        self._thread.start()
+
+    def after_fork(self):
+        """In a forked worker (serve.py): the writer thread and its locks did not survive the fork."""
+        self._q = queue.Queue(maxsize=self._q.maxsize)
+        self._lock = threading.Lock()
+        self._written_cv = threading.Condition()
+        self.appended = self.written = self.batches = self.dropped = self.failed = 0
+        self.snapshots = self.recovered = self.pruned = 0
+        self._start_writer()
+
+    # ---------------- writing (request path) ----------------
+    def append(self, session_id: str, event_type: str, **data):
+        ev = {"ts": time.time(), "session_id": session_id, "type": event_type, "data": data}
+        try:
+            self._q.put_nowait(ev)
+        except queue.Full:
+            self.dropped += 1
+            return
+        with self._lock:
+            self.appended += 1
+            if event_type == "end":
+                self._since.pop(session_id, None)
+                return
+            self._since[session_id] = 0 if event_type in CHECKPOINTS else self._since.get(session_id, 0) + 1
+            self._since.move_to_end(session_id)
+            while len(self._since) > self.max_tracked:
+                self._since.popitem(last=False)
+
+    def checkpoint(self, session_id: str, sess: Dict[str, Any]):
+        """Log a snapshot of `sess` once enough events piled up since the last one."""
+        if self._since.get(session_id, 0) < self.snapshot_every:
+            return
+        self.snapshots += 1
+        self.append(session_id, "snapshot", state=copy.deepcopy(sess))
+
+    # ---------------- writer thread ----------------
+    def _run(self):
+        stop = False
+        next_prune = 0.0
+        while not stop:
+            if self.retention and time.monotonic() >= next_prune:
+                next_prune = time.monotonic() + self.prune_every
+                try:
+                    self.pruned += self._prune(time.time() - self.retention)
+                except Exception as e:
+                    print("EVENT_LOG_PRUNE_FAIL:", e)
+            first = self._q.get()
+            if first is _STOP:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.linger
+            while len(batch) < self.batch_size:
+                try:
+                    ev = self._q.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if ev is _STOP:
+                    stop = True
+                    break
+                batch.append(ev)
+            try:
+                self._commit(batch)
+                self.batches += 1
+            except Exception as e:
+                self.failed += len(batch)
+                print("EVENT_LOG_WRITE_FAIL:", e)
+            with self._written_cv:
+                self.written += len(batch)
+                self._written_cv.notify_all()
+
+    def _commit(self, batch: List[Dict[str, Any]]):
+        raise NotImplementedError
+
+    def _prune(self, cutoff: float) -> int:
+        """Delete events logged before `cutoff`; returns how many. Backends that cannot prune keep all."""
+        return 0
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until everything appended so far is committed."""
+        target = self.appended
+        with self._written_cv:
+            return self._written_cv.wait_for(lambda: self.written >= target, timeout)
+
+    def close(self, timeout: float = 5.0):
+        if self._thread.is_alive():
+            self._q.put(_STOP)
+            self._thread.join(timeout)
+
+    # ---------------- reading ----------------
+    def read(self, session_id: str, after: int = 0, upto: Optional[int] = None) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def read_from_checkpoint(self, session_id: str, upto: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Events from the latest init/snapshot at or before `upto` ([] if there is none)."""
+        events = self.read(session_id, upto=upto)
+        for i in range(len(events) - 1, -1, -1):
+            if events[i]["type"] in CHECKPOINTS:
+                return events[i:]
+        return []
+
+    def replay(self, session_id: str, upto: Optional[int] = None) -> Dict[str, Any]:
+        """Rebuild the session state from its latest checkpoint (as of `upto`, default: now)."""
+        if self.written < self.appended:
+            self.flush(1.0)
+        events = self.read_from_checkpoint(session_id, upto)
+        return {"state": replay(events), "seq": events[-1]["seq"] if events else None,
+                "from_seq": events[0]["seq"] if events else None, "events_applied": len(events),
+                "last_ts": events[-1]["ts"] if events else None}
+
+    def recover(self, session_id: str, max_age: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        State of an unfinished session missing from the session store, or None. Blocking (may wait
+        for the writer, then reads the database): call it off the event loop.
+        """
+        r = self.replay(session_id)
+        state = r["state"]
+        if state is None or state.get("ended") or not state.get("flow_id"):
+            return None
+        if max_age and time.time() - r["last_ts"] > max_age:
+            return None     # idle past the store's TTL: expired, not lost
+        self.recovered += 1
+        return state
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self).__name__,
+            "appended": self.appended,
+            "written": self.written,
+            "queued": self._q.qsize(),
+            "batches": self.batches,
+            "avg_batch": round(self.written / self.batches, 2) if self.batches else 0.0,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "snapshots": self.snapshots,
+            "recovered": self.recovered,
+            "pruned": self.pruned,
+        }
+
+
+class SqliteEventLog(EventLog):
+    """Events in one SQLite table; several workers on one host can share the database file."""
+
+    def __init__(self, path: str, **kw):
+        self.path = path
+        self._connect()
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS events (seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "session_id TEXT NOT NULL, ts REAL NOT NULL, type TEXT NOT NULL, data TEXT NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS events_session ON events (session_id, seq)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS events_ts ON events (ts)")
+        super().__init__(**kw)
+
+    def _connect(self):
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")    # WAL: a process crash loses nothing committed
+        self._db_lock = threading.Lock()
+
+    def after_fork(self):
+        self._connect()         # a SQLite handle must not be used across fork
+        super().after_fork()
+
+    def _commit(self, batch):
+        rows = [(ev["session_id"], ev["ts"], ev["type"], json.dumps(ev["data"], default=str)) for ev in batch]
+        with self._db_lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany("INSERT INTO events (session_id, ts, type, data) VALUES (?, ?, ?, ?)", rows)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _prune(self, cutoff):
+        with self._db_lock:
+            return max(self._db.execute("DELETE FROM events WHERE ts < ?", (cutoff,)).rowcount, 0)
+
+    def read(self, session_id, after=0, upto=None):
+        sql = "SELECT seq, ts, type, data FROM events WHERE session_id = ? AND seq > ?"
+        args = [session_id, after]
+        if upto is not None:
+            sql += " AND seq <= ?"
+            args.append(upto)
+        with self._db_lock:
+            rows = self._db.execute(sql + " ORDER BY seq", args).fetchall()
+        return [{"seq": s, "ts": ts, "session_id": session_id, "type": k, "data": json.loads(d)}
+                for s, ts, k, d in rows]
+
+    def read_from_checkpoint(self, session_id, upto=None):
+        bound = " AND seq <= ?" if upto is not None else ""
+        sql = ("SELECT seq, ts, type, data FROM events WHERE session_id = ?" + bound +
+               " AND seq >= (SELECT MAX(seq) FROM events WHERE session_id = ?"
+               " AND type IN ('init', 'snapshot')" + bound + ") ORDER BY seq")
+        extra = [upto] if upto is not None else []
+        args = [session_id, *extra, session_id, *extra]
+        with self._db_lock:
+            rows = self._db.execute(sql, args).fetchall()
+        return [{"seq": s, "ts": ts, "session_id": session_id, "type": k, "data": json.loads(d)}
+                for s, ts, k, d in rows]
+
+
+class FileEventLog(EventLog):
+    """
+    JSON lines, one event per line, fsync'd per batch. seq is the line number. Reads scan the
+    whole file and nothing is pruned (rotate it externally), so this suits a single process and
+    modest volumes; use SQLite otherwise.
+    """
+
+    def __init__(self, path: str, fsync: bool = True, **kw):
+        self.path = path
+        self.fsync = fsync
+        self._seq = 0
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                self._seq = sum(1 for _ in f)
+        self._f = open(path, "a", encoding="utf-8")
+        super().__init__(**kw)
+
+    def after_fork(self):
+        # seq is counted per process: only one process may append (serve.py refuses several workers)
+        self._f = open(self.path, "a", encoding="utf-8")
+        super().after_fork()
+
+    def _commit(self, batch):
+        lines = []
+        for ev in batch:
+            self._seq += 1
+            lines.append(json.dumps({"seq": self._seq, **ev}, default=str) + "\n")
+        self._f.write("".join(lines))
+        self._f.flush()
+        if self.fsync:
+            os.fsync(self._f.fileno())
+
+    def read(self, session_id, after=0, upto=None):
+        out = []
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    ev = json.loads(line)
+                except ValueError:
+                    continue        # torn last line after a crash
+                if ev["session_id"] != session_id or ev["seq"] <= after:
+                    continue
+                if upto is not None and ev["seq"] > upto:
+                    break
+                out.append(ev)
+        return out
+
+
+class NullEventLog(EventLog):
+    """EVENT_LOG=off: nothing is kept and nothing is recovered."""
+
+    def __init__(self):
+        self.appended = self.written = self.snapshots = self.recovered = 0
+
+    def append(self, session_id, event_type, **data):
+        pass
+
+    def checkpoint(self, session_id, sess):
+        pass
+
+    def after_fork(self):
+        pass
+
+    def flush(self, timeout=5.0):
+        return True
+
+    def close(self, timeout=5.0):
+        pass
+
+    def read(self, session_id, after=0, upto=None):
+        return []
+
+    def recover(self, session_id, max_age=None):
+        return None
+
+    def stats(self):
+        return {"backend": type(self).__name__}
+
+
+def make_event_log() -> EventLog:
+    """
+    Build the log from env:
+      EVENT_LOG = sqlite (default) | file | off
+      EVENT_LOG_PATH (default backend/events.db or backend/events.jsonl), EVENT_LOG_BATCH,
+      EVENT_LOG_LINGER_MS (wait for more events before a commit), EVENT_LOG_QUEUE,
+      EVENT_SNAPSHOT_EVERY (events per session between snapshots),
+      EVENT_LOG_RETENTION (seconds events are kept, default 7 days, 0 keeps all; SQLite only;
+        keep it above SESSION_TTL or live sessions lose their recovery point)
+    """
+    backend = os.getenv("EVENT_LOG", "sqlite").lower()
+    if backend == "off":
+        return NullEventLog()
+    kw = {
+        "batch_size": int(os.getenv("EVENT_LOG_BATCH", 256)),
+        "linger": float(os.getenv("EVENT_LOG_LINGER_MS", 5)) / 1000,
+        "max_queue": int(os.getenv("EVENT_LOG_QUEUE", 10_000)),
+        "snapshot_every": int(os.getenv("EVENT_SNAPSHOT_EVERY", 20)),
+        "retention": float(os.getenv("EVENT_LOG_RETENTION", 7 * 24 * 3600)) or None,
+    }
+    here = os.path.dirname(__file__)
+    if backend == "sqlite":
+        return SqliteEventLog(os.getenv("EVENT_LOG_PATH") or os.path.join(here, "events.db"), **kw)
+    if backend == "file":
+        return FileEventLog(os.getenv("EVENT_LOG_PATH") or os.path.join(here, "events.jsonl"), **kw)
+    raise ValueError(f"unknown EVENT_LOG: {backend}")
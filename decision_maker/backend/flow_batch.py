@@ -0,0 +1,341 @@
+# backend/flow_batch.py
+"""
+Bulk flow evaluation for offline what-if analysis.
+
+run_batch        walk many answer sets through a flow at once. Rows are grouped by node and
+                 conditions are evaluated column-wise with NumPy, so a sweep costs one pass per
+                 node instead of one next_node call per row per hop.
+enumerate_outcomes
+                 list every reachable end node together with the answer region that leads
+                 there (yes/no choices, rules that fired, value sets, number of combinations).
+
+Semantics match next_node: missing names are 0, numeric strings are numbers, and a condition
+that cannot be evaluated counts as not matched.
+"""
+import ast
+import itertools
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from flow_engine import FlowGraph, Node
+from flow_expr import Expr, ExprError, _eq, _in, _key
+
+YES = ("y", "yes", "true", "1")
+DEFAULT_DOMAINS = {"scale_1_5": [1, 2, 3, 4, 5]}
+MAX_ENUM_ROWS = 2_000_000
+
+# ---------- vectorized conditions ----------
+
+def _numeric(x):
+    if isinstance(x, np.ndarray) and x.dtype == object:
+        try:
+            return x.astype(float)
+        except (TypeError, ValueError):
+            raise ExprError("non-numeric answers in a numeric expression") from None
+    if isinstance(x, str):
+        try:
+            return float(x)
+        except ValueError:
+            raise ExprError(f"not a number: {x!r}") from None
+    return x
+
+
+def _elementwise(fn, a, b):
+    return np.frompyfunc(fn, 2, 1)(a, b).astype(bool)
+
+
+_ORDERED = {ast.Lt: np.less, ast.LtE: np.less_equal, ast.Gt: np.greater, ast.GtE: np.greater_equal}
+_ARITH = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply,
+          ast.Div: np.true_divide, ast.FloorDiv: np.floor_divide, ast.Mod: np.mod}
+_REDUCE = {"max": np.maximum.reduce, "min": np.minimum.reduce, "sum": np.add.reduce}
+
+
+def _vec(node, cols):
+    if isinstance(node, ast.Constant):
+        return node.value
+    if isinstance(node, (ast.Tuple, ast.List, ast.Set)):
+        return frozenset(_key(_vec(e, cols)) for e in node.elts)
+    if isinstance(node, ast.Name):
+        return cols[node.id]
+    if isinstance(node, ast.BoolOp):
+        parts = [np.asarray(_vec(v, cols), dtype=bool) for v in node.values]
+        op = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        return op.reduce(np.broadcast_arrays(*parts))
+    if isinstance(node, ast.UnaryOp):
+        inner = _vec(node.operand, cols)
+        if isinstance(node.op, ast.Not):
+            return np.logical_not(np.asarray(inner, dtype=bool))
+        if isinstance(node.op, ast.USub):
+            return np.negative(_numeric(inner))
+        return _numeric(inner)
+    if isinstance(node, ast.BinOp) and type(node.op) in _ARITH:
+        return _ARITH[type(node.op)](_numeric(_vec(node.left, cols)), _numeric(_vec(node.right, cols)))
+    if isinstance(node, ast.Compare):
+        result, lhs = None, _vec(node.left, cols)
+        for op, rhs_node in zip(node.ops, node.comparators):
+            rhs = _vec(rhs_node, cols)
+            if type(op) in _ORDERED:
+                m = _ORDERED[type(op)](_numeric(lhs), _numeric(rhs))
+            elif isinstance(op, (ast.Eq, ast.NotEq)):
+                numeric = all(not isinstance(x, (str, np.ndarray)) or (isinstance(x, np.ndarray) and x.dtype != object)
+                              for x in (lhs, rhs))
+                m = np.equal(lhs, rhs) if numeric else _elementwise(_eq, lhs, rhs)
+                if isinstance(op, ast.NotEq):
+                    m = np.logical_not(m)
+            elif isinstance(op, (ast.In, ast.NotIn)):
+                if isinstance(rhs, frozenset):
+                    m = np.frompyfunc(lambda v: _key(v) in rhs, 1, 1)(lhs).astype(bool)
+                else:
+                    m = _elementwise(_in, lhs, rhs)
+                if isinstance(op, ast.NotIn):
+                    m = np.logical_not(m)
+            else:
+                raise ExprError(f"unsupported comparison {type(op).__name__}")
+            result = m if result is None else np.logical_and(result, m)
+            lhs = rhs
+        return result
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+        args = np.broadcast_arrays(*[_numeric(_vec(a, cols)) for a in node.args])
+        name = node.func.id
+        if name == "avg":
+            return np.add.reduce(args) / len(args)
+        if name in _REDUCE:
+            return _REDUCE[name](args)
+    raise ExprError(f"cannot vectorize {type(node).__name__}")
+
+
+def columns_for(rows, names) -> Dict[str, np.ndarray]:
+    """Answer columns for the given names; float where every value is numeric, else object."""
+    if isinstance(rows, _RowView):
+        return rows.columns(names)
+    cols = {}
+    for name in names:
+        values = [r.get(name, 0) for r in rows]
+        try:
+            cols[name] = np.array(values, dtype=float)
+        except (TypeError, ValueError):
+            arr = np.empty(len(values), dtype=object)
+            arr[:] = values
+            cols[name] = arr
+    return cols
+
+
+def eval_vector(expr: Expr, rows) -> np.ndarray:
+    """Boolean mask of `expr` over rows; falls back to row-by-row where vectorizing fails."""
+    n = len(rows)
+    cols = columns_for(rows, expr.names)
+    try:
+        tree = ast.parse(expr.source, mode="eval").body
+        out = np.asarray(_vec(tree, cols), dtype=bool)
+        return np.broadcast_to(out, (n,)).copy()
+    except (ExprError, TypeError, ValueError, ZeroDivisionError, FloatingPointError):
+        mask = np.zeros(n, dtype=bool)
+        for i, r in enumerate(rows):
+            try:
+                mask[i] = bool(expr(r))
+            except ExprError:
+                mask[i] = False
+        return mask
+
+# ---------- batch routing ----------
+
+def _topo_order(flow: FlowGraph) -> List[Node]:
+    order, seen = [], set()
+
+    def visit(node):
+        if node.id in seen:
+            return
+        seen.add(node.id)
+        for t in node.targets:
+            visit(t)
+        order.append(node)
+    visit(flow.start)
+    return order[::-1]
+
+
+def _route_composite(node: Node, rows):
+    """-> list of (target Node | None, mask); None means the composite has nowhere to go."""
+    n = len(rows)
+    ok = eval_vector(node.pass_if, rows) if node.pass_if is not None else np.ones(n, dtype=bool)
+    remaining = np.ones(n, dtype=bool)
+    out = []
+    for rule in node.rules:
+        if rule.when == "pass_if":
+            matched = ok
+        elif rule.when is None:
+            matched = np.ones(n, dtype=bool)
+        else:
+            matched = eval_vector(rule.when, rows)
+        hit = remaining & matched
+        out.append((rule.target, hit))
+        remaining &= ~matched
+    fallback = node.else_target or node.default_target or node.next
+    out.append((fallback, remaining))
+    return out
+
+
+def _present(answer_sets, idx, key) -> np.ndarray:
+    return np.fromiter((bool(str(answer_sets[i].get(key, "")).strip()) for i in idx), dtype=bool, count=len(idx))
+
+
+def run_batch(flow: FlowGraph, answer_sets: List[Dict[str, Any]], start: Optional[str] = None,
+              with_paths: bool = False) -> List[Dict[str, Any]]:
+    """
+    Walk every answer set from `start` (default: the flow's start) until it ends or needs an ask.
+    Each result: {"end": node_id, "recommendation": ...}
+              or {"ask": ask_id, "node_id": ...} when an answer is missing
+              or {"error": "unhandled", "node_id": ...}
+    plus "path" (visited node ids) when with_paths is set.
+    """
+    n = len(answer_sets)
+    results: List[Optional[Dict[str, Any]]] = [None] * n
+    paths: Optional[List[List[str]]] = [[] for _ in range(n)] if with_paths else None
+    start_node = flow.nodes[start] if start else flow.start
+    pending: Dict[str, List[np.ndarray]] = {start_node.id: [np.arange(n)]}
+
+    def finish(members, **result):
+        for i in members.tolist():
+            results[i] = dict(result, path=paths[i]) if paths is not None else dict(result)
+
+    for node in _topo_order(flow):
+        chunks = pending.pop(node.id, None)
+        if not chunks:
+            continue
+        idx = np.concatenate(chunks)
+        if not len(idx):
+            continue
+        if paths is not None:
+            for i in idx.tolist():
+                paths[i].append(node.id)
+
+        def send(target, members):
+            if target is None:
+                finish(members, error="unhandled", node_id=node.id)
+            elif len(members):
+                pending.setdefault(target.id, []).append(members)
+
+        if node.kind == "end":
+            finish(idx, end=node.id, recommendation=node.recommendation)
+
+        elif node.kind == "yesno":
+            is_yes = np.fromiter((str(answer_sets[i].get(node.id, "")).lower() in YES for i in idx.tolist()),
+                                 dtype=bool, count=len(idx))
+            send(node.on_yes, idx[is_yes])
+            send(node.on_no, idx[~is_yes])
+
+        elif node.kind in ("collect", "composite"):
+            # rows missing an answer stop at the first outstanding ask
+            for q in node.asks:
+                ok = _present(answer_sets, idx.tolist(), q.id)
+                finish(idx[~ok], ask=q.id, node_id=node.id)
+                idx = idx[ok]
+            if node.kind == "collect":
+                send(node.next, idx)
+            elif len(idx):
+                rows = [answer_sets[i] for i in idx.tolist()]
+                for target, mask in _route_composite(node, rows):
+                    send(target, idx[mask])
+
+    return results
+
+# ---------- exhaustive enumeration ----------
+
+def _describe_rule(node: Node, target, position: int) -> str:
+    if position < len(node.rules):
+        rule = node.rules[position]
+        if rule.when == "pass_if":
+            cond = node.pass_if.source if node.pass_if is not None else "True"
+        else:
+            cond = rule.when.source if rule.when is not None else "True"
+        return f"{node.id}: {cond}"
+    earlier = [r.when.source if isinstance(r.when, Expr) else (node.pass_if.source if node.pass_if else "True")
+               for r in node.rules]
+    return f"{node.id}: else" + (f" (not any of: {'; '.join(earlier)})" if earlier else "")
+
+
+def enumerate_outcomes(flow: FlowGraph, domains: Optional[Dict[str, List[Any]]] = None) -> List[Dict[str, Any]]:
+    """
+    Every reachable end node with the answer region leading to it.
+
+    `domains` maps ask ids (or ask types) to candidate values; scale_1_5 asks default to 1..5.
+    Asks without a domain are free text: any non-empty answer, so they don't split regions.
+    """
+    domains = dict(DEFAULT_DOMAINS, **(domains or {}))
+    outcomes: List[Dict[str, Any]] = []
+
+    def walk(node: Node, table: Dict[str, np.ndarray], n: int, path, choices, rules):
+        path = path + [node.id]
+        if n == 0:
+            return
+        if node.kind == "end":
+            values = {k: sorted(set(col.tolist()), key=lambda v: (isinstance(_key(v), str), _key(v)))
+                      for k, col in table.items()}
+            outcomes.append({
+                "end": node.id, "recommendation": node.recommendation, "path": path,
+                "choices": dict(choices), "rules": list(rules), "count": int(n), "values": values,
+            })
+            return
+        if node.kind == "yesno":
+            walk(node.on_yes, table, n, path, {**choices, node.id: "yes"}, rules)
+            walk(node.on_no, table, n, path, {**choices, node.id: "no"}, rules)
+            return
+        if node.kind == "collect":
+            walk(node.next, table, n, path, choices, rules)
+            return
+
+        # composite: cross the current region with this node's enumerable asks
+        grid_keys = [q.id for q in node.asks if (q.id in domains or q.type in domains)]
+        grid_vals = [domains.get(k, domains.get(node.asks_by_id[k].type)) for k in grid_keys]
+        size = n * int(np.prod([len(v) for v in grid_vals])) if grid_vals else n
+        if size > MAX_ENUM_ROWS:
+            raise ValueError(f"enumeration too large at {node.id!r}: {size} rows")
+        combos = list(itertools.product(*grid_vals)) if grid_vals else [()]
+        new_table = {k: np.repeat(col, len(combos)) for k, col in table.items()}
+        for j, k in enumerate(grid_keys):
+            col = np.empty(len(combos), dtype=object)
+            col[:] = [c[j] for c in combos]
+            new_table[k] = np.tile(col, n)
+        m = n * len(combos)
+
+        free = {q.id: "…" for q in node.asks if q.id not in grid_keys}
+        row_view = _RowView(new_table, choices, free, m)
+        for pos, (target, mask) in enumerate(_route_composite(node, row_view)):
+            if target is None or not mask.any():
+                continue
+            sub = {k: col[mask] for k, col in new_table.items()}
+            walk(target, sub, int(mask.sum()), path, choices, rules + [_describe_rule(node, target, pos)])
+
+    walk(flow.start, {}, 1, [], {}, [])
+    return outcomes
+
+
+class _RowView:
+    """Rows of an enumeration table: columns for vectorized paths, dicts for the fallback."""
+
+    def __init__(self, table, fixed, free, n):
+        self.table, self.fixed, self.free, self.n = table, fixed, free, n
+
+    def __len__(self):
+        return self.n
+
+    def __iter__(self):
+        for i in range(self.n):
+            row = dict(self.fixed)
+            row.update(self.free)
+            row.update({k: col[i] for k, col in self.table.items()})
+            yield row
+
+    def columns(self, names) -> Dict[str, np.ndarray]:
+        cols = {}
+        for name in names:
+            if name in self.table:
+                col = self.table[name]
+            else:
+                col = np.empty(self.n, dtype=object)
+                col[:] = [self.fixed.get(name, self.free.get(name, 0))] * self.n
+            try:
+                cols[name] = col.astype(float)
+            except (TypeError, ValueError):
+                cols[name] = col
+        return cols
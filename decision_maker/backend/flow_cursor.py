@@ -0,0 +1,84 @@
+# backend/flow_cursor.py
+"""
+Signed cursors for /flow/next: where a flow walk stopped, so the client sends back the cursor and
+its new answers instead of every answer so far.
+
+A cursor is base64url(payload) "." base64url(HMAC-SHA256(secret, payload)[:16]). The payload is the
+compact JSON [flow_id, flow_version, node_id, answers, issued_at], zlib-compressed when that is
+shorter (first byte "z", else "j"). The answers travel in the cursor rather than as a digest, so any
+worker can resume it without shared state; the MAC covers them, so they cannot be edited in transit.
+
+FLOW_CURSOR_SECRET signs the cursors; without it each process picks a random key (serve.py workers
+inherit the master's), so cursors do not survive a restart or cross hosts. FLOW_CURSOR_TTL (seconds, default 1 day; 0 = never) expires them.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+MAC_BYTES = 16
+
+
+class CursorError(ValueError):
+    pass
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class CursorSigner:
+    def __init__(self, secret: bytes, ttl: Optional[float] = None):
+        self._secret = secret
+        self.ttl = ttl
+        self.issued = 0
+        self.opened = 0
+        self.rejected = 0
+
+    def _mac(self, payload: bytes) -> bytes:
+        return hmac.new(self._secret, payload, hashlib.sha256).digest()[:MAC_BYTES]
+
+    def sign(self, flow_id: str, version: Optional[str], node_id: str, answers: Dict[str, Any]) -> str:
+        raw = json.dumps([flow_id, version, node_id, answers, int(time.time())],
+                         separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        packed = zlib.compress(raw, 6)
+        payload = b"z" + packed if len(packed) < len(raw) else b"j" + raw
+        self.issued += 1
+        return _b64(payload) + "." + _b64(self._mac(payload))
+
+    def open(self, token: str) -> Tuple[str, Optional[str], str, Dict[str, Any]]:
+        """(flow_id, flow_version, node_id, answers); CursorError if forged, malformed or expired."""
+        try:
+            body, mac = token.split(".", 1)
+            payload = _unb64(body)
+            ok = hmac.compare_digest(self._mac(payload), _unb64(mac))
+        except (ValueError, TypeError):
+            ok = False
+        if not ok:
+            self.rejected += 1
+            raise CursorError("bad signature")
+        raw = zlib.decompress(payload[1:]) if payload[:1] == b"z" else payload[1:]
+        flow_id, version, node_id, answers, issued_at = json.loads(raw)
+        if self.ttl and time.time() - issued_at > self.ttl:
+            self.rejected += 1
+            raise CursorError("expired")
+        self.opened += 1
+        return flow_id, version, node_id, answers
+
+    def stats(self) -> Dict[str, Any]:
+        return {"issued": self.issued, "opened": self.opened, "rejected": self.rejected}
+
+
+def make_cursor_signer() -> CursorSigner:
+    secret = os.getenv("FLOW_CURSOR_SECRET")
+    ttl = float(os.getenv("FLOW_CURSOR_TTL", 24 * 3600)) or None
+    return CursorSigner(secret.encode("utf-8") if secret else secrets.token_bytes(32), ttl=ttl)
@@ -1,45 +1,281 @@
-import operator
-import yaml
 import os
-from typing import Dict, Any
+import re
+from types import MappingProxyType
+from typing import Dict, Any, Optional
 
-OPS = {
-    "<=": operator.le, "<": operator.lt,
-    ">=": operator.ge, ">": operator.gt,
-    "==": operator.eq,
-}
+from flow_expr import Expr, ExprError, compile_expr
+
+class FlowError(ValueError):
+    """A flow definition that cannot be compiled (bad kind, dangling target, cycle, ...)."""
 
 def load_flow(path: str) -> Dict[str, Any]:
+    import yaml     # only needed when a flow is actually parsed (see flow_registry's artifact)
     with open(path, "r") as f:
         return yaml.safe_load(f)
 
-def load_flows(dirpath: str) -> Dict[str, Dict[str, Any]]:
-    """Load all *.yaml flows in a directory -> {flow_id: flow_dict}"""
+def load_flows(dirpath: str) -> Dict[str, "FlowGraph"]:
+    """Load and compile all *.yaml flows in a directory -> {flow_id: FlowGraph}"""
     registry = {}
     for fname in os.listdir(dirpath):
         if not fname.endswith(".yaml"):
             continue
-        flow = load_flow(os.path.join(dirpath, fname))
-        fid = flow.get("id") or os.path.splitext(fname)[0]
-        registry[fid] = flow
+        raw = load_flow(os.path.join(dirpath, fname))
+        if not isinstance(raw, dict):
+            raise FlowError(f"{fname}: top level must be a mapping")
+        fid = raw.get("id") or os.path.splitext(fname)[0]
+        try:
+            registry[fid] = compile_flow(raw, fid)
+        except FlowError as e:
+            raise FlowError(f"{fname}: {e}") from None
     return registry
 
-def eval_expr(expr, answers):
-    """
-    Very small, safe evaluator for patterns like "max(year,month,day) <= 2".
-    Missing keys are treated as 0 so expressions don't crash early in a flow.
-    """
-    if not expr:
-        return True
-    expr = str(expr).strip()
-    if expr.startswith("max("):
-        inside = expr[4:expr.index(")")]
-        keys = [k.strip() for k in inside.split(",")]
-        rest = expr[expr.index(")")+1:].strip()   # e.g. "<= 2"
-        op, thresh = rest.split()[0], float(rest.split()[1])
-        val = max(float(answers.get(k, 0)) for k in keys)
-        return OPS[op](val, thresh)
-    raise ValueError("unsupported expr")
+# ---------- compiled flow graph ----------
+# Flows are compiled once at load: targets resolved to Node references, persona applied to
+# prompts, asks indexed by id. Objects are immutable so a registry can be shared freely.
+
+class _Frozen:
+    __slots__ = ()
+
+    def __setattr__(self, key, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def _set(self, **fields):
+        for k, v in fields.items():
+            object.__setattr__(self, k, v)
+
+    # pickling (compiled-flow artifacts): mappingproxy fields travel as dicts
+    def __getstate__(self):
+        state, proxied = {}, []
+        for cls in type(self).__mro__:
+            for k in getattr(cls, "__slots__", ()):
+                if hasattr(self, k):
+                    v = getattr(self, k)
+                    if isinstance(v, MappingProxyType):
+                        v = dict(v)
+                        proxied.append(k)
+                    state[k] = v
+        return state, proxied
+
+    def __setstate__(self, st):
+        state, proxied = st
+        for k, v in state.items():
+            object.__setattr__(self, k, MappingProxyType(v) if k in proxied else v)
+
+# ---------- prompt templates ----------
+# Prompts may name placeholders: {axis} (the axis picked in the UI), {persona}, or the id of an
+# earlier ask. Each prompt is split once into literals and field names; a field missing from the
+# context is left as written, so an unfilled prompt reads exactly as the YAML does.
+_PLACEHOLDER = re.compile(r"(?<!\{)\{([A-Za-z_][A-Za-z0-9_]*)\}(?!\})")   # "{{x}}" stays literal
+
+class Template(_Frozen):
+    __slots__ = ("text", "literals", "fields")
+
+    def __init__(self, text: str):
+        pieces = _PLACEHOLDER.split(text or "")          # literal, field, literal, ..., literal
+        self._set(text=text or "", literals=tuple(pieces[0::2]), fields=tuple(pieces[1::2]))
+
+    def render(self, context: Dict[str, Any]) -> str:
+        if not self.fields:
+            return self.text
+        out = [self.literals[0]]
+        for field, literal in zip(self.fields, self.literals[1:]):
+            value = context.get(field)
+            out.append("{" + field + "}" if value is None or value == "" else str(value))
+            out.append(literal)
+        return "".join(out)
+
+def render_step(flow: "FlowGraph", step: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, Any]:
+    """Fill the prompt of a next_node/advance ask step in place (its ask dict is a fresh copy)."""
+    if "ask" in step:
+        node = flow.nodes[step["node_id"]]
+        q = node.asks_by_id.get(step["awaiting"])
+        step["ask"]["prompt"] = (q.template if q is not None else node.template).render(context)
+    return step
+
+class Ask(_Frozen):
+    __slots__ = ("id", "type", "prompt", "display_prompt", "template", "prompt_template", "criterion",
+                 "rubric", "examples", "bounds", "raw", "_public")
+
+    def __init__(self, spec: Dict[str, Any], prefix: str):
+        if not spec.get("id"):
+            raise FlowError("ask without id")
+        prompt = spec.get("prompt", "")
+        public = _apply_persona(prefix, spec)
+        criterion = spec.get("criterion") or {}
+        self._set(
+            id=spec["id"],
+            type=spec.get("type", "text"),
+            prompt=prompt,
+            display_prompt=public.get("prompt", ""),
+            template=Template(public.get("prompt", "")),
+            prompt_template=Template(prompt),       # without the persona: validator / helper prompts
+            criterion=MappingProxyType(dict(criterion)),
+            rubric=(criterion.get("rubric") or "").strip(),
+            examples=tuple(spec.get("examples", []) or ()),
+            bounds=spec.get("bounds") or "",
+            raw=MappingProxyType(dict(spec)),
+            _public=MappingProxyType(public),
+        )
+
+    def as_dict(self) -> Dict[str, Any]:
+        """The ask as sent to clients (persona applied); a fresh dict callers may modify."""
+        return dict(self._public)
+
+def _compile_cond(src) -> Optional[Expr]:
+    """None stays None (no condition); anything else must compile."""
+    if src is None:
+        return None
+    if not str(src).strip():
+        return compile_expr("True")
+    return compile_expr(str(src))
+
+class Rule(_Frozen):
+    __slots__ = ("when", "target")      # when: "pass_if" | Expr | None
+
+    def __init__(self, when, target):
+        self._set(when=when, target=target)
+
+class Node(_Frozen):
+    __slots__ = ("id", "kind", "asks", "asks_by_id", "prompt", "display_prompt", "template", "pass_if",
+                 "rules", "else_target", "default_target", "on_yes", "on_no", "next",
+                 "recommendation", "scale_labels", "raw")
+
+    KINDS = ("composite", "yesno", "collect", "end")
+
+    def __init__(self, node_id: str, spec: Dict[str, Any], prefix: str):
+        kind = spec.get("kind")
+        if kind not in self.KINDS:
+            raise FlowError(f"node {node_id!r}: unknown kind {kind!r}")
+
+        prompt = spec.get("prompt", "")
+        if kind == "composite":
+            asks = tuple(Ask(q, prefix) for q in spec.get("asks") or ())
+            if not asks:
+                raise FlowError(f"node {node_id!r}: composite without asks")
+        elif kind == "collect":
+            asks = (Ask({"id": node_id, "type": "text", "prompt": prompt}, prefix),)
+        else:
+            asks = ()
+
+        asks_by_id = {}
+        for q in asks:
+            if q.id in asks_by_id:
+                raise FlowError(f"node {node_id!r}: duplicate ask id {q.id!r}")
+            asks_by_id[q.id] = q
+
+        # on_answer accepts {"when": ..., "goto"|"then"|"pass"|"else": X}, {"else": Y}, {"goto": Z}
+        rules, else_target, default_target = [], None, None
+        for rule in spec.get("on_answer", []) or []:
+            if "when" in rule:
+                dest = rule.get("goto") or rule.get("then") or rule.get("pass") or rule.get("else")
+                if dest:
+                    rules.append((rule.get("when"), dest))
+            elif "else" in rule:
+                else_target = rule.get("else")
+            elif "goto" in rule and default_target is None:
+                default_target = rule.get("goto")
+
+        pass_if = (spec.get("compute") or {}).get("pass_if")
+        try:
+            pass_if = _compile_cond(pass_if)
+            rules = [(w if w == "pass_if" else _compile_cond(w), dest) for w, dest in rules]
+        except ExprError as e:
+            raise FlowError(f"node {node_id!r}: {e}") from None
+
+        display_prompt = _apply_persona(prefix, {"prompt": prompt})["prompt"]
+        self._set(
+            id=node_id,
+            kind=kind,
+            asks=asks,
+            asks_by_id=MappingProxyType(asks_by_id),
+            prompt=prompt,
+            display_prompt=display_prompt,
+            template=Template(display_prompt),
+            pass_if=pass_if,
+            rules=rules,                      # resolved to Rule objects in _link
+            else_target=else_target,
+            default_target=default_target,
+            on_yes=spec.get("on_yes"),
+            on_no=spec.get("on_no"),
+            next=spec.get("next"),
+            recommendation=spec.get("recommendation", "Finished."),
+            scale_labels=MappingProxyType(dict(spec.get("scale_labels") or {})),
+            raw=MappingProxyType(dict(spec)),
+        )
+        for field in {"yesno": ("prompt", "on_yes", "on_no"), "collect": ("prompt", "next")}.get(kind, ()):
+            if not spec.get(field):
+                raise FlowError(f"node {node_id!r}: {kind} node needs {field!r}")
+
+    def _link(self, nodes: Dict[str, "Node"]):
+        def ref(target):
+            if target is None:
+                return None
+            if target not in nodes:
+                raise FlowError(f"node {self.id!r}: dangling target {target!r}")
+            return nodes[target]
+
+        self._set(
+            rules=tuple(Rule(when, ref(dest)) for when, dest in self.rules),
+            else_target=ref(self.else_target),
+            default_target=ref(self.default_target),
+            on_yes=ref(self.on_yes),
+            on_no=ref(self.on_no),
+            next=ref(self.next),
+        )
+
+    @property
+    def targets(self):
+        """Every node this one can route to."""
+        out = [r.target for r in self.rules]
+        out += [self.else_target, self.default_target, self.on_yes, self.on_no, self.next]
+        return [n for n in out if n is not None]
+
+class FlowGraph(_Frozen):
+    __slots__ = ("id", "start", "nodes", "persona_prefix", "raw", "version")
+
+    def __init__(self, flow_id: str, start: Node, nodes: Dict[str, Node], prefix: str, raw: Dict[str, Any],
+                 version: Optional[str] = None):
+        self._set(id=flow_id, start=start, nodes=MappingProxyType(nodes),
+                  persona_prefix=prefix, raw=raw, version=version)
+
+def compile_flow(raw: Dict[str, Any], flow_id: Optional[str] = None, version: Optional[str] = None) -> FlowGraph:
+    """Build a validated FlowGraph from a YAML flow dict (`version`: a hash of its source, if known)."""
+    if not isinstance(raw, dict) or not isinstance(raw.get("nodes"), dict) or not raw["nodes"]:
+        raise FlowError("flow needs a non-empty 'nodes' mapping")
+    prefix = _persona_prefix(raw)
+    nodes = {nid: Node(nid, spec or {}, prefix) for nid, spec in raw["nodes"].items()}
+    for node in nodes.values():
+        node._link(nodes)
+
+    start_id = raw.get("start")
+    if start_id not in nodes:
+        raise FlowError(f"start node {start_id!r} not found")
+    _check_graph(nodes[start_id], nodes)
+    return FlowGraph(flow_id or raw.get("id"), nodes[start_id], nodes, prefix, MappingProxyType(raw), version)
+
+def _check_graph(start: Node, nodes: Dict[str, Node]):
+    """Reject cycles and nodes that cannot be reached from start."""
+    state = {}                          # node id -> 1 (on current path) | 2 (done)
+    stack = [(start, iter(start.targets))]
+    state[start.id] = 1
+    while stack:
+        node, it = stack[-1]
+        nxt = next(it, None)
+        if nxt is None:
+            state[node.id] = 2
+            stack.pop()
+            continue
+        seen = state.get(nxt.id)
+        if seen == 1:
+            path = [n.id for n, _ in stack] + [nxt.id]
+            raise FlowError("cycle: " + " -> ".join(path[path.index(nxt.id):]))
+        if seen is None:
+            state[nxt.id] = 1
+            stack.append((nxt, iter(nxt.targets)))
+
+    unreachable = sorted(set(nodes) - set(state))
+    if unreachable:
+        raise FlowError(f"unreachable nodes: {', '.join(unreachable)}")
 
 # ---------- persona helpers ----------
 def _persona_prefix(flow: Dict[str, Any]) -> str:
@@ -49,99 +285,99 @@ def _persona_prefix(flow: Dict[str, Any]) -> str:
     except Exception:
         return ""
 
-def _apply_persona(flow: Dict[str, Any], ask: Dict[str, Any]) -> Dict[str, Any]:
-    if not ask:
-        return ask
-    prefix = _persona_prefix(flow)
-    if not prefix:
-        return ask
+def _apply_persona(prefix: str, ask: Dict[str, Any]) -> Dict[str, Any]:
     out = dict(ask)
-    if not out.get("prompt", "").strip().startswith(prefix):
+    if prefix and not out.get("prompt", "").strip().startswith(prefix):
         out["prompt"] = (prefix + " " + out.get("prompt", "")).strip()
     return out
 
-def next_node(flow, node_id, answers):
-    node = flow["nodes"][node_id]
+# ---------- routing ----------
+def _check(flow: FlowGraph, node: Node, cond: Expr, answers) -> bool:
+    """Evaluate a compiled condition; an answer of the wrong type counts as not matched."""
+    try:
+        return bool(cond(answers))
+    except ExprError as e:
+        print("FLOW_EXPR_EVAL_FAIL:", flow.id, node.id, e)
+        return False
+
+def next_node(flow: FlowGraph, node_id: str, answers):
+    node = flow.nodes[node_id]
 
-    if node["kind"] == "composite":
+    if node.kind == "composite":
         # Ask outstanding questions (validator enforces sufficiency; here we gate on presence)
-        for q in node["asks"]:
-            if q["id"] not in answers or not str(answers[q["id"]]).strip():
-                ask = _apply_persona(flow, q)
-                return {"ask": ask, "node_id": node_id, "awaiting": q["id"]}
+        for q in node.asks:
+            if q.id not in answers or not str(answers[q.id]).strip():
+                return {"ask": q.as_dict(), "node_id": node_id, "awaiting": q.id}
 
         # All questions present -> compute routing
-        cond_expr = (node.get("compute") or {}).get("pass_if")
-        ok = eval_expr(cond_expr, answers) if cond_expr is not None else True
-
-        rules = node.get("on_answer", []) or []
-        fallback_else = None
-        unconditional = None
-
-        for rule in rules:
-            # Accept both styles:
-            #   - {"when":"pass_if","goto":"X"}
-            #   - {"else":"Y"}
-            #   - {"goto":"Z"}   (unconditional default)
-            if "when" in rule:
-                when = rule.get("when")
-                matched = False
-                if when == "pass_if":
-                    matched = bool(ok)
-                else:
-                    # allow inline expressions in 'when'
-                    try:
-                        matched = bool(eval_expr(when, answers))
-                    except Exception:
-                        matched = False
-                if matched:
-                    dest = rule.get("goto") or rule.get("then") or rule.get("pass") or rule.get("else")
-                    if dest:
-                        return {"goto": dest}
-            elif "else" in rule:
-                fallback_else = rule.get("else")
-            elif "goto" in rule and unconditional is None:
-                unconditional = rule.get("goto")
+        ok = _check(flow, node, node.pass_if, answers) if node.pass_if is not None else True
+
+        for rule in node.rules:
+            if rule.when == "pass_if":
+                matched = ok
+            else:
+                # allow inline expressions in 'when'
+                matched = _check(flow, node, rule.when, answers) if rule.when is not None else True
+            if matched:
+                return {"goto": rule.target.id}
 
         # If no 'when' matched, prefer explicit else, otherwise unconditional goto
-        if fallback_else:
-            return {"goto": fallback_else}
-        if unconditional:
-            return {"goto": unconditional}
+        if node.else_target:
+            return {"goto": node.else_target.id}
+        if node.default_target:
+            return {"goto": node.default_target.id}
 
         # If nothing to route to, but composite is done, treat as terminal if defined
-        if node_id in flow.get("nodes", {}) and "next" in node:
-            return {"goto": node["next"]}
+        if node.next:
+            return {"goto": node.next.id}
 
-    elif node["kind"] == "yesno":
+    elif node.kind == "yesno":
         ans = str(answers.get(node_id, "")).lower()
-        key = "on_yes" if ans in ("y","yes","true","1") else "on_no"
-        return {"goto": node[key]}
+        target = node.on_yes if ans in ("y","yes","true","1") else node.on_no
+        return {"goto": target.id}
 
-    elif node["kind"] == "collect":
+    elif node.kind == "collect":
         if node_id not in answers or not str(answers[node_id]).strip():
-            ask = {"id": node_id, "type": "text", "prompt": node["prompt"]}
-            ask = _apply_persona(flow, ask)
-            return {"ask": ask, "node_id": node_id, "awaiting": node_id}
-        return {"goto": node["next"]}
+            q = node.asks[0]
+            return {"ask": q.as_dict(), "node_id": node_id, "awaiting": q.id}
+        return {"goto": node.next.id}
 
-    elif node["kind"] == "end":
-        return {"end": True, "recommendation": node.get("recommendation", "Finished.")}
+    elif node.kind == "end":
+        return {"end": True, "recommendation": node.recommendation}
 
     return {"error": "unhandled"}
 
-def first_prompt(flow) -> str:
+def yesno_ask(node: Node) -> Dict[str, Any]:
+    """A yes/no node's question in the shape of Ask.as_dict()."""
+    return {"id": node.id, "type": "yesno", "prompt": node.display_prompt}
+
+def advance(flow: FlowGraph, node_id: str, answers):
+    """
+    Follow goto steps from `node_id` until something needs the user: (step, path).
+    `step` is next_node's ask or end; a yes/no node without an answer stops the walk as an
+    ask for that node (next_node alone would take its "no" branch). `path` lists the nodes
+    visited, `node_id` first. Flows are acyclic (compile_flow checks), so the walk terminates.
+    """
+    path = [node_id]
+    while True:
+        node = flow.nodes[node_id]
+        if node.kind == "yesno" and not str(answers.get(node_id, "")).strip():
+            return {"ask": yesno_ask(node), "node_id": node_id, "awaiting": node_id}, path
+        step = next_node(flow, node_id, answers)
+        if "goto" not in step:
+            return step, path
+        node_id = step["goto"]
+        path.append(node_id)
+
+def first_prompt(flow: FlowGraph, context: Optional[Dict[str, Any]] = None) -> str:
     """Return a sensible first question/prompt for a flow's start node, with persona voice if present."""
-    start = flow["start"]
-    node = flow["nodes"][start]
-    prefix = _persona_prefix(flow)
-
-    if node["kind"] == "composite":
-        p = node["asks"][0]["prompt"]
-        return ((prefix + " " + p).strip() if prefix else p)
-    elif node["kind"] in ("yesno", "collect"):
-        p = node["prompt"]
-        return ((prefix + " " + p).strip() if prefix else p)
-    elif node["kind"] == "end":
-        return node.get("recommendation", "Finished.")
+    node = flow.start
+    context = context or {}
+
+    if node.kind == "composite":
+        return node.asks[0].template.render(context)
+    elif node.kind in ("yesno", "collect"):
+        return node.template.render(context)
+    elif node.kind == "end":
+        return node.recommendation
     return "Let's begin."
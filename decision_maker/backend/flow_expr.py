@@ -0,0 +1,239 @@
+# backend/flow_expr.py
+"""
+Safe expression language for flow conditions (`compute.pass_if`, `on_answer[].when`).
+
+    max(year, month, day) <= 2
+    avg(year, month) > 3 and not (freeroll == "yes")
+    work_model in ("remote", "hybrid") or sum(a, b) * 2 >= 7
+
+Supported: numbers, strings, True/False, answer names, + - * / // %, unary - / not,
+and / or, chained comparisons (== != < <= > >= in, not in), min/max/sum/avg, and
+tuple/list/set literals for `in`.
+
+Names read from the answers dict; missing names are 0 so expressions don't crash early in a
+flow. Numeric strings ("3") compare and calculate as numbers. Each source string is
+parsed once into a tree of closures (cached), so evaluating is a plain function call.
+"""
+import ast
+import operator
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet
+
+
+class ExprError(ValueError):
+    """Unsupported syntax at compile time, or a type error while evaluating."""
+
+
+def _num(v):
+    if isinstance(v, (int, float)):
+        return v
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        raise ExprError(f"not a number: {v!r}") from None
+
+
+def _key(v):
+    """Normalize a value for equality / membership: numbers and numeric strings -> float."""
+    if isinstance(v, bool):
+        return v
+    if isinstance(v, (int, float)):
+        return float(v)
+    if isinstance(v, str):
+        try:
+            return float(v)
+        except ValueError:
+            return v
+    return v
+
+
+def _eq(a, b):
+    return _key(a) == _key(b)
+
+
+def _ne(a, b):
+    return _key(a) != _key(b)
+
+
+def _ordered(op):
+    return lambda a, b: op(_num(a), _num(b))
+
+
+def _in(a, b):
+    if isinstance(b, str):
+        return str(a) in b
+    if isinstance(b, frozenset):
+        return _key(a) in b
+    try:
+        return any(_key(a) == _key(x) for x in b)
+    except TypeError:
+        raise ExprError(f"'in' needs a collection or string, got {b!r}") from None
+
+
+ORDERED_RAW = {ast.Lt: operator.lt, ast.LtE: operator.le, ast.Gt: operator.gt, ast.GtE: operator.ge}
+
+CMP_OPS = {
+    ast.Eq: _eq, ast.NotEq: _ne,
+    ast.Lt: _ordered(operator.lt), ast.LtE: _ordered(operator.le),
+    ast.Gt: _ordered(operator.gt), ast.GtE: _ordered(operator.ge),
+    ast.In: _in, ast.NotIn: lambda a, b: not _in(a, b),
+}
+
+BIN_OPS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+    ast.Div: operator.truediv, ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod,
+}
+
+
+def _avg(*xs):
+    return sum(xs) / len(xs)
+
+
+FUNCS = {"min": min, "max": max, "sum": lambda *xs: sum(xs), "avg": _avg}
+
+
+class Expr:
+    """A compiled condition. Call it with an answers dict."""
+    __slots__ = ("source", "names", "_fn")
+
+    def __init__(self, source: str, fn: Callable[[Dict[str, Any]], Any], names: FrozenSet[str]):
+        self.source = source
+        self.names = names          # answer keys the expression reads
+        self._fn = fn
+
+    def __call__(self, answers: Dict[str, Any]):
+        try:
+            return self._fn(answers)
+        except ExprError:
+            raise
+        except (TypeError, ValueError, ZeroDivisionError) as e:
+            raise ExprError(f"{self.source!r}: {e}") from None
+
+    def __reduce__(self):
+        # closures don't pickle; rebuild from source
+        return (compile_expr, (self.source,))
+
+    def __repr__(self):
+        return f"Expr({self.source!r})"
+
+
+@lru_cache(maxsize=1024)
+def compile_expr(source: str) -> Expr:
+    source = str(source).strip()
+    try:
+        tree = ast.parse(source, mode="eval")
+    except SyntaxError as e:
+        raise ExprError(f"bad expression {source!r}: {e.msg}") from None
+    names = set()
+    fn = _compile(tree.body, names, source)
+    return Expr(source, fn, frozenset(names))
+
+
+def eval_expr(expr, answers):
+    """Evaluate a condition string against answers. Empty/None -> True."""
+    if not expr:
+        return True
+    return compile_expr(str(expr).strip())(answers)
+
+
+def _const(node):
+    """Literal value of a node, or raise LookupError if it isn't constant."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str, bool)):
+        return node.value
+    if isinstance(node, (ast.Tuple, ast.List, ast.Set)):
+        return frozenset(_key(_const(e)) for e in node.elts)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        v = _const(node.operand)
+        if isinstance(v, (int, float)) and not isinstance(v, bool):
+            return -v
+    raise LookupError
+
+
+def _compile(node, names, source):
+    try:
+        c = _const(node)
+        return lambda a: c
+    except LookupError:
+        pass
+
+    if isinstance(node, ast.Name):
+        key = node.id
+        names.add(key)
+        return lambda a: a.get(key, 0)
+
+    if isinstance(node, ast.BoolOp):
+        parts = [_compile(v, names, source) for v in node.values]
+        if len(parts) == 2:
+            p0, p1 = parts
+            if isinstance(node.op, ast.And):
+                return lambda a: bool(p0(a)) and bool(p1(a))
+            return lambda a: bool(p0(a)) or bool(p1(a))
+        if isinstance(node.op, ast.And):
+            return lambda a: all(p(a) for p in parts)
+        return lambda a: any(p(a) for p in parts)
+
+    if isinstance(node, ast.UnaryOp):
+        inner = _compile(node.operand, names, source)
+        if isinstance(node.op, ast.Not):
+            return lambda a: not inner(a)
+        if isinstance(node.op, ast.USub):
+            return lambda a: -_num(inner(a))
+        if isinstance(node.op, ast.UAdd):
+            return lambda a: _num(inner(a))
+
+    if isinstance(node, ast.BinOp) and type(node.op) in BIN_OPS:
+        op = BIN_OPS[type(node.op)]
+        left, right = _compile(node.left, names, source), _compile(node.right, names, source)
+        return lambda a: op(_num(left(a)), _num(right(a)))
+
+    if isinstance(node, ast.Compare) and all(type(o) in CMP_OPS for o in node.ops):
+        ops = [CMP_OPS[type(o)] for o in node.ops]
+        operands = [_compile(n, names, source) for n in [node.left] + node.comparators]
+        if len(ops) == 1:
+            op, left, right = ops[0], operands[0], operands[1]
+            raw_op = ORDERED_RAW.get(type(node.ops[0]))
+            rhs = node.comparators[0]
+            if raw_op and isinstance(rhs, ast.Constant) and type(rhs.value) in (int, float):
+                # common shape `<expr> <= N`: skip the constant's closure and coercion
+                c = rhs.value
+                return lambda a: raw_op(_num(left(a)), c)
+            return lambda a: op(left(a), right(a))
+
+        def chained(a):
+            lhs = operands[0](a)
+            for op, rhs_fn in zip(ops, operands[1:]):
+                rhs = rhs_fn(a)
+                if not op(lhs, rhs):
+                    return False
+                lhs = rhs
+            return True
+        return chained
+
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+            and node.func.id in FUNCS and node.args and not node.keywords):
+        fn = FUNCS[node.func.id]
+        if all(isinstance(x, ast.Name) for x in node.args) and len(node.args) <= 3:
+            # common shape `max(year, month, day)`: read answers directly
+            keys = [x.id for x in node.args]
+            names.update(keys)
+            if len(keys) == 1:
+                (k0,) = keys
+                return lambda a: _num(a.get(k0, 0))
+            if len(keys) == 2:
+                k0, k1 = keys
+                return lambda a: fn(_num(a.get(k0, 0)), _num(a.get(k1, 0)))
+            k0, k1, k2 = keys
+            return lambda a: fn(_num(a.get(k0, 0)), _num(a.get(k1, 0)), _num(a.get(k2, 0)))
+        args = [_compile(x, names, source) for x in node.args]
+        if len(args) == 1:
+            (f0,) = args
+            return lambda a: _num(f0(a))
+        if len(args) == 2:
+            f0, f1 = args
+            return lambda a: fn(_num(f0(a)), _num(f1(a)))
+        if len(args) == 3:
+            f0, f1, f2 = args
+            return lambda a: fn(_num(f0(a)), _num(f1(a)), _num(f2(a)))
+        return lambda a: fn(*[_num(f(a)) for f in args])
+
+    raise ExprError(f"unsupported syntax in {source!r}: {type(node).__name__}")
@@ -0,0 +1,253 @@
+# backend/flow_registry.py
+"""
+Reloadable registry of compiled flows.
+
+FlowRegistry is a read-only mapping {flow_id: FlowGraph} over the current snapshot. reload()
+re-reads the flows directory incrementally: files whose (mtime, size) did not change are not
+opened, files whose content hash did not change are not parsed, and only the rest is compiled.
+The new snapshot replaces the old one in a single reference swap once every changed file
+compiled, so requests never see a half-loaded registry and never wait on a reload.
+
+Each compiled flow carries `version`, a hash of its YAML. Sessions record the version they
+started on and keep resolving it with get(flow_id, version) until they finish; the last
+`keep_versions` versions of each flow stay available for that. With `keep_for` (seconds, the
+session TTL) an older version is only dropped once it has been neither current nor resolved by
+get() for that long, so sessions still pinned to it can finish. Versions are content hashes,
+so an unchanged file keeps its version across reloads and restarts.
+
+With `artifact` (a file path), compiled flows are also pickled there keyed by (file, version)
+and a fingerprint of the compiler sources. A later start whose files hash the same takes the
+flows from the artifact and never imports PyYAML. The artifact is a local cache written by this
+process; a stale or unreadable one is ignored and rewritten.
+"""
+import hashlib
+import os
+import pickle
+import sys
+import threading
+import time
+from collections.abc import Mapping
+from typing import Dict, Iterator, Optional, Tuple
+
+from flow_engine import FlowError, FlowGraph, compile_flow
+
+ARTIFACT_FORMAT = 1
+_ENGINE_SOURCES = ("flow_engine.py", "flow_expr.py")
+
+
+class _FileState:
+    __slots__ = ("mtime_ns", "size", "version", "flow_id")
+
+    def __init__(self, mtime_ns: int, size: int, version: str, flow_id: str):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.version = version
+        self.flow_id = flow_id
+
+
+def flow_version(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def _engine_fingerprint() -> str:
+    """Artifacts are only valid for the compiler that produced them."""
+    h = hashlib.sha256(f"{ARTIFACT_FORMAT}:{sys.version_info[:2]}".encode())
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in _ENGINE_SOURCES:
+        with open(os.path.join(here, name), "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+def _parse(data: bytes, fname: str, version: str) -> FlowGraph:
+    import yaml
+    try:
+        raw = yaml.safe_load(data)
+    except yaml.YAMLError as e:
+        raise FlowError(f"invalid YAML: {e}") from None
+    if not isinstance(raw, dict):
+        raise FlowError("top level must be a mapping")
+    fid = raw.get("id") or os.path.splitext(fname)[0]
+    return compile_flow(raw, fid, version=version)
+
+
+class FlowRegistry(Mapping):
+    def __init__(self, dirpath: str, keep_versions: int = 8, artifact: Optional[str] = None,
+                 keep_for: Optional[float] = None):
+        self.dirpath = dirpath
+        self.keep_versions = keep_versions
+        self.keep_for = keep_for
+        self.artifact = artifact
+        self._fingerprint = _engine_fingerprint() if artifact else None
+        self._cached: Dict[Tuple[str, str], FlowGraph] = self._read_artifact()
+        self.artifact_hits = 0
+        self._flows: Dict[str, FlowGraph] = {}
+        self._files: Dict[str, _FileState] = {}
+        self._versions: Dict[Tuple[str, str], FlowGraph] = {}
+        self._last_used: Dict[Tuple[str, str], float] = {}     # superseded version -> last current / get()
+        self._lock = threading.Lock()          # serializes reloads; readers never take it
+        self.reloads = 0
+        self.reparsed = 0
+        self.failed_reloads = 0
+        self.last_reload: Optional[float] = None
+
+        report = self.reload()
+        if report["errors"]:
+            raise FlowError("; ".join(f"{f}: {e}" for f, e in sorted(report["errors"].items())))
+
+    # ---------------- mapping over the current snapshot ----------------
+    def __getitem__(self, flow_id: str) -> FlowGraph:
+        return self._flows[flow_id]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._flows)
+
+    def __len__(self) -> int:
+        return len(self._flows)
+
+    def get(self, flow_id: str, version: Optional[str] = None, default=None):
+        """Current flow, or with `version` that exact version (None if it is no longer kept)."""
+        if version is None:
+            return self._flows.get(flow_id, default)
+        flow = self._versions.get((flow_id, version))
+        if flow is None:
+            return default
+        if (flow_id, version) in self._last_used:
+            self._last_used[(flow_id, version)] = time.time()
+        return flow
+
+    def versions(self) -> Dict[str, str]:
+        return {fid: flow.version for fid, flow in self._flows.items()}
+
+    # ---------------- reload ----------------
+    def _scan(self) -> Dict[str, os.stat_result]:
+        out = {}
+        for entry in os.scandir(self.dirpath):
+            if entry.name.endswith(".yaml") and entry.is_file():
+                out[entry.name] = entry.stat()
+        return out
+
+    def changed(self) -> bool:
+        """Cheap check (stat only) for added, removed or touched files."""
+        scan = self._scan()
+        if scan.keys() != self._files.keys():
+            return True
+        return any((st.st_mtime_ns, st.st_size) != (self._files[f].mtime_ns, self._files[f].size)
+                   for f, st in scan.items())
+
+    def reload(self) -> Dict[str, object]:
+        """
+        Re-read changed files and swap in the new snapshot. If any changed file fails to parse or
+        compile, nothing is swapped and the errors are reported (the current flows stay live).
+        """
+        with self._lock:
+            scan = self._scan()
+            files = {}
+            flows = {}
+            compiled = {}
+            errors = {}
+            changed, unchanged, parsed = [], 0, 0
+            for fname, st in sorted(scan.items()):
+                old = self._files.get(fname)
+                if old and (old.mtime_ns, old.size) == (st.st_mtime_ns, st.st_size) and old.flow_id in self._flows:
+                    files[fname] = old
+                    flows[old.flow_id] = self._flows[old.flow_id]
+                    unchanged += 1
+                    continue
+                try:
+                    with open(os.path.join(self.dirpath, fname), "rb") as f:
+                        data = f.read()
+                    version = flow_version(data)
+                    if old and old.version == version and old.flow_id in self._flows:
+                        flow = self._flows[old.flow_id]          # touched, same content
+                        unchanged += 1
+                    else:
+                        flow = self._cached.get((fname, version))
+                        if flow is not None:
+                            self.artifact_hits += 1
+                        else:
+                            flow = _parse(data, fname, version)
+                            parsed += 1
+                        compiled[flow.id] = flow
+                        changed.append(flow.id)
+                except (OSError, FlowError) as e:
+                    errors[fname] = str(e)
+                    continue
+                if flow.id in flows:
+                    errors[fname] = f"duplicate flow id {flow.id!r}"
+                    continue
+                files[fname] = _FileState(st.st_mtime_ns, st.st_size, flow.version, flow.id)
+                flows[flow.id] = flow
+
+            self.reloads += 1
+            self.last_reload = time.time()
+            removed = sorted(set(self._flows) - set(flows))
+            if errors:
+                self.failed_reloads += 1
+                return {"ok": False, "changed": [], "removed": [], "unchanged": unchanged,
+                        "errors": errors, "versions": self.versions()}
+
+            versions = dict(self._versions)
+            now = time.time()
+            for fid, flow in compiled.items():
+                old = self._flows.get(fid)
+                if old is not None and old.version != flow.version:
+                    self._last_used[(fid, old.version)] = now
+                key = (fid, flow.version)
+                self._last_used.pop(key, None)
+                versions.pop(key, None)         # re-insert: a version that is current again is newest
+                versions[key] = flow
+                kept = [k for k in versions if k[0] == fid]
+                for k in kept[:-self.keep_versions]:
+                    if self.keep_for and now - self._last_used.get(k, 0.0) < self.keep_for:
+                        continue                # sessions may still be pinned to it
+                    del versions[k]
+                    self._last_used.pop(k, None)
+
+            # publish: each assignment is atomic; readers see the old or the new snapshot
+            self._versions = versions
+            self._files = files
+            self._flows = flows
+            self.reparsed += parsed
+            if parsed or removed:
+                self._write_artifact()
+            return {"ok": True, "changed": sorted(changed), "removed": removed, "unchanged": unchanged,
+                    "errors": {}, "versions": self.versions()}
+
+    # ---------------- compiled artifact ----------------
+    def _read_artifact(self) -> Dict[Tuple[str, str], FlowGraph]:
+        if not self.artifact or not os.path.exists(self.artifact):
+            return {}
+        try:
+            with open(self.artifact, "rb") as f:
+                data = pickle.load(f)
+            if data.get("fingerprint") != self._fingerprint:
+                return {}
+            return data["flows"]
+        except Exception as e:
+            print("FLOW_ARTIFACT_IGNORED:", self.artifact, repr(e))
+            return {}
+
+    def _write_artifact(self):
+        if not self.artifact:
+            return
+        flows = {(fname, st.version): self._flows[st.flow_id] for fname, st in self._files.items()}
+        tmp = f"{self.artifact}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                pickle.dump({"fingerprint": self._fingerprint, "flows": flows}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.artifact)
+            self._cached = flows
+        except OSError as e:
+            print("FLOW_ARTIFACT_WRITE_FAIL:", self.artifact, e)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "flows": len(self._flows),
+            "versions_kept": len(self._versions),
+            "reloads": self.reloads,
+            "reparsed": self.reparsed,
+            "artifact_hits": self.artifact_hits,
+            "failed_reloads": self.failed_reloads,
+            "last_reload": self.last_reload,
+        }
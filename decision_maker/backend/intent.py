@@ -0,0 +1,154 @@
+# backend/intent.py
+"""
+Helper-vs-answer routing: is the user asking about the current question, or answering it?
+
+QuestionClassifier is a logistic regression over hashed features (words, word bigrams, first and
+last words, '?', character 3/4-grams), trained with NumPy on labelled examples (intent_train.jsonl)
+in well under a second. Prediction is pure Python over the sparse features (about 0.1 ms per
+message). Until it is trained, and whenever its confidence max(p, 1 - p) is below
+`threshold`, the keyword heuristic decides.
+
+Examples are JSON lines {"text": ..., "label": "question" | "answer"}; bench/bench_intent.py builds
+more of them from the session event log and compares the classifier with the heuristic.
+"""
+import json
+import math
+import re
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+QUESTION, ANSWER = "question", "answer"
+MAX_CHARS = 400
+_WORD = re.compile(r"[a-z0-9']+|\?")
+
+
+def heuristic_is_question(text: str) -> bool:
+    """The original keyword rule."""
+    if not text: return False
+    t = text.strip().lower()
+    return (
+        t.endswith("?")
+        or t.startswith(("what ", "how ", "why ", "which ", "could ", "can ", "should ", "help", "examples"))
+        or "i'm not sure" in t or "im not sure" in t or "i don't know" in t or "i dont know" in t
+    )
+
+
+def features(text: str, dim: int) -> Dict[int, float]:
+    """L2-normalized hashed feature counts (crc32, so indices are stable across processes)."""
+    t = " ".join(text.lower().replace("’", "'").split())[:MAX_CHARS]
+    words = _WORD.findall(t)
+    grams = ["w:" + w for w in words]
+    grams += ["b:" + a + " " + b for a, b in zip(words, words[1:])]
+    if words:
+        grams += ["first:" + words[0], "first2:" + " ".join(words[:2]), "last:" + words[-1]]
+    grams.append(f"len:{min(len(words), 16) // 4}")
+    if t.endswith("?"):
+        grams.append("end:?")
+    padded = f"<{t}>"
+    for n in (3, 4):
+        grams += ["c:" + padded[i:i + n] for i in range(len(padded) - n + 1)]
+
+    counts: Dict[int, float] = {}
+    mask = dim - 1
+    for g in grams:
+        i = zlib.crc32(g.encode("utf-8")) & mask
+        counts[i] = counts.get(i, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+    return {i: v / norm for i, v in counts.items()}
+
+
+def load_examples(paths: Iterable[str]) -> Tuple[List[str], List[str]]:
+    texts, labels = [], []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                ex = json.loads(line)
+                if ex.get("label") in (QUESTION, ANSWER) and str(ex.get("text") or "").strip():
+                    texts.append(ex["text"])
+                    labels.append(ex["label"])
+    return texts, labels
+
+
+class QuestionClassifier:
+    def __init__(self, dim: int = 1 << 14, threshold: float = 0.65):
+        if dim & (dim - 1):
+            raise ValueError("dim must be a power of two")
+        self.dim = dim
+        self.threshold = threshold
+        self._model: Optional[Tuple[List[float], float]] = None     # (weights, bias), swapped as one
+        self.trained_on = 0
+        self.by_model = 0
+        self.by_heuristic = 0
+        self.not_ready = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._model is not None
+
+    def fit(self, texts: Sequence[str], labels: Sequence[str], epochs: int = 800,
+            lr: float = 4.0, l2: float = 1e-4) -> "QuestionClassifier":
+        """Full-batch gradient descent on the sparse feature matrix (COO arrays + bincount)."""
+        import numpy as np
+        rows, cols, vals = [], [], []
+        for r, text in enumerate(texts):
+            for i, v in features(text, self.dim).items():
+                rows.append(r)
+                cols.append(i)
+                vals.append(v)
+        n = len(texts)
+        if not n or len(set(labels)) < 2:
+            raise ValueError("need examples of both labels")
+        rows, cols, vals = np.array(rows), np.array(cols), np.array(vals)
+        y = np.array([lab == QUESTION for lab in labels], dtype=float)
+        w = np.zeros(self.dim)
+        b = 0.0
+        for _ in range(epochs):
+            z = np.bincount(rows, weights=w[cols] * vals, minlength=n) + b
+            err = 1.0 / (1.0 + np.exp(-z)) - y
+            grad = np.bincount(cols, weights=err[rows] * vals, minlength=self.dim) / n + l2 * w
+            w -= lr * grad
+            b -= lr * err.mean()
+        self._model = (w.tolist(), float(b))
+        self.trained_on = n
+        return self
+
+    def fit_files(self, paths: Iterable[str]) -> "QuestionClassifier":
+        return self.fit(*load_examples(paths))
+
+    def prob(self, text: str) -> float:
+        """P(question); requires a trained model."""
+        w, b = self._model
+        z = b + sum(w[i] * v for i, v in features(text, self.dim).items())
+        return 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, z))))
+
+    def decide(self, text: str) -> Tuple[bool, Optional[float], str]:
+        """(is_question, model confidence or None, "model" | "heuristic")."""
+        if not text or not text.strip():
+            return False, None, "heuristic"
+        if self._model is None:
+            self.not_ready += 1
+            return heuristic_is_question(text), None, "heuristic"
+        p = self.prob(text)
+        conf = max(p, 1.0 - p)
+        if conf >= self.threshold:
+            self.by_model += 1
+            return p >= 0.5, conf, "model"
+        self.by_heuristic += 1
+        return heuristic_is_question(text), conf, "heuristic"
+
+    def is_question(self, text: str) -> bool:
+        return self.decide(text)[0]
+
+    def stats(self) -> Dict[str, object]:
+        decided = self.by_model + self.by_heuristic
+        return {
+            "ready": self.ready,
+            "trained_on": self.trained_on,
+            "threshold": self.threshold,
+            "by_model": self.by_model,
+            "by_heuristic": self.by_heuristic,
+            "not_ready": self.not_ready,
+            "model_share": round(self.by_model / decided, 4) if decided else 0.0,
+        }
@@ -0,0 +1,149 @@
+# backend/llm_cache.py
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+_WS = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    return _WS.sub(" ", str(text)).strip()
+
+
+def cache_key(model: str, msgs, params: Optional[Dict[str, Any]] = None) -> str:
+    """Content hash of model name + normalized (role, content) messages + call parameters."""
+    payload = {
+        "model": model,
+        "messages": [(getattr(m, "type", "user"), normalize_text(getattr(m, "content", m))) for m in msgs],
+        "params": params or {},
+    }
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache for deterministic (temperature 0) model replies, keyed by cache_key().
+      memory: LRU of `max_entries`
+      disk:   optional SQLite file, TTL + `disk_max_entries` (least recently used evicted first),
+              swept every `evict_every` seconds rather than on each put
+    Disk hits are promoted to memory.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl: Optional[float] = 24 * 3600,
+                 disk_path: Optional[str] = None, disk_max_entries: int = 50_000, evict_every: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_max_entries = disk_max_entries
+        self.evict_every = evict_every      # disk may overshoot disk_max_entries in between
+        self._next_evict = 0.0
+        self._mem: "OrderedDict[str, tuple]" = OrderedDict()    # key -> (stored_at, content)
+        self._lock = threading.Lock()
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+        self.evictions = 0
+
+        self.disk_path = disk_path
+        self._db = None
+        if disk_path:
+            self._connect()
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, content TEXT NOT NULL, stored REAL NOT NULL, used REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_used ON responses (used)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_stored ON responses (stored)")
+
+    def _connect(self):
+        self._db = sqlite3.connect(self.disk_path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+
+    def after_fork(self):
+        """Reopen per-process handles in a forked worker (serve.py)."""
+        self._lock = threading.Lock()
+        if self.disk_path:
+            self._connect()
+
+    def _fresh(self, stored: float, now: float) -> bool:
+        return not self.ttl or now - stored <= self.ttl
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            item = self._mem.get(key)
+            if item is not None:
+                if self._fresh(item[0], now):
+                    self._mem.move_to_end(key)
+                    self.hits["memory"] += 1
+                    return item[1]
+                del self._mem[key]
+                self.evictions += 1
+
+            if self._db is not None:
+                row = self._db.execute("SELECT content, stored FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None and self._fresh(row[1], now):
+                    self._db.execute("UPDATE responses SET used = ? WHERE key = ?", (now, key))
+                    self._remember(key, row[1], row[0])
+                    self.hits["disk"] += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, content: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, content)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, content, stored, used) VALUES (?, ?, ?, ?)",
+                    (key, content, now, now))
+                if time.monotonic() >= self._next_evict:
+                    self._evict_disk(now)
+
+    def _remember(self, key, stored, content):
+        self._mem[key] = (stored, content)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+            self.evictions += 1
+
+    def _evict_disk(self, now):
+        # periodic sweep: both deletes walk an index (stored / used) from the oldest end
+        self._next_evict = time.monotonic() + self.evict_every
+        if self.ttl:
+            cur = self._db.execute("DELETE FROM responses WHERE stored < ?", (now - self.ttl,))
+            self.evictions += max(cur.rowcount, 0)
+        excess = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.disk_max_entries
+        if excess > 0:
+            cur = self._db.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY used LIMIT ?)", (excess,))
+            self.evictions += max(cur.rowcount, 0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "memory_size": len(self._mem),
+            "disk": self._db is not None,
+            "hits_memory": self.hits["memory"],
+            "hits_disk": self.hits["disk"],
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def make_response_cache() -> ResponseCache:
+    """
+    Env: LLM_CACHE_SIZE (memory entries), LLM_CACHE_TTL (seconds, 0 disables),
+         LLM_CACHE_DB (SQLite path; enables the disk tier), LLM_CACHE_DB_SIZE
+    """
+    return ResponseCache(
+        max_entries=int(os.getenv("LLM_CACHE_SIZE", 2048)),
+        ttl=float(os.getenv("LLM_CACHE_TTL", 24 * 3600)) or None,
+        disk_path=os.getenv("LLM_CACHE_DB") or None,
+        disk_max_entries=int(os.getenv("LLM_CACHE_DB_SIZE", 50_000)),
+    )
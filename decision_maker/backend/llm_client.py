@@ -0,0 +1,469 @@
+# backend/llm_client.py
+import asyncio
+import contextvars
+import math
+import os
+import random
+import time
+from typing import Dict, Optional
+
+import metrics
+from llm_cache import cache_key
+from transcript import count_tokens
+
+# Call priority: interactive turns go before background work (speculative axes etc.) when
+# slots or rate budget are scarce. Set per task with as_background().
+INTERACTIVE, BACKGROUND = 0, 1
+_priority: contextvars.ContextVar = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_key(name: str) -> str:
+    return name.upper().replace("-", "_").replace(".", "_")
+
+
+async def as_background(coro):
+    """Await `coro` with every model call it makes at background priority."""
+    token = _priority.set(BACKGROUND)
+    try:
+        return await coro
+    finally:
+        _priority.reset(token)
+
+
+class LLMBusy(Exception):
+    """Raised when a model client has no free slot (or rate budget) within its queue timeout."""
+
+    def __init__(self, name: str, retry_after: int):
+        super().__init__(f"{name} model busy")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class _Ticket:
+    """A queued call's priority; raised in place when an interactive caller joins the call."""
+    __slots__ = ("priority",)
+
+    def __init__(self, priority: int):
+        self.priority = priority
+
+
+class _PrioritySlots:
+    """Counting semaphore that hands freed slots to the best (priority, arrival) waiter."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.used = 0
+        self._waiters = []          # [ticket, seq, future]
+        self._seq = 0
+
+    async def acquire(self, ticket: _Ticket, timeout: float):
+        if self.used < self.capacity and not self._waiters:
+            self.used += 1
+            return
+        self._seq += 1
+        waiter = [ticket, self._seq, asyncio.get_running_loop().create_future()]
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter[2], timeout=max(0.0, timeout))
+        except BaseException:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif waiter[2].done() and not waiter[2].cancelled():
+                self.release()      # the slot was handed over just as we gave up
+            raise
+
+    def release(self):
+        while self._waiters:
+            best = min(self._waiters, key=lambda w: (w[0].priority, w[1]))
+            self._waiters.remove(best)
+            if not best[2].done():
+                best[2].set_result(None)        # slot passes straight to the waiter
+                return
+        self.used -= 1
+
+
+class RateBudget:
+    """
+    Requests- and tokens-per-minute for one model, as two token buckets shared by every client
+    of that model (0 = unlimited). Background calls leave `background_reserve` of each bucket
+    for interactive ones. block() pauses everyone after the provider answers 429.
+    """
+
+    def __init__(self, rpm: float = 0, tpm: float = 0, background_reserve: float = 0.2):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.background_reserve = background_reserve
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._t = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        dt = now - self._t
+        self._t = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + dt * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + dt * self.tpm / 60)
+
+    def wait_time(self, tokens: int, priority: int) -> float:
+        """Seconds until a call of `tokens` may start (0 = now)."""
+        now = time.monotonic()
+        self._refill(now)
+        reserve = self.background_reserve if priority == BACKGROUND else 0.0
+        wait = max(0.0, self.blocked_until - now)
+        if self.rpm:
+            need = 1 + self.rpm * reserve
+            if self._requests < need:
+                wait = max(wait, (need - self._requests) * 60 / self.rpm)
+        if self.tpm:
+            need = min(tokens, self.tpm * (1 - reserve)) + self.tpm * reserve
+            if self._tokens < need:
+                wait = max(wait, (need - self._tokens) * 60 / self.tpm)
+        return wait
+
+    def take(self, tokens: int):
+        if self.rpm:
+            self._requests -= 1
+        if self.tpm:
+            self._tokens -= tokens
+
+    def adjust(self, tokens: int):
+        """Correct a reservation once the real usage is known (positive = used more)."""
+        if self.tpm:
+            self._tokens -= tokens
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+_BUDGETS: Dict[str, RateBudget] = {}
+
+
+def rate_budget(model: str) -> RateBudget:
+    """Shared budget for `model`: LLM_RPM_<MODEL> / LLM_TPM_<MODEL>, else LLM_RPM / LLM_TPM."""
+    if model not in _BUDGETS:
+        key = _env_key(model)
+        _BUDGETS[model] = RateBudget(
+            rpm=_env_float(f"LLM_RPM_{key}", _env_float("LLM_RPM", 0)),
+            tpm=_env_float(f"LLM_TPM_{key}", _env_float("LLM_TPM", 0)),
+            background_reserve=_env_float("LLM_BACKGROUND_RESERVE", 0.2),
+        )
+    return _BUDGETS[model]
+
+
+def _retry_delay(e: Exception, attempt: int, base: float = 0.5, cap: float = 20.0) -> Optional[float]:
+    """Backoff before retrying `e` (429, 5xx, connection/timeout), or None if it is not retryable."""
+    response = getattr(e, "response", None)
+    status = getattr(e, "status_code", None) or getattr(response, "status_code", None)
+    transient = type(e).__name__ in ("APIConnectionError", "APITimeoutError")
+    if not (status == 429 or (status and status >= 500) or transient):
+        return None
+    try:
+        retry_after = float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        retry_after = None
+    if retry_after is not None:
+        return min(cap, retry_after) + random.uniform(0, base)
+    d = min(cap, base * 2 ** attempt)
+    return d / 2 + random.uniform(0, d / 2)       # "equal jitter": spread retries of a burst
+
+
+def _is_rate_limit(e: Exception) -> bool:
+    status = getattr(e, "status_code", None) or getattr(getattr(e, "response", None), "status_code", None)
+    return status == 429
+
+
+class _InFlight:
+    __slots__ = ("ticket", "task")
+
+    def __init__(self, ticket: _Ticket, task: asyncio.Task):
+        self.ticket = ticket
+        self.task = task
+
+
+class LimitedLLM:
+    """
+    Async front for a chat model client; every model call in the app goes through one.
+
+    - concurrency: at most `max_concurrency` calls in flight; the rest queue (interactive before
+      background) for up to `queue_timeout` seconds, then get LLMBusy (-> 429)
+    - rate budget: requests/tokens per minute per model (rate_budget), waited for within the
+      same queue timeout
+    - coalescing: an ainvoke identical to one already in flight (same model, messages, params)
+      waits for that call instead of sending another
+    - retries: 429 / 5xx / connection errors are retried up to `max_retries` times with
+      jittered backoff (honouring Retry-After); a 429 also pauses the model's budget
+
+    Limits come from the arguments, else LLM_MAX_CONCURRENCY_<NAME> / LLM_QUEUE_TIMEOUT_<NAME> /
+    LLM_MAX_RETRIES_<NAME>, else the global LLM_MAX_CONCURRENCY / LLM_QUEUE_TIMEOUT / LLM_MAX_RETRIES.
+
+    With a `cache` (llm_cache.ResponseCache), ainvoke answers repeated prompts from it; only
+    replies accepted by `cache_if(content)` are stored. Meant for temperature-0 clients.
+
+    `client` may be a zero-argument factory; it is then called on first use, so importing the
+    app does not construct (or import) the model SDK. Pass `model` so model_name is known early,
+    and give the factory a `kwargs` dict (temperature, model_kwargs) so cache keys can be computed
+    without building the client.
+    """
+
+    def __init__(self, client, name: str, max_concurrency: int = None, queue_timeout: float = None,
+                 cache=None, cache_if=None, model: str = None, max_retries: int = None):
+        self._client = client if hasattr(client, "ainvoke") else None
+        self._factory = None if self._client is not None else client
+        self._model = model
+        self._params = None     # cache-key parameters, see params
+        self.name = name
+        self.cache = cache
+        self.cache_if = cache_if
+        key = _env_key(name)
+        self.max_concurrency = max_concurrency or _env_int(
+            f"LLM_MAX_CONCURRENCY_{key}", _env_int("LLM_MAX_CONCURRENCY", 8))
+        self.queue_timeout = queue_timeout if queue_timeout is not None else _env_float(
+            f"LLM_QUEUE_TIMEOUT_{key}", _env_float("LLM_QUEUE_TIMEOUT", 10.0))
+        self.max_retries = max_retries if max_retries is not None else _env_int(
+            f"LLM_MAX_RETRIES_{key}", _env_int("LLM_MAX_RETRIES", 3))
+        self._slots = _PrioritySlots(self.max_concurrency)
+        self._inflight: Dict[str, _InFlight] = {}
+        self._budget: Optional[RateBudget] = None
+        # token accounting; provider usage when reported, else a local estimate
+        self.calls = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.saved_prompt_tokens = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self._factory()
+        return self._client
+
+    @client.setter
+    def client(self, value):
+        self._client = value
+        self._params = None
+
+    @property
+    def model_name(self) -> str:
+        if self._model:
+            return self._model
+        return getattr(self.client, "model_name", None) or self.name
+
+    @property
+    def budget(self) -> RateBudget:
+        if self._budget is None:
+            self._budget = rate_budget(self.model_name)
+        return self._budget
+
+    @property
+    def in_flight(self) -> int:
+        return self._slots.used
+
+    @property
+    def params(self) -> dict:
+        if self._params is None:
+            src = getattr(self._factory, "kwargs", None) if self._client is None else None
+            get = src.get if src is not None else (lambda k: getattr(self.client, k, None))
+            self._params = {"temperature": get("temperature"), "model_kwargs": get("model_kwargs")}
+        return self._params
+
+    def _expected_completion(self) -> int:
+        return self.completion_tokens // self.calls if self.calls else 300
+
+    async def _admit(self, tokens: int, ticket: _Ticket, deadline: float):
+        """Wait for rate budget, then for a slot; LLMBusy if that cannot happen by `deadline`."""
+        t0 = time.perf_counter()
+        waited = False
+        while True:
+            wait = self.budget.wait_time(tokens, ticket.priority)
+            if wait <= 0:
+                self.budget.take(tokens)
+                break
+            if time.monotonic() + wait > deadline:
+                metrics.METRICS.inc(metrics.LLM_BUSY, client=self.name)
+                raise LLMBusy(self.name, max(1, math.ceil(wait)))
+            waited = True
+            await asyncio.sleep(min(wait, 1.0))     # re-check: priority may rise, 429 pauses may end
+        if waited:
+            metrics.METRICS.observe(metrics.LLM_BUDGET_SECONDS, time.perf_counter() - t0, client=self.name)
+
+        t1 = time.perf_counter()
+        try:
+            await self._slots.acquire(ticket, deadline - time.monotonic())
+        except asyncio.TimeoutError:
+            self.budget.adjust(-tokens)
+            metrics.METRICS.inc(metrics.LLM_BUSY, client=self.name)
+            raise LLMBusy(self.name, max(1, math.ceil(self.queue_timeout)))
+        metrics.METRICS.observe(metrics.LLM_QUEUE_SECONDS, time.perf_counter() - t1, client=self.name)
+
+    def _backoff(self, e: Exception, attempt: int) -> Optional[float]:
+        metrics.METRICS.inc(metrics.LLM_ERRORS, client=self.name, error=type(e).__name__)
+        delay = _retry_delay(e, attempt) if attempt < self.max_retries else None
+        if delay is None:
+            return None
+        if _is_rate_limit(e):
+            self.budget.block(delay)
+        self.retries += 1
+        metrics.METRICS.inc(metrics.LLM_RETRIES, client=self.name)
+        return delay
+
+    async def ainvoke(self, msgs):
+        key = cache_key(self.model_name, msgs, self.params)
+        if self.cache is not None:
+            hit = self.cache.get(key)
+            if hit is not None:
+                from langchain_core.messages import AIMessage
+                self.cache_hits += 1
+                self.saved_prompt_tokens += self._estimate(msgs)
+                metrics.METRICS.inc(metrics.LLM_CACHE_HITS, client=self.name, **metrics.turn_labels())
+                return AIMessage(content=hit)
+
+        call = self._inflight.get(key)
+        if call is not None:
+            # same request already on its way: share its reply
+            self.coalesced += 1
+            self.saved_prompt_tokens += self._estimate(msgs)
+            metrics.METRICS.inc(metrics.LLM_COALESCED, client=self.name)
+            call.ticket.priority = min(call.ticket.priority, _priority.get())
+            return await asyncio.shield(call.task)
+
+        ticket = _Ticket(_priority.get())
+        call = _InFlight(ticket, asyncio.ensure_future(self._call(msgs, key, ticket)))
+        self._inflight[key] = call
+
+        def _done(task, key=key, call=call):
+            if self._inflight.get(key) is call:
+                del self._inflight[key]
+            if not task.cancelled():
+                task.exception()        # retrieved: waiters may all have gone
+
+        call.task.add_done_callback(_done)
+        # shielded: a caller that goes away does not cancel the call others are waiting on
+        return await asyncio.shield(call.task)
+
+    async def _call(self, msgs, key: str, ticket: _Ticket):
+        deadline = time.monotonic() + self.queue_timeout
+        prompt = self._estimate(msgs)
+        reserved = prompt + self._expected_completion()
+        attempt = 0
+        while True:
+            await self._admit(reserved, ticket, deadline)
+            try:
+                resp = await self.client.ainvoke(msgs)
+            except Exception as e:
+                delay = self._backoff(e, attempt)
+                if delay is None:
+                    raise
+            else:
+                break
+            finally:
+                self._slots.release()
+            attempt += 1
+            await asyncio.sleep(delay)
+            deadline = max(deadline, time.monotonic() + self.queue_timeout)
+
+        used = self._account(msgs, resp)
+        self.budget.adjust(used - reserved)
+        if self.cache is not None and (self.cache_if is None or self.cache_if(resp.content)):
+            self.cache.put(key, resp.content)
+        return resp
+
+    async def astream(self, msgs):
+        """
+        Yield reply text chunks; the slot is held until the stream is exhausted or closed.
+        Failures before the first chunk are retried like ainvoke; streams are never coalesced.
+        """
+        ticket = _Ticket(_priority.get())
+        deadline = time.monotonic() + self.queue_timeout
+        prompt = self._estimate(msgs)
+        reserved = prompt + self._expected_completion()
+        attempt = 0
+        while True:
+            await self._admit(reserved, ticket, deadline)
+            text = ""
+            delay = None
+            try:
+                async for chunk in self.client.astream(msgs):
+                    if chunk.content:
+                        text += chunk.content
+                        yield chunk.content
+            except Exception as e:
+                if text:        # part of the reply is already out; cannot start over
+                    metrics.METRICS.inc(metrics.LLM_ERRORS, client=self.name, error=type(e).__name__)
+                    raise
+                delay = self._backoff(e, attempt)
+                if delay is None:
+                    raise
+            finally:
+                self._slots.release()
+                if delay is None:
+                    completion = count_tokens(text, self.model_name)
+                    self._record(prompt, completion)
+                    self.budget.adjust(prompt + completion - reserved)
+            if delay is None:
+                return
+            attempt += 1
+            await asyncio.sleep(delay)
+            deadline = max(deadline, time.monotonic() + self.queue_timeout)
+
+    def _estimate(self, msgs) -> int:
+        return sum(count_tokens(str(getattr(m, "content", m)), self.model_name) for m in msgs)
+
+    def _account(self, msgs, resp) -> int:
+        usage = getattr(resp, "usage_metadata", None) or {}
+        prompt = usage.get("input_tokens") or self._estimate(msgs)
+        completion = usage.get("output_tokens") or count_tokens(str(resp.content), self.model_name)
+        self._record(prompt, completion)
+        return prompt + completion
+
+    def _record(self, prompt: int, completion: int):
+        self.calls += 1
+        self.prompt_tokens += prompt
+        self.completion_tokens += completion
+        labels = {"client": self.name, "model": self.model_name, **metrics.turn_labels()}
+        metrics.METRICS.inc(metrics.LLM_CALLS, **labels)
+        metrics.METRICS.inc(metrics.LLM_TOKENS, prompt, kind="prompt", **labels)
+        metrics.METRICS.inc(metrics.LLM_TOKENS, completion, kind="completion", **labels)
+
+    def usage(self) -> dict:
+        return {
+            "model": self.model_name,
+            "calls": self.calls,
+            "cache_hits": self.cache_hits,
+            "coalesced": self.coalesced,
+            "retries": self.retries,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "saved_prompt_tokens": self.saved_prompt_tokens,
+        }
+
+
+class LazyPrompt:
+    """Chat prompt given as (role, template) pairs; the ChatPromptTemplate is built on first use."""
+
+    def __init__(self, messages):
+        self.messages = messages
+        self._template = None
+
+    def format_messages(self, **kwargs):
+        if self._template is None:
+            from langchain_core.prompts import ChatPromptTemplate
+            self._template = ChatPromptTemplate.from_messages(self.messages)
+        return self._template.format_messages(**kwargs)
@@ -1,34 +1,78 @@
 # backend/main.py
+import asyncio
 import os
+import signal
+import time
 from typing import Optional, Dict, Any, List
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError
 from dotenv import load_dotenv
 
-from langchain_openai import ChatOpenAI
-from langchain.prompts import ChatPromptTemplate
-
-from flow_engine import load_flows, next_node
+from flow_engine import next_node, advance, FlowGraph, Ask, render_step
+from flow_cursor import CursorError, make_cursor_signer
+from flow_registry import FlowRegistry
+from llm_client import LazyPrompt, LimitedLLM, LLMBusy, as_background
+from llm_cache import make_response_cache
+import prevalidate
+from transcript import TranscriptManager, render_known_answers
+from speculative import SpeculativeWork
+from intent import QuestionClassifier
+from semantic_cache import SemanticCache
+import metrics
+from metrics import METRICS, span
+
+from session_store import make_session_store, new_session
+from event_log import make_event_log
 
 import json
-from collections import defaultdict
-
-# ---------------- Session Store ----------------
-SESSIONS = defaultdict(lambda: {
-    "flow_id": None,
-    "node_id": None,
-    "awaiting": None,        # ask.id currently being filled
-    "answers": {},
-    "field_chat": [],        # transcript for this ask.id (user + assistant lines)
-})
 
 # ---------------- Setup & Flow Registry ----------------
 load_dotenv()
 
+# ---------------- Session Store ----------------
+SESSION_STORE = make_session_store()
+AXES_STORE = make_session_store("axes")     # serve.py: background axes, outside the sessions' keys and size limit
+# Every turn is also appended to EVENT_LOG (off the request path); a session missing from the
+# store (restart, eviction) is rebuilt from it, and /session/{id}/events|replay serve history.
+EVENT_LOG = make_event_log()
+
 FLOWS_DIR = os.path.join(os.path.dirname(__file__), "flows")
-FLOW_REGISTRY: Dict[str, dict] = load_flows(FLOWS_DIR)
+# Reloadable (POST /flows/reload, or FLOWS_WATCH=<seconds> to poll the directory; under serve.py
+# SIGHUP to the master reloads every worker); sessions stay on the flow version they started with.
+# Compiled flows are cached in FLOWS_ARTIFACT (set it empty to disable) so restarts skip YAML.
+FLOWS_ARTIFACT = os.getenv("FLOWS_ARTIFACT", os.path.join(os.path.dirname(__file__), ".flows.pickle"))
+FLOW_REGISTRY = FlowRegistry(FLOWS_DIR, keep_versions=int(os.getenv("FLOWS_KEEP_VERSIONS", 8)),
+                             artifact=FLOWS_ARTIFACT or None, keep_for=SESSION_STORE.ttl)
+FLOWS_WATCH = float(os.getenv("FLOWS_WATCH", 0))
+FLOWS_ADMIN_TOKEN = os.getenv("FLOWS_ADMIN_TOKEN")
+# /session/{id}/events|replay expose users' answers: refused unless a token is configured
+EVENTS_ADMIN_TOKEN = os.getenv("EVENTS_ADMIN_TOKEN") or FLOWS_ADMIN_TOKEN
+# /flow/next resume points (flow version + node + answers), HMAC-signed
+FLOW_CURSORS = make_cursor_signer()
+# Flow prompts may carry {axis}-style placeholders, rendered per session context (flow_engine.Template)
+def prompt_context(flow: FlowGraph, answers: dict, context: Optional[dict]) -> dict:
+    """What prompt placeholders are filled from: persona, earlier answers, client context (axis)."""
+    return {"persona": flow.persona_prefix, **answers, **(context or {})}
+
+def pinned_flow(sess: dict, current: FlowGraph) -> FlowGraph:
+    """The flow version a running session started on; falls back to `current` when it is gone."""
+    version = sess.get("flow_version")
+    if not version or version == current.version:
+        return current
+    flow = FLOW_REGISTRY.get(current.id, version)
+    if flow is not None:
+        return flow
+    # no longer kept: carry on with the current version if the session's place still exists
+    node = current.nodes.get(sess["node_id"])
+    if node is not None and (not sess["awaiting"] or sess["awaiting"] in node.asks_by_id):
+        sess["flow_version"] = current.version
+        return current
+    print("FLOW_VERSION_GONE:", current.id, version)
+    sess["flow_id"] = None      # restart the flow
+    return current
 
 # Map frontend tool slugs -> flow IDs (YAML 'id' fields)
 TOOL_TO_FLOW = {
@@ -53,7 +97,26 @@ TOOL_TO_FLOW = {
 }
 
 # ---------------- LLM Setup ----------------
-llm = ChatOpenAI(model="gpt-4o", temperature=0)
+# Validator and axes calls run at temperature 0, so identical prompts share one cached reply.
+RESPONSE_CACHE = make_response_cache()
+
+def _is_json(content: str) -> bool:
+    try:
+        json.loads(content)
+        return True
+    except Exception:
+        return False
+
+def openai_chat(**kwargs):
+    """ChatOpenAI factory for LimitedLLM; langchain_openai is imported by the first model call."""
+    kwargs.setdefault("max_retries", 0)     # LimitedLLM retries (with backoff shared per model)
+    def build():
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(**kwargs)
+    build.kwargs = kwargs   # LimitedLLM.params reads these, so cache keys don't build the client
+    return build
+
+llm = LimitedLLM(openai_chat(model="gpt-4o", temperature=0), "chat", model="gpt-4o")
 
 BASE_SYSTEM = "Ask one targeted question at a time. Be concise and keep momentum."
 
@@ -73,12 +136,15 @@ BASE_TOOL_PROMPTS = {
 def system_for(tool: str) -> str:
     return BASE_TOOL_PROMPTS.get(tool, "Be helpful, concise, and ask one question at a time.")
 
-dialogue_prompt = ChatPromptTemplate.from_messages([
+dialogue_prompt = LazyPrompt([
     ("system", "{system_text}"),
     ("placeholder", "{history}"),
     ("user", "{message}"),
 ])
 
+# Per-question transcripts are kept within a per-model token budget (older turns truncated)
+TRANSCRIPTS = TranscriptManager()
+
 # ---------------- Professional Goal Setter (validator) ----------------
 
 STARTER_BOUNDS = (
@@ -110,13 +176,13 @@ Rules:
   “Do X by Y (or ‘unsure’), proven by Z.”
 """.strip()
 
-validator_llm = ChatOpenAI(
+validator_llm = LimitedLLM(openai_chat(
     model="gpt-4o-mini",
     temperature=0,
     model_kwargs={"response_format": {"type": "json_object"}}
-)
+), "validator", cache=RESPONSE_CACHE, cache_if=_is_json, model="gpt-4o-mini")
 
-validator_prompt = ChatPromptTemplate.from_messages([
+validator_prompt = LazyPrompt([
     ("system", """
 You are a validator for a single interview question inside a YAML flow.
 
@@ -153,26 +219,27 @@ Evaluate the transcript against the rubric and respond with the JSON.
 """)
 ])
 
-def check_sufficient_llm(qdict, field_chat, judge_system: str, bounds: str):
-    rubric = qdict.get("criterion", {}).get("rubric", "").strip()
-    examples = "\n".join(qdict.get("examples", [])) or "None"
-    transcript = "\n".join([f'{m["role"].upper()}: {m["content"]}' for m in field_chat]) or "EMPTY"
+async def check_sufficient_llm(q: Ask, transcript: str, judge_system: str, bounds: str,
+                               context: Optional[dict] = None):
+    rubric = q.rubric
+    examples = "\n".join(q.examples) or "None"
 
     msgs = validator_prompt.format_messages(
         judge_system=judge_system,
         bounds=bounds,
-        qid=qdict["id"],
-        qprompt=qdict["prompt"],
+        qid=q.id,
+        qprompt=q.prompt_template.render(context or {}),
         rubric=rubric or "Sufficient iff a non-empty answer is provided.",
         examples=examples,
-        transcript=transcript,
+        transcript=transcript or "EMPTY",
     )
-    resp = validator_llm.invoke(msgs)
+    with span("validator", model=validator_llm.model_name):
+        resp = await validator_llm.ainvoke(msgs)
     raw = resp.content
     try:
         data = json.loads(raw)
     except Exception:
-        print("VALIDATOR_RAW_PARSE_FAIL:", raw)
+        metrics.parse_failure("validator", raw)
         data = {"status": "insufficient", "followup": "I need a bit more detail to meet the rubric. Could you add that?", "extract": ""}
 
     status   = data.get("status", "insufficient")
@@ -180,10 +247,110 @@ def check_sufficient_llm(qdict, field_chat, judge_system: str, bounds: str):
     extract  = (data.get("extract") or "").strip()
     return status, followup, extract
 
+# ---------------- Multi-answer validator (composite nodes) ----------------
+# One message often answers several asks of a composite node at once ("best case X, base Y,
+# worst Z"). Instead of one validator round trip per ask, the current ask and the node's other
+# outstanding asks are judged in a single JSON call; every other ask the user explicitly answered
+# is filled too, and next_node skips it. VALIDATE_MULTI=0 goes back to one ask per call.
+VALIDATE_MULTI = os.getenv("VALIDATE_MULTI", "1") != "0"
+
+multi_validator_prompt = LazyPrompt([
+    ("system", """
+You are a validator for a multi-question step inside a YAML flow. The user is answering the CURRENT
+question, but a single message often answers several of the step's questions at once.
+
+Domain guidance:
+{judge_system}
+
+{bounds}
+
+For EACH listed question decide if the user's answer is SUFFICIENT for THAT question's rubric.
+- CURRENT question: judge the whole transcript, exactly as for a single question.
+- Every OTHER question: sufficient ONLY if the user explicitly answered it. Never infer, guess, or
+  reuse the answer to a different question; when in doubt it is insufficient.
+
+If the CURRENT question is insufficient, its FOLLOWUP MUST be a single compact message that:
+  1) Completely state the goal with as much detail as possible provided by the user.
+  2. Asks a question for one detail that's missing in order to state the goal without any vagueness, providing 3 examples of that detail in the format "for example: detail 1, detail 2, detail 3"
+Other questions never get a followup.
+
+Return strict JSON with one entry per QUESTION_ID:
+{{\"answers\":{{\"<QUESTION_ID>\":{{\"status\":\"sufficient\"|\"insufficient\",\"followup\":\"\",\"extract\":\"\"}}}}}}
+- \"extract\": when sufficient, normalize the user's answer TO THAT QUESTION into one sentence using ONLY user-provided info.
+"""),
+    ("user", """
+CURRENT QUESTION_ID: {qid}
+
+QUESTIONS:
+{questions}
+
+TRANSCRIPT FOR THE CURRENT QUESTION:
+{transcript}
+
+Evaluate the transcript against each question's rubric and respond with the JSON.
+""")
+])
+
+def outstanding_asks(node, answers: dict, current: Ask) -> List[Ask]:
+    """`current` first, then the composite node's other unanswered asks in flow order."""
+    if not VALIDATE_MULTI or node.kind != "composite":
+        return [current]
+    rest = [a for a in node.asks if a.id != current.id and not str(answers.get(a.id) or "").strip()]
+    return [current] + rest
+
+def _question_block(q: Ask, context: dict) -> str:
+    examples = "; ".join(q.examples) or "None"
+    rubric = q.rubric or "Sufficient iff a non-empty answer is provided."
+    prompt = q.prompt_template.render(context).strip()
+    return f"QUESTION_ID: {q.id}\nQUESTION_PROMPT: {prompt}\nCRITERION_RUBRIC: {rubric}\nEXAMPLES: {examples}"
+
+async def check_sufficient_multi(asks: List[Ask], transcript: str, judge_system: str, bounds: str,
+                                 context: Optional[dict] = None):
+    """
+    Judge asks[0] (the current ask) and the other outstanding asks in one call.
+    Returns (verdict for asks[0], {ask_id: extract} for the other asks that were answered).
+    """
+    q = asks[0]
+    msgs = multi_validator_prompt.format_messages(
+        judge_system=judge_system,
+        bounds=bounds,
+        qid=q.id,
+        questions="\n\n".join(_question_block(a, context or {}) for a in asks),
+        transcript=transcript or "EMPTY",
+    )
+    with span("validator", model=validator_llm.model_name, asks=len(asks)):
+        resp = await validator_llm.ainvoke(msgs)
+    raw = resp.content
+    try:
+        answers = json.loads(raw)["answers"]
+        if not isinstance(answers, dict):
+            raise ValueError("answers is not an object")
+    except Exception as e:
+        metrics.parse_failure("validator", raw, error=e)
+        answers = {}
+
+    def verdict(data):
+        data = data if isinstance(data, dict) else {}
+        return (data.get("status", "insufficient"), (data.get("followup") or "").strip(),
+                (data.get("extract") or "").strip())
+
+    current = verdict(answers.get(q.id))
+    if q.id not in answers:
+        current = ("insufficient", current[1] or "I need a bit more detail to meet the rubric. Could you add that?", "")
+    filled = {}
+    for a in asks[1:]:
+        status, _, extract = verdict(answers.get(a.id))
+        if status == "sufficient" and extract:     # never store the raw message under another ask
+            value = prevalidate.normalize(a, extract)   # same type rules as a direct answer; else re-asked
+            if value is not None:
+                filled[a.id] = value
+    return current, filled
+
 # ---------------- Axes extractor ----------------
 
-axes_llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-axes_prompt = ChatPromptTemplate.from_messages([
+axes_llm = LimitedLLM(openai_chat(model="gpt-4o-mini", temperature=0), "axes",
+                      cache=RESPONSE_CACHE, cache_if=_is_json, model="gpt-4o-mini")
+axes_prompt = LazyPrompt([
     ("system", """
 You extract DECISION AXES from a normalized goal.
 
@@ -202,11 +369,14 @@ Rules:
 ])
 
 
-def extract_axes_from_goal(goal: str) -> List[Dict[str, Any]]:
+async def extract_axes_from_goal(goal: str) -> List[Dict[str, Any]]:
+    raw = None
     try:
         msgs = axes_prompt.format_messages(goal=goal)
-        r = axes_llm.invoke(msgs)
-        data = json.loads(r.content)
+        with span("axes", model=axes_llm.model_name):
+            r = await axes_llm.ainvoke(msgs)
+        raw = r.content
+        data = json.loads(raw)
         axes = data.get("axes", [])
         clean = []
         for a in axes:
@@ -218,12 +388,41 @@ def extract_axes_from_goal(goal: str) -> List[Dict[str, Any]]:
                 clean.append({"key": key, "label": label, "aim": aim, "options": opts})
         return clean[:8]
     except Exception as e:
-        print("AXES_EXTRACT_FAIL:", e)
+        if raw is None:
+            print("AXES_EXTRACT_FAIL:", e)    # the call itself failed; counted in stage_errors_total
+        else:
+            metrics.parse_failure("axes", raw, error=e)
         return []
 
+# ---------------- Speculative work ----------------
+# Background LLM work started as soon as its inputs are accepted, so the turn that needs the
+# result (usually the last one) doesn't pay for the round trip. Results: SPECULATIVE.wait/peek.
+SPECULATIVE = SpeculativeWork()
+AXES_END_WAIT = float(os.getenv("AXES_END_WAIT", 0.5))   # grace period before replying without axes
+
+# accepted ask.id -> {work name: async fn(answers)}; any flow can register work here
+PREFETCH_ON_ACCEPT: Dict[str, Dict[str, Any]] = {
+    "goal": {"axes": lambda answers: extract_axes_from_goal(answers["goal"].strip())},
+}
+
+def publish_axes(session_id: str):
+    """Mirror pending axes into the shared axes store, so any worker can answer /session/{id}/axes."""
+    AXES_STORE.put(session_id, {"status": "pending", "axes": []})
+    SPECULATIVE.on_done(session_id, "axes", lambda status, axes: AXES_STORE.put(
+        session_id, {"status": status, "axes": axes or []}))
+
+def start_prefetch(session_id: str, ask_id: str, answers: dict):
+    value = str(answers.get(ask_id) or "").strip()
+    if not value:
+        return
+    snapshot = dict(answers)
+    for name, fn in PREFETCH_ON_ACCEPT.get(ask_id, {}).items():
+        # background priority: never holds up an interactive turn's model calls
+        SPECULATIVE.start(session_id, name, lambda fn=fn: as_background(fn(snapshot)), input_key=value)
+
 # ---------------- Helper explainer ----------------
-helper_llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.2)
-helper_prompt = ChatPromptTemplate.from_messages([
+helper_llm = LimitedLLM(openai_chat(model="gpt-4o-mini", temperature=0.2), "helper", model="gpt-4o-mini")
+helper_prompt = LazyPrompt([
     ("system", """
 You are a kind, concise explainer. The user is asking a clarifying question, or seems confused about a detail
 about the CURRENT question. Answer plainly—NO rubric talk.
@@ -257,49 +456,95 @@ USER QUESTION:
 """)
 ])
 
-def is_user_question(text: str) -> bool:
-    if not text: return False
-    t = text.strip().lower()
-    return (
-        t.endswith("?")
-        or t.startswith(("what ", "how ", "why ", "which ", "could ", "can ", "should ", "help", "examples"))
-        or "i'm not sure" in t or "im not sure" in t or "i don't know" in t or "i dont know" in t
-    )
+# Helper vs. answer: local hashed n-gram classifier, trained in the background at startup
+# (INTENT_TRAIN, comma-separated JSONL files); the keyword heuristic decides until it is ready
+# and whenever its confidence is below INTENT_THRESHOLD. INTENT_CLASSIFIER=heuristic keeps the rule.
+INTENT_CLASSIFIER = os.getenv("INTENT_CLASSIFIER", "model").lower()
+INTENT_TRAIN = os.getenv("INTENT_TRAIN", os.path.join(os.path.dirname(__file__), "intent_train.jsonl"))
+QUESTION_CLASSIFIER = QuestionClassifier(threshold=float(os.getenv("INTENT_THRESHOLD", 0.65)))
 
-def answer_user_question(qdict, field_chat, user_text: str, known_answers: Optional[dict] = None, bounds: str = "") -> str:
-    examples = "\n".join(qdict.get("examples", [])) or "None"
-    transcript = "\n".join([f'{m["role"].upper()}: {m["content"]}' for m in field_chat]) or "EMPTY"
-    if known_answers:
-        pairs = []
-        for k, v in known_answers.items():
-            if not v: continue
-            sv = str(v)
-            if len(sv) > 160: sv = sv[:157] + "..."
-            pairs.append(f"{k}: {sv}")
-        known_dump = "\n".join(pairs) if pairs else "None"
-    else:
-        known_dump = "None"
+def train_question_classifier():
+    try:
+        QUESTION_CLASSIFIER.fit_files([p for p in INTENT_TRAIN.split(",") if p])
+    except Exception as e:
+        print("INTENT_TRAIN_FAIL:", e)
 
-    msgs = helper_prompt.format_messages(
-        qprompt=qdict["prompt"],
+def is_user_question(text: str) -> bool:
+    return QUESTION_CLASSIFIER.is_question(text)
+
+# Near-duplicate clarifying questions per (flow, version, ask) reuse an earlier explanation.
+# Only context-free explanations are shared across sessions: the first line on the ask, with no
+# known answers, so a reply never carries another user's details.
+HELPER_CACHE = SemanticCache(max_entries=int(os.getenv("HELPER_CACHE_SIZE", 1024)),
+                             threshold=float(os.getenv("HELPER_CACHE_THRESHOLD", 0.82)))
+
+def helper_shareable(sess: dict) -> bool:
+    return len(sess["field_chat"]) == 1 and not sess["field_summary"] and not sess["answers"]
+
+def helper_messages(q: Ask, transcript: str, user_text: str, known_answers: Optional[dict] = None, bounds: str = "",
+                    context: Optional[dict] = None):
+    examples = "\n".join(q.examples) or "None"
+    return helper_prompt.format_messages(
+        qprompt=q.prompt_template.render(context or {}),
         bounds=bounds or "",
         examples=examples,
-        transcript=transcript,
-        known_answers=known_dump,
+        transcript=transcript or "EMPTY",
+        known_answers=render_known_answers(known_answers),
         user_question=user_text
     )
-    return helper_llm.invoke(msgs).content
+
+async def answer_user_question(q: Ask, transcript: str, user_text: str, known_answers: Optional[dict] = None, bounds: str = "",
+                               context: Optional[dict] = None) -> str:
+    msgs = helper_messages(q, transcript, user_text, known_answers=known_answers, bounds=bounds, context=context)
+    return (await helper_llm.ainvoke(msgs)).content
+
+async def stream_user_question(q: Ask, transcript: str, user_text: str, known_answers: Optional[dict] = None, bounds: str = "",
+                               context: Optional[dict] = None):
+    """Same as answer_user_question, but yields the explanation token by token."""
+    msgs = helper_messages(q, transcript, user_text, known_answers=known_answers, bounds=bounds, context=context)
+    async for chunk in helper_llm.astream(msgs):
+        yield chunk
+
+# ---------------- Metrics ----------------
+# Scrape-time gauges from the components' own stats(); spans and counters are recorded inline.
+METRICS.collect("flows", "Flow registry", FLOW_REGISTRY.stats)
+METRICS.collect("sessions", "Session store", SESSION_STORE.stats)
+METRICS.collect("llm_cache", "Response cache", RESPONSE_CACHE.stats)
+METRICS.collect("prevalidate", "Local pre-validation", prevalidate.STATS.stats)
+METRICS.collect("transcripts", "Transcript truncation", TRANSCRIPTS.stats)
+METRICS.collect("speculative", "Speculative background work", SPECULATIVE.stats)
+METRICS.collect("event_log", "Session event log", EVENT_LOG.stats)
+METRICS.collect("intent", "Helper-vs-answer classifier", QUESTION_CLASSIFIER.stats)
+METRICS.collect("helper_cache", "Near-duplicate helper explanations", HELPER_CACHE.stats)
+METRICS.collect("flow_cursors", "Signed /flow/next cursors", FLOW_CURSORS.stats)
+METRICS.collect("llm_in_flight", "Model calls in flight",
+                lambda: {c.name: c.in_flight for c in (llm, validator_llm, axes_llm, helper_llm)})
+
+def tool_label(tool: str) -> str:
+    # client-supplied; keep label cardinality bounded
+    return tool if tool in TOOL_TO_FLOW or tool in BASE_TOOL_PROMPTS else "other"
 
 # ---------------- FastAPI App ----------------
+ALLOWED_ORIGINS = ["http://localhost:3000"]
+
 app = FastAPI()
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["http://localhost:3000"],
+    allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
+@app.exception_handler(LLMBusy)
+async def llm_busy_handler(request: Request, exc: LLMBusy):
+    # Backpressure: the model's concurrency limit is saturated and the queue wait expired.
+    return JSONResponse(
+        status_code=429,
+        content={"error": f"{exc.name} model is busy, retry shortly"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 # ---------------- Models ----------------
 class Turn(BaseModel):
     session_id: str
@@ -307,140 +552,656 @@ class Turn(BaseModel):
     history: list[dict] = []
     tool: Optional[str] = None
     system_override: Optional[str] = None
+    context: Optional[Dict[str, str]] = None   # prompt placeholders, e.g. {"axis": ...}; kept per session
 
 class FlowReq(BaseModel):
-    flow_id: str
+    flow_id: Optional[str] = None          # optional with a cursor
     node_id: Optional[str] = None
-    answers: dict = {}
+    answers: dict = {}                     # with a cursor: only the new answers
+    cursor: Optional[str] = None           # from the previous /flow/next response
+    follow: bool = True                    # follow goto steps server-side (False: one step per call)
+    prefetch: bool = False                 # yes/no ask: also return the step each answer leads to
+    context: Dict[str, str] = {}           # prompt placeholders, e.g. {"axis": ...}
+
+class FlowBatchReq(BaseModel):
+    flow_id: str
+    node_id: Optional[str] = None          # start here instead of the flow's start node
+    answer_sets: List[dict] = []
+    with_paths: bool = False
+    enumerate: bool = False                # list every reachable end + answer region instead
+    domains: Optional[Dict[str, list]] = None   # ask id/type -> candidate values for enumerate
 
 # ---------------- Endpoints ----------------
 @app.get("/health")
 def health():
-    return {"ok": True, "flows": sorted(FLOW_REGISTRY.keys())}
+    return {"ok": True, "flows": sorted(FLOW_REGISTRY.keys()),
+            "flow_versions": FLOW_REGISTRY.versions(), "tools": TOOL_TO_FLOW, "sessions": SESSION_STORE.stats(), "llm_cache": RESPONSE_CACHE.stats(),
+            "prevalidate": prevalidate.STATS.stats(),
+            "tokens": {
+                "transcripts": TRANSCRIPTS.stats(),
+                **{c.name: c.usage() for c in (llm, validator_llm, axes_llm, helper_llm)},
+            },
+            "speculative": SPECULATIVE.stats(),
+            "event_log": EVENT_LOG.stats(),
+            "intent": QUESTION_CLASSIFIER.stats(),
+            "helper_cache": HELPER_CACHE.stats(),
+            "websocket": WS_STATS.stats(),
+            "latency": METRICS.latency_summary()}
+
+@app.post("/flows/reload")
+def flows_reload(x_admin_token: Optional[str] = Header(default=None)):
+    """Re-read changed flow files and swap them in; 409 with the errors if any fail to compile."""
+    if FLOWS_ADMIN_TOKEN and x_admin_token != FLOWS_ADMIN_TOKEN:
+        return JSONResponse(status_code=403, content={"error": "admin token required"})
+    report = FLOW_REGISTRY.reload()
+    if report["ok"] and MASTER_PID:
+        os.kill(MASTER_PID, signal.SIGHUP)     # serve.py: the master reloads and signals every worker
+    return report if report["ok"] else JSONResponse(status_code=409, content=report)
+
+async def _reload_flows():
+    try:
+        report = await asyncio.to_thread(FLOW_REGISTRY.reload)
+        if report["changed"] or report["removed"] or not report["ok"]:
+            print("FLOWS_RELOADED:" if report["ok"] else "FLOWS_RELOAD_FAIL:",
+                  report["changed"] or report["removed"] or report["errors"])
+    except Exception as e:
+        print("FLOWS_RELOAD_FAIL:", e)
+
+async def _watch_flows(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        if FLOW_REGISTRY.changed():
+            await _reload_flows()
+
+@app.on_event("startup")
+async def _start_flow_watcher():
+    if MASTER_PID:
+        # serve.py worker: the master watches the flows and sends SIGHUP on reload
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGHUP, lambda: asyncio.ensure_future(_reload_flows()))
+        if FLOW_REGISTRY.changed():         # reloaded while this worker was starting
+            asyncio.create_task(_reload_flows())
+    elif FLOWS_WATCH > 0:
+        asyncio.create_task(_watch_flows(FLOWS_WATCH))
+    if INTENT_CLASSIFIER == "model" and not QUESTION_CLASSIFIER.ready:     # serve.py trains before forking
+        asyncio.get_running_loop().run_in_executor(None, train_question_classifier)
+
+@app.on_event("shutdown")
+def _close_event_log():
+    EVENT_LOG.flush()
+    EVENT_LOG.close()
+
+# ---------------- Worker lifecycle (serve.py) ----------------
+# serve.py imports this module once, runs warm_up() and forks workers that share the compiled
+# flows and trained classifier copy-on-write; each worker then calls after_fork() and
+# warm_worker(). On shutdown a worker drain()s: new turns get 503 / a socket error while the
+# turns already running finish.
+TURNS_IN_FLIGHT = 0
+DRAINING = False
+MASTER_PID: Optional[int] = None    # set in serve.py workers
+
+def warm_up():
+    """Do the lazy first-use work now (model imports, classifier training, token encoders)."""
+    if INTENT_CLASSIFIER == "model" and not QUESTION_CLASSIFIER.ready:
+        train_question_classifier()
+    import langchain_openai    # noqa: F401  otherwise imported by the first model call
+    import flow_batch          # noqa: F401  numpy, for /flow/run_batch
+    from transcript import count_tokens
+    for c in (llm, validator_llm, axes_llm, helper_llm):
+        count_tokens("warm up", c.model_name)
+
+def after_fork(master_pid: Optional[int] = None):
+    """Reopen what a forked worker must not share with its parent: database handles, writer thread."""
+    global MASTER_PID
+    MASTER_PID = master_pid
+    SESSION_STORE.after_fork()
+    AXES_STORE.after_fork()
+    EVENT_LOG.after_fork()
+    RESPONSE_CACHE.after_fork()
+
+def warm_worker():
+    """Build the model clients (their HTTP connection pools are per process)."""
+    for c in (llm, validator_llm, axes_llm, helper_llm):
+        c.client
+
+async def drain(timeout: float) -> bool:
+    """Refuse new turns and wait up to `timeout` seconds for running ones; True if none are left."""
+    global DRAINING
+    DRAINING = True
+    deadline = time.monotonic() + timeout
+    while TURNS_IN_FLIGHT and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    return TURNS_IN_FLIGHT == 0
+
+def _draining_response():
+    return JSONResponse(status_code=503, content={"error": "server is restarting, retry shortly"},
+                        headers={"Retry-After": "1"})
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+async def _once(coro):
+    yield await coro
+
+async def _text(text: str):
+    yield text
+
+async def _content(coro) -> str:
+    return (await coro).content
+
+def _token(text: str) -> dict:
+    return {"type": "token", "text": text}
+
+def _done(payload: dict) -> dict:
+    return {"type": "done", **payload}
+
+async def _dialogue_events(t: Turn, stream: bool = False):
+    """
+    Run one dialogue turn as a sequence of events:
+      {"type": "token", "text": ...}   reply text as it is produced (helper, fallback, end-of-flow)
+      {"type": "done", "reply": ..., ...}   the complete response body, always last
+    With stream=False every LLM reply arrives as a single token event. The session is read from
+    the store on every turn: other panels, HTTP calls and workers may have moved it since.
+    """
+    global TURNS_IN_FLIGHT
+    TURNS_IN_FLIGHT += 1
+    try:
+        with span("turn"):
+            async for ev in _turn_events(t, stream):
+                yield ev
+    finally:
+        TURNS_IN_FLIGHT -= 1
 
-@app.post("/dialogue")
-def dialogue(t: Turn):
+async def _turn_events(t: Turn, stream: bool):
     tool = t.tool or "smart-goal"
     flow_id = TOOL_TO_FLOW.get(tool)
-    sess = SESSIONS[t.session_id]
+    sess = SESSION_STORE.get(t.session_id)
+    if sess is None and t.message != "__init__":
+        sess = await asyncio.to_thread(EVENT_LOG.recover, t.session_id, SESSION_STORE.ttl)
+        if sess is not None:
+            print("SESSION_RECOVERED:", t.session_id)
+    sess = sess or new_session()
+    metrics.set_turn(flow_id=flow_id, node_id=sess.get("node_id"), tool=tool_label(tool))
 
     base_flow = FLOW_REGISTRY.get(flow_id) if flow_id else None
     active_flow = base_flow
+    if base_flow and sess["flow_id"] == flow_id and t.message != "__init__":
+        active_flow = pinned_flow(sess, base_flow)
 
     if active_flow:
         # INIT
         if t.message == "__init__" or not sess["flow_id"]:
-            start = active_flow["start"]
-            node = active_flow["nodes"][start]
-            first_q = node["asks"][0]
+            start = active_flow.start
+            first_q = start.asks[0]
             sess.update({
                 "flow_id": flow_id,
-                "node_id": start,
-                "awaiting": first_q["id"],
+                "flow_version": active_flow.version,
+                "node_id": start.id,
+                "awaiting": first_q.id,
                 "answers": {},
                 "field_chat": [],
+                "field_summary": [],
+                "context": dict(t.context or {}),
             })
-            return {"reply": first_q["prompt"]}
+            SESSION_STORE.put(t.session_id, sess)
+            EVENT_LOG.append(t.session_id, "init", flow_id=flow_id, flow_version=active_flow.version,
+                             node_id=start.id, awaiting=first_q.id, context=sess["context"])
+            metrics.set_turn(flow_id=flow_id, node_id=start.id, tool=tool_label(tool))
+            ctx = prompt_context(active_flow, {}, sess["context"])
+            yield _done({"reply": first_q.template.render(ctx)})
+            return
 
         # NORMAL TURN
         if sess["awaiting"]:
+            if t.context is not None and t.context != sess.get("context"):
+                sess["context"] = dict(t.context)
+                EVENT_LOG.append(t.session_id, "context", values=sess["context"])
             # record user line
             sess["field_chat"].append({"role": "user", "content": t.message})
+            EVENT_LOG.append(t.session_id, "user", ask=sess["awaiting"], message=t.message)
+            # keep the prompt transcript inside the validator model's token budget
+            TRANSCRIPTS.truncate(sess, validator_llm.model_name)
+            transcript = TRANSCRIPTS.render(sess)
 
-            node = active_flow["nodes"][sess["node_id"]]
-            qdict = next(q for q in node["asks"] if q["id"] == sess["awaiting"])
+            node = active_flow.nodes[sess["node_id"]]
+            q = node.asks_by_id[sess["awaiting"]]
+            ctx = prompt_context(active_flow, sess["answers"], sess.get("context"))
 
             # Clarifying question?
-            bounds = (qdict.get("bounds") or "") + ("\n" + STARTER_BOUNDS)
-            if is_user_question(t.message):
-                expl = answer_user_question(
-                    qdict,
-                    sess["field_chat"],
-                    t.message,
-                    known_answers=sess.get("answers", {}),
-                    bounds=bounds
-                )
+            bounds = q.bounds + ("\n" + STARTER_BOUNDS)
+            with span("helper_detection"):
+                asking = is_user_question(t.message)
+            if asking:
+                sess["field_chat"][-1]["kind"] = "question"     # not part of the answer (prevalidate)
+                # the rendered prompt is part of the scope: an explanation for one {axis} is not another's
+                scope = (flow_id, active_flow.version, q.id, q.prompt_template.render(ctx))
+                shared = helper_shareable(sess)
+                cached = HELPER_CACHE.get(scope, t.message) if shared else None
+                expl = ""
+                if cached is not None:
+                    METRICS.inc(metrics.HELPER_CACHE_LOOKUPS, result="hit")
+                    with span("helper_cache", similarity=round(cached[1], 3)):
+                        expl = cached[0]
+                        yield _token(expl)
+                else:
+                    if shared:
+                        METRICS.inc(metrics.HELPER_CACHE_LOOKUPS, result="miss")
+                    helper_args = (q, transcript, t.message)
+                    helper_kwargs = {"known_answers": sess.get("answers", {}), "bounds": bounds, "context": ctx}
+                    chunks = (stream_user_question(*helper_args, **helper_kwargs) if stream
+                              else _once(answer_user_question(*helper_args, **helper_kwargs)))
+                    t0 = time.perf_counter()
+                    with span("helper", model=helper_llm.model_name):
+                        async for chunk in chunks:
+                            expl += chunk
+                            yield _token(chunk)
+                    if shared and expl.strip():
+                        HELPER_CACHE.put(scope, t.message, expl, cost=time.perf_counter() - t0)
                 sess["field_chat"].append({"role": "assistant", "content": expl})
-                return {"reply": expl}
-
-            # Validate sufficiency
-            status, followup, extract = check_sufficient_llm(
-                qdict,
-                sess["field_chat"],
-                judge_system=PRO_GOAL_SETTER_JUDGE_SYSTEM,
-                bounds=bounds
-            )
+                SESSION_STORE.put(t.session_id, sess)
+                EVENT_LOG.append(t.session_id, "assistant", ask=q.id, content=expl, kind="helper")
+                EVENT_LOG.checkpoint(t.session_id, sess)
+                yield _done({"reply": expl})
+                return
+
+            # Validate sufficiency: cheap local rules first, LLM only for ambiguous answers
+            # (full JSON verdict before routing; never streamed)
+            with span("prevalidate"):
+                verdict = prevalidate.prevalidate(q, sess["field_chat"], truncated=bool(sess["field_summary"]))
+            filled = {}
+            source = "local" if verdict is not None else "llm"
+            if verdict is None:
+                asks = outstanding_asks(node, sess["answers"], q)
+                if len(asks) > 1:
+                    # composite node: one call also fills the other asks this message answered
+                    verdict, filled = await check_sufficient_multi(
+                        asks, transcript, judge_system=PRO_GOAL_SETTER_JUDGE_SYSTEM, bounds=bounds, context=ctx)
+                else:
+                    verdict = await check_sufficient_llm(
+                        q,
+                        transcript,
+                        judge_system=PRO_GOAL_SETTER_JUDGE_SYSTEM,
+                        bounds=bounds,
+                        context=ctx
+                    )
+            status, followup, extract = verdict
+            EVENT_LOG.append(t.session_id, "verdict", ask=q.id, status=status, source=source,
+                             extract=extract, filled=filled)
+
+            if filled:
+                sess["answers"].update(filled)
+                for ask_id in filled:
+                    start_prefetch(t.session_id, ask_id, sess["answers"])
+                METRICS.inc(metrics.ASKS_PREFILLED, len(filled), flow_id=flow_id, node_id=node.id)
+            extra = {"filled": sorted(filled)} if filled else {}
 
             if status == "insufficient":
                 sess["field_chat"].append({"role": "assistant", "content": followup})
-                return {"reply": followup or "Could you add a bit more detail?"}
+                SESSION_STORE.put(t.session_id, sess)
+                if filled:
+                    EVENT_LOG.append(t.session_id, "answer", values=filled, accepted=False)
+                EVENT_LOG.append(t.session_id, "assistant", ask=q.id, content=followup, kind="followup")
+                EVENT_LOG.checkpoint(t.session_id, sess)
+                yield _done({"reply": followup or "Could you add a bit more detail?", **extra})
+                return
 
             # Sufficient → store normalized statement and advance/end
             final_value = extract or t.message
             sess["answers"][sess["awaiting"]] = final_value
+            start_prefetch(t.session_id, sess["awaiting"], sess["answers"])
             sess["field_chat"] = []
+            sess["field_summary"] = []
+            EVENT_LOG.append(t.session_id, "answer", values={q.id: final_value, **filled}, accepted=True)
 
             # Route
-            step = next_node(active_flow, sess["node_id"], sess["answers"])
-            while "goto" in step:
-                sess["node_id"] = step["goto"]
+            with span("routing"):
                 step = next_node(active_flow, sess["node_id"], sess["answers"])
+                while "goto" in step:
+                    sess["node_id"] = step["goto"]
+                    step = next_node(active_flow, sess["node_id"], sess["answers"])
 
             if "ask" in step:
+                render_step(active_flow, step, prompt_context(active_flow, sess["answers"], sess.get("context")))
                 sess["awaiting"] = step["awaiting"]
-                return {"reply": step["ask"]["prompt"]}
+                SESSION_STORE.put(t.session_id, sess)
+                EVENT_LOG.append(t.session_id, "route", node_id=sess["node_id"], awaiting=sess["awaiting"],
+                                 flow_version=sess.get("flow_version"))
+                EVENT_LOG.checkpoint(t.session_id, sess)
+                yield _done({"reply": step["ask"]["prompt"], **extra})
+                return
 
             if "end" in step:
-                normalized = sess["answers"].get("goal", "").strip()
-                # Extract axes & format message
-                axes = extract_axes_from_goal(normalized) if normalized else []
+                rec = step.get("recommendation", "Finished.")
+                head = f"{rec}\n\n"
+                yield _token(head)
+
+                # Axes were started in the background when the goal was accepted; use them if
+                # they land within the grace period, otherwise the client fetches them later.
+                start_prefetch(t.session_id, "goal", sess["answers"])
+                with span("axes_wait"):
+                    axes = await SPECULATIVE.wait(t.session_id, "axes", AXES_END_WAIT)
+                axes_pending = axes is None and SPECULATIVE.status(t.session_id, "axes") == "pending"
+                if axes_pending and AXES_STORE.shared:
+                    publish_axes(t.session_id)
+                axes = axes or []
                 lines = []
                 for a in axes:
                     opts = " / ".join(a["options"])
                     aim  = f" — aim: {a['aim']}" if a.get("aim") else ""
                     lines.append(f"{a['label']}")#: {opts}{aim}")
                 axes_text = ("\n".join(lines)) if lines else "— (No obvious axes found yet.)"
+                if axes_pending:
+                    axes_text = "— (Still working these out; they will appear in the Axes box shortly.)"
 
-                rec = step.get("recommendation", "Finished.")
-                msg = (
-                    f"{rec}\n\n"
+                tail = (
                     f"Here are **decision axes** you can explore next: "
                     f"{axes_text}\n\n"
                 )
+                yield _token(tail)
 
                 # close session for this flow
-                SESSIONS.pop(t.session_id, None)
-                return {"reply": msg, "axes": axes}
+                SESSION_STORE.delete(t.session_id)
+                EVENT_LOG.append(t.session_id, "end", node_id=sess["node_id"], recommendation=rec)
+                yield _done({"reply": head + tail, "axes": axes, "axes_pending": axes_pending, **extra})
+                return
 
-            return {"reply": "Flow advanced but reached an unexpected state."}
+            SESSION_STORE.put(t.session_id, sess)
+            yield _done({"reply": "Flow advanced but reached an unexpected state."})
+            return
 
     # Fallback (no YAML)
     sys_text = t.system_override or system_for(tool)
     msgs = dialogue_prompt.format_messages(system_text=sys_text, history=t.history, message=t.message)
-    resp = llm.invoke(msgs)
-    return {"reply": resp.content}
-
-@app.post("/flow/next")
-def flow_next(req: FlowReq):
-    if req.flow_id not in FLOW_REGISTRY:
-        return {"error": f"unknown flow_id: {req.flow_id}"}
+    chunks = llm.astream(msgs) if stream else _once(_content(llm.ainvoke(msgs)))
+    reply = ""
+    with span("fallback", model=llm.model_name):
+        async for chunk in chunks:
+            reply += chunk
+            yield _token(chunk)
+    yield _done({"reply": reply})
 
-    flow = FLOW_REGISTRY[req.flow_id]
-    node_id = req.node_id or flow["start"]
-    step = next_node(flow, node_id, req.answers)
+@app.post("/dialogue")
+async def dialogue(t: Turn):
+    if DRAINING:
+        return _draining_response()
+    body = None
+    async for ev in _dialogue_events(t):      # run to the end so the turn span closes here
+        if ev["type"] == "done":
+            body = {k: v for k, v in ev.items() if k != "type"}
+    return body
+
+@app.post("/dialogue/stream")
+async def dialogue_stream(t: Turn):
+    """Server-Sent Events variant of /dialogue: `token` events as text is produced, then `done`."""
+    if DRAINING:
+        return _draining_response()
+    async def sse():
+        try:
+            async for ev in _dialogue_events(t, stream=True):
+                yield f"data: {json.dumps(ev)}\n\n"
+        except LLMBusy as e:
+            err = {"type": "error", "error": f"{e.name} model is busy, retry shortly", "retry_after": e.retry_after}
+            yield f"data: {json.dumps(err)}\n\n"
+
+    return StreamingResponse(sse(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# ---------------- WebSocket channel ----------------
+# One socket per browser tab carries every dialogue panel. Client frames (JSON):
+#   {"type": "turn", "channel": <panel>, "id": <n>, "message": ..., "session_id"?, "tool"?,
+#    "system_override"?, "history"?, "context"?}
+#   {"type": "close", "channel": <panel>}            {"type": "ping"}
+# Server frames are the /dialogue/stream events tagged with "channel" and the turn's "id", plus
+# {"type": "axes", "channel", "session_id", "status", "axes"} pushed when background axes land.
+# A channel keeps its binding (session id, tool, system override), the session itself and the
+# fallback history between turns, so a turn frame only needs the message; "history" is read on
+# the first turn after the binding changes. Turns on one channel run in order, channels
+# concurrently.
+WS_AXES_WAIT = float(os.getenv("WS_AXES_WAIT", 60))
+
+class _SocketStats:
+    def __init__(self):
+        self.connections = 0
+        self.channels = 0
+        self.turns = 0
+        self.pushes = 0
+        self.rejected = 0
+
+    def stats(self) -> Dict[str, int]:
+        return dict(vars(self))
+
+WS_STATS = _SocketStats()
+METRICS.collect("websocket", "Dialogue websocket", WS_STATS.stats)
+
+def _bind_channel(ch: Optional[dict], frame: dict) -> dict:
+    """The channel state for this turn frame; a changed binding starts with a fresh history."""
+    binding = (
+        frame.get("session_id") or ch["binding"][0],
+        frame.get("tool") or (ch and ch["binding"][1]),
+        frame["system_override"] if "system_override" in frame else (ch and ch["binding"][2]),
+    )
+    if ch is not None and ch["binding"] == binding:
+        return ch
+    # the lock carries over so a turn still running under the old binding finishes first
+    return {"binding": binding, "history": [], "lock": ch["lock"] if ch else asyncio.Lock()}
+
+@app.websocket("/ws")
+async def dialogue_socket(ws: WebSocket):
+    origin = ws.headers.get("origin")
+    if origin and origin not in ALLOWED_ORIGINS:
+        WS_STATS.rejected += 1
+        await ws.close(code=1008)
+        return
+    await ws.accept()
+    WS_STATS.connections += 1
+    channels: Dict[str, dict] = {}
+    tasks = set()
+    send_lock = asyncio.Lock()
+
+    async def send(frame: dict):
+        async with send_lock:
+            try:
+                await ws.send_json(frame)
+            except (WebSocketDisconnect, RuntimeError):
+                pass        # closed mid-turn; the receive loop cleans up
+
+    async def push_axes(name: str, session_id: str):
+        axes = await SPECULATIVE.wait(session_id, "axes", WS_AXES_WAIT)
+        WS_STATS.pushes += 1
+        await send({"type": "axes", "channel": name, "session_id": session_id,
+                    "status": SPECULATIVE.status(session_id, "axes"), "axes": axes or []})
+
+    async def run_turn(name: str, ch: dict, frame: dict):
+        tag = {"channel": name, "id": frame.get("id")}
+        async with ch["lock"]:
+            session_id, tool, system_override = ch["binding"]
+            try:
+                message = frame["message"]
+                if isinstance(frame.get("history"), list):
+                    history = list(frame["history"])        # as /dialogue takes it: ends with this message
+                else:
+                    history = ch["history"] + ([{"role": "user", "content": message}] if message != "__init__" else [])
+                t = Turn(session_id=session_id, message=message, history=history,
+                         tool=tool, system_override=system_override, context=frame.get("context"))
+            except (KeyError, TypeError, ValidationError) as e:
+                print("WS_BAD_FRAME:", e)
+                await send({"type": "error", "error": "invalid turn frame", **tag})
+                return
+            ch["history"] = history
+            WS_STATS.turns += 1
+            done = None
+            try:
+                async for ev in _dialogue_events(t, stream=True):
+                    await send({**ev, **tag})
+                    if ev["type"] == "done":
+                        done = ev
+            except LLMBusy as e:
+                await send({"type": "error", "error": f"{e.name} model is busy, retry shortly",
+                            "retry_after": e.retry_after, **tag})
+                return
+            except Exception as e:
+                print("WS_TURN_FAIL:", e)
+                await send({"type": "error", "error": "turn failed", **tag})
+                return
+            if done is None:
+                return
+            ch["history"].append({"role": "assistant", "content": done["reply"]})
+        if done.get("axes_pending"):
+            spawn(push_axes(name, session_id))
+
+    def spawn(coro):
+        task = asyncio.create_task(coro)
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
 
+    try:
+        while True:
+            try:
+                frame = json.loads(await ws.receive_text())
+            except ValueError:
+                await send({"type": "error", "error": "frames must be JSON"})
+                continue
+            kind = frame.get("type") if isinstance(frame, dict) else None
+            if kind == "ping":
+                await send({"type": "pong"})
+                continue
+            name = str(frame.get("channel") or "default") if kind else "default"
+            if kind == "close":
+                if channels.pop(name, None) is not None:
+                    WS_STATS.channels -= 1
+                continue
+            if DRAINING and kind == "turn":
+                await send({"type": "error", "error": "server is restarting, retry shortly", "retry_after": 1,
+                            "channel": name, "id": frame.get("id")})
+                continue
+            ch = channels.get(name)
+            if kind != "turn" or not isinstance(frame.get("message"), str) or \
+                    not (frame.get("session_id") or ch):
+                await send({"type": "error", "error": "expected a turn frame with message (and session_id on a new channel)",
+                            "channel": name, "id": frame.get("id") if kind else None})
+                continue
+            if ch is None:
+                WS_STATS.channels += 1
+            channels[name] = _bind_channel(ch, frame)
+            spawn(run_turn(name, channels[name], frame))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in list(tasks):
+            task.cancel()
+        WS_STATS.connections -= 1
+        WS_STATS.channels -= len(channels)
+
+@app.get("/session/{session_id}/axes")
+def session_axes(session_id: str):
+    """Axes from the background extraction: status is pending | ready | error (404 if never started)."""
+    status = SPECULATIVE.status(session_id, "axes")
+    if status == "missing":
+        shared = AXES_STORE.get(session_id) if AXES_STORE.shared else None
+        if shared is not None:
+            return shared       # extracted by another worker (serve.py)
+        return JSONResponse(status_code=404, content={"status": status, "axes": []})
+    return {"status": status, "axes": SPECULATIVE.peek(session_id, "axes") or []}
+
+@app.get("/session/{session_id}/events")
+def session_events(session_id: str, after: int = 0, upto: Optional[int] = None,
+                   x_admin_token: Optional[str] = Header(default=None)):
+    """The session's logged events (seq > after), oldest first; across flows run under this id."""
+    if not EVENTS_ADMIN_TOKEN or x_admin_token != EVENTS_ADMIN_TOKEN:
+        return JSONResponse(status_code=403, content={"error": "admin token required"})
+    EVENT_LOG.flush(1.0)
+    return {"events": EVENT_LOG.read(session_id, after=after, upto=upto)}
+
+@app.get("/session/{session_id}/replay")
+def session_replay(session_id: str, upto: Optional[int] = None,
+                   x_admin_token: Optional[str] = Header(default=None)):
+    """Session state rebuilt from the event log, as of event `upto` (default: latest)."""
+    if not EVENTS_ADMIN_TOKEN or x_admin_token != EVENTS_ADMIN_TOKEN:
+        return JSONResponse(status_code=403, content={"error": "admin token required"})
+    r = EVENT_LOG.replay(session_id, upto=upto)
+    if r["state"] is None:
+        return JSONResponse(status_code=404, content={"error": "no events for this session", **r})
+    return r
+
+def _flow_step(flow: FlowGraph, step: dict, answers: dict, context: dict) -> dict:
+    """Client shape of a next_node/advance step; asks and gotos carry a cursor to resume from."""
     if "ask" in step:
-        ask = step["ask"]
+        ask = render_step(flow, step, prompt_context(flow, answers, context))["ask"]
+        node_id = step["node_id"]
         if ask.get("type") == "scale_1_5":
-            labels = flow["nodes"].get(node_id, {}).get("scale_labels", {})
+            labels = flow.nodes[node_id].scale_labels
             if labels:
                 ask["helper_text"] = "1–5 scale: " + "; ".join(f"{k}={v}" for k, v in labels.items())
-        return {"node_id": node_id, "ask": ask, "awaiting": step.get("awaiting")}
+        return {"node_id": node_id, "ask": ask, "awaiting": step.get("awaiting"),
+                "cursor": FLOW_CURSORS.sign(flow.id, flow.version, node_id, answers)}
 
     if "goto" in step:
-        return {"goto": step["goto"]}
+        return {"goto": step["goto"], "cursor": FLOW_CURSORS.sign(flow.id, flow.version, step["goto"], answers)}
 
     if "end" in step:
         return {"end": True, "recommendation": step.get("recommendation", "Finished.")}
 
     return step
+
+@app.post("/flow/next")
+def flow_next(req: FlowReq):
+    """
+    Next step for the given answers. Goto chains are followed here (`path` lists the nodes
+    visited) unless follow=false. Asks come with a signed `cursor`: send it back with only the
+    new answers. With prefetch=true a yes/no ask also carries `branches` {"yes": step, "no": step},
+    each with its own cursor, so the client can answer locally and resume from the branch taken.
+    """
+    answers = dict(req.answers)
+    if req.cursor:
+        try:
+            flow_id, version, node_id, prior = FLOW_CURSORS.open(req.cursor)
+        except CursorError as e:
+            return {"error": f"invalid cursor: {e}"}
+        if req.flow_id and req.flow_id != flow_id:
+            return {"error": "cursor belongs to another flow"}
+        flow = FLOW_REGISTRY.get(flow_id, version)
+        if flow is None:
+            # version no longer kept: carry on with the current one if the node still exists
+            flow = FLOW_REGISTRY.get(flow_id)
+            if flow is None or node_id not in flow.nodes:
+                return {"error": "cursor expired: flow has changed"}
+        answers = {**prior, **answers}
+    else:
+        if req.flow_id not in FLOW_REGISTRY:
+            return {"error": f"unknown flow_id: {req.flow_id}"}
+        flow = FLOW_REGISTRY[req.flow_id]
+        node_id = req.node_id or flow.start.id
+        if node_id not in flow.nodes:
+            return {"error": f"unknown node_id: {node_id}"}
+
+    if not req.follow:
+        return _flow_step(flow, next_node(flow, node_id, answers), answers, req.context)
+
+    step, path = advance(flow, node_id, answers)
+    if len(path) > 1:
+        METRICS.inc(metrics.FLOW_HOPS, len(path) - 1, flow_id=flow.id)
+    body = {**_flow_step(flow, step, answers, req.context), "path": path}
+    if req.prefetch and "ask" in step and step["ask"].get("type") == "yesno":
+        body["branches"] = {}
+        for value in ("yes", "no"):
+            branch_answers = {**answers, step["node_id"]: value}
+            b_step, b_path = advance(flow, step["node_id"], branch_answers)
+            body["branches"][value] = {**_flow_step(flow, b_step, branch_answers, req.context), "path": b_path}
+    return body
+
+@app.post("/flow/run_batch")
+def flow_run_batch(req: FlowBatchReq):
+    from flow_batch import run_batch, enumerate_outcomes    # numpy only loads when batches are used
+    if req.flow_id not in FLOW_REGISTRY:
+        return {"error": f"unknown flow_id: {req.flow_id}"}
+
+    flow = FLOW_REGISTRY[req.flow_id]
+    if req.enumerate:
+        try:
+            return {"outcomes": enumerate_outcomes(flow, req.domains)}
+        except ValueError as e:
+            return {"error": str(e)}
+    if req.node_id and req.node_id not in flow.nodes:
+        return {"error": f"unknown node_id: {req.node_id}"}
+    return {"results": run_batch(flow, req.answer_sets, start=req.node_id, with_paths=req.with_paths)}
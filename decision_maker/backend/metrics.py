@@ -0,0 +1,244 @@
+# backend/metrics.py
+"""
+In-process metrics: counters, latency histograms and per-stage spans, exported in the
+Prometheus text format (GET /metrics) and optionally as one JSON line per span/event
+(METRICS_LOG=json).
+
+Stage spans are tagged with the current turn's flow_id / node_id / tool (set once per turn with
+set_turn) plus the model when there is one. Background tasks inherit the labels of the turn that
+started them, so speculative work is attributed to the flow and node that triggered it.
+
+Histograms keep cumulative buckets (aggregate these across workers) and a window of recent
+samples for local p50/p95/p99.
+"""
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUANTILES = (0.5, 0.95, 0.99)
+TURN_LABELS = ("flow_id", "node_id", "tool")
+
+_turn: contextvars.ContextVar = contextvars.ContextVar("turn_labels", default={})
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(d: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, "" if v is None else str(v)) for k, v in d.items()))
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(labels: Labels, extra: Iterable[Tuple[str, str]] = ()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _fmt_num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Histogram:
+    __slots__ = ("counts", "total", "count", "window")
+
+    def __init__(self, n_buckets: int, window: int):
+        self.counts = [0] * n_buckets
+        self.total = 0.0
+        self.count = 0
+        self.window = deque(maxlen=window)
+
+    def observe(self, value: float, buckets):
+        i = bisect.bisect_left(buckets, value)
+        if i < len(self.counts):
+            self.counts[i] += 1
+        self.total += value
+        self.count += 1
+        self.window.append(value)
+
+    def quantiles(self) -> Dict[float, float]:
+        if not self.window:
+            return {}
+        xs = sorted(self.window)
+        n = len(xs)
+        return {q: xs[min(n - 1, int(q * n))] for q in QUANTILES}
+
+
+class Metrics:
+    def __init__(self, prefix: str = "dm", window: int = 1024, json_log: bool = False):
+        self.prefix = prefix
+        self.window = window
+        self.json_log = json_log
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}                 # name -> (type, help)
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._hists: Dict[str, Dict[Labels, _Histogram]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        self._collectors: Dict[str, Tuple[str, Callable[[], Dict[str, Any]]]] = {}
+
+    # ---------------- registration ----------------
+    def counter(self, name: str, help: str) -> str:
+        self._help.setdefault(name, ("counter", help))
+        self._counters.setdefault(name, {})
+        return name
+
+    def histogram(self, name: str, help: str, buckets=LATENCY_BUCKETS) -> str:
+        self._help.setdefault(name, ("histogram", help))
+        self._hists.setdefault(name, {})
+        self._buckets.setdefault(name, tuple(buckets))
+        return name
+
+    def collect(self, name: str, help: str, fn: Callable[[], Dict[str, Any]]):
+        """Export the numeric values of fn() (a stats() dict) as gauges `<name>_<key>` at scrape time."""
+        self._collectors[name] = (help, fn)
+
+    # ---------------- recording ----------------
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters[name]
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self._hists[name]
+            h = series.get(key)
+            if h is None:
+                h = series[key] = _Histogram(len(self._buckets[name]), self.window)
+            h.observe(value, self._buckets[name])
+
+    def log(self, event: str, **fields):
+        if self.json_log:
+            print(json.dumps({"ts": round(time.time(), 3), "event": event, **fields}, default=str), flush=True)
+
+    # ---------------- export ----------------
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        out = []
+        p = self.prefix
+        with self._lock:
+            for name, series in self._counters.items():
+                out.append(f"# HELP {p}_{name} {self._help[name][1]}")
+                out.append(f"# TYPE {p}_{name} counter")
+                for labels, v in series.items():
+                    out.append(f"{p}_{name}{_fmt_labels(labels)} {_fmt_num(v)}")
+
+            for name, series in self._hists.items():
+                buckets = self._buckets[name]
+                out.append(f"# HELP {p}_{name} {self._help[name][1]}")
+                out.append(f"# TYPE {p}_{name} histogram")
+                for labels, h in series.items():
+                    cum = 0
+                    for le, c in zip(buckets, h.counts):
+                        cum += c
+                        out.append(f"{p}_{name}_bucket{_fmt_labels(labels, [('le', _fmt_num(le))])} {cum}")
+                    out.append(f"{p}_{name}_bucket{_fmt_labels(labels, [('le', '+Inf')])} {h.count}")
+                    out.append(f"{p}_{name}_sum{_fmt_labels(labels)} {_fmt_num(h.total)}")
+                    out.append(f"{p}_{name}_count{_fmt_labels(labels)} {h.count}")
+
+                # quantiles over the recent window; a separate summary so the histogram stays valid
+                out.append(f"# HELP {p}_{name}_window {self._help[name][1]} (last {self.window} samples)")
+                out.append(f"# TYPE {p}_{name}_window summary")
+                for labels, h in series.items():
+                    for q, v in h.quantiles().items():
+                        out.append(f"{p}_{name}_window{_fmt_labels(labels, [('quantile', str(q))])} {_fmt_num(v)}")
+                    out.append(f"{p}_{name}_window_sum{_fmt_labels(labels)} {_fmt_num(sum(h.window))}")
+                    out.append(f"{p}_{name}_window_count{_fmt_labels(labels)} {len(h.window)}")
+
+        for name, (help, fn) in self._collectors.items():
+            try:
+                stats = fn()
+            except Exception as e:
+                print("METRICS_COLLECT_FAIL:", name, e)
+                continue
+            for key, v in stats.items():
+                if isinstance(v, bool) or not isinstance(v, (int, float)):
+                    continue
+                out.append(f"# HELP {p}_{name}_{key} {help}: {key}")
+                out.append(f"# TYPE {p}_{name}_{key} gauge")
+                out.append(f"{p}_{name}_{key} {_fmt_num(v)}")
+        return "\n".join(out) + "\n"
+
+    def latency_summary(self, name: str = "stage_seconds", by: str = "stage") -> Dict[str, Dict[str, float]]:
+        """p50/p95/p99 (ms) over the recent window, merged across all labels except `by`."""
+        merged: Dict[str, list] = {}
+        with self._lock:
+            for labels, h in self._hists.get(name, {}).items():
+                merged.setdefault(dict(labels).get(by, ""), []).extend(h.window)
+        out = {}
+        for group, xs in sorted(merged.items()):
+            xs.sort()
+            n = len(xs)
+            out[group] = {"n": n, **{f"p{int(q * 100)}_ms": round(xs[min(n - 1, int(q * n))] * 1000, 1)
+                                     for q in QUANTILES}}
+        return out
+
+
+METRICS = Metrics(json_log=os.getenv("METRICS_LOG", "").lower() == "json")
+
+STAGE_SECONDS = METRICS.histogram("stage_seconds", "Wall time per dialogue stage")
+STAGE_ERRORS = METRICS.counter("stage_errors_total", "Stages that raised")
+PARSE_FAILURES = METRICS.counter("parse_failures_total", "Model replies that were not the expected JSON")
+LLM_QUEUE_SECONDS = METRICS.histogram("llm_queue_seconds", "Wait for a model concurrency slot")
+LLM_CALLS = METRICS.counter("llm_calls_total", "Model calls (cache hits excluded)")
+LLM_CACHE_HITS = METRICS.counter("llm_cache_hits_total", "Model calls answered from the response cache")
+LLM_TOKENS = METRICS.counter("llm_tokens_total", "Prompt / completion tokens sent to and received from models")
+LLM_ERRORS = METRICS.counter("llm_errors_total", "Model calls that raised")
+LLM_RETRIES = METRICS.counter("llm_retries_total", "Model calls retried after a 429 / 5xx / connection error")
+LLM_BUSY = METRICS.counter("llm_busy_total", "Calls rejected because the model queue timed out")
+LLM_BUDGET_SECONDS = METRICS.histogram("llm_budget_seconds", "Wait for the model's requests/tokens-per-minute budget")
+LLM_COALESCED = METRICS.counter("llm_coalesced_total", "Calls served by an identical call already in flight")
+ASKS_PREFILLED = METRICS.counter("asks_prefilled_total", "Composite asks filled from the answer to another ask")
+HELPER_CACHE_LOOKUPS = METRICS.counter("helper_cache_lookups_total", "Shareable clarifying questions looked up in the helper cache")
+FLOW_HOPS = METRICS.counter("flow_hops_total", "Goto steps /flow/next followed server-side")
+
+
+def set_turn(**labels):
+    """Tag everything recorded from here on in this request (and tasks it starts) with flow/node/tool."""
+    _turn.set({k: labels.get(k) for k in TURN_LABELS})
+
+
+def turn_labels() -> Dict[str, Any]:
+    return _turn.get()
+
+
+@contextmanager
+def span(stage: str, model: Optional[str] = None, **extra):
+    """Time a block as `stage`; recorded in stage_seconds with the turn labels (+ model)."""
+    t0 = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        dt = time.perf_counter() - t0
+        # labels read at the end: a turn span opens before the session (and so the node) is known
+        labels = {**{k: None for k in TURN_LABELS}, **_turn.get(), "stage": stage, "model": model}
+        METRICS.observe(STAGE_SECONDS, dt, **labels)
+        if error:
+            METRICS.inc(STAGE_ERRORS, stage=stage, error=error)
+        METRICS.log("span", ms=round(dt * 1000, 2), error=error, **labels, **extra)
+
+
+def parse_failure(stage: str, raw: Any = None, error: Any = None):
+    METRICS.inc(PARSE_FAILURES, stage=stage)
+    if METRICS.json_log:
+        METRICS.log("parse_failure", stage=stage, raw=str(raw)[:500] if raw is not None else None,
+                    error=str(error) if error is not None else None, **_turn.get())
+    else:
+        print(f"{stage.upper()}_PARSE_FAIL:", raw if raw is not None else error)
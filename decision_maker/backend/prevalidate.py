@@ -0,0 +1,176 @@
+# backend/prevalidate.py
+"""
+Local pre-validation: cheap rule checks that settle obvious answers before the validator LLM is
+called. Anything not clearly decided returns None and is escalated.
+
+Checks are picked by the ask's `type` (scale_1_5, yesno) and by `criterion.local` in the YAML:
+
+    criterion:
+      rubric: ...
+      local:
+        min_words: 4                      # fewer words in the answer -> insufficient
+        require: [timeframe, evidence]    # a detector finds nothing -> insufficient, else the LLM judges
+
+Criterion checks only ever rule an answer out: a keyword hit says nothing about whether the outcome
+is verifiable ("no proof and no plan" mentions both), so matches go to the validator. They read the
+answer lines only; lines the helper answered as clarifying questions are skipped.
+
+The type checks also normalize values the multi-ask validator fills in for other asks (normalize):
+a scale_1_5 value must come out as one whole number, a yesno value as "yes" or "no".
+
+New checks register with @type_check("ask_type") or @criterion_check("name"); both receive
+(ask, user_text, option_value) and return a verdict or None.
+"""
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+Verdict = Tuple[str, str, str]        # (status, followup, extract), same shape as check_sufficient_llm
+
+TYPE_CHECKS: Dict[str, Callable] = {}
+CRITERION_CHECKS: Dict[str, Callable] = {}
+DETECTORS: Dict[str, re.Pattern] = {
+    "timeframe": re.compile(
+        r"\b(by|before|until|within|in the next|end of|this|next)\s+"
+        r"(\d|jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec|week|month|quarter|year|summer|spring|fall|autumn|winter|q[1-4])"
+        r"|\b(jan|feb|mar|apr|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?\s+\d{1,2}\b"
+        r"|\bq[1-4]\b|\b20\d\d\b|\b\d{1,2}/\d{1,2}(/\d{2,4})?\b"
+        r"|\b\d+\s*(day|week|month|year)s?\b|\bunsure\b",
+        re.I),
+    # deliberately loose: a miss means "insufficient" without asking the LLM, a hit only escalates
+    "evidence": re.compile(
+        r"\b(prov\w*|proof\w*|evidence\w*|shown|show\w*|measur\w*|confirm\w*|verif\w*|demonstrat\w*|track\w*"
+        r"|metric\w*|count\w*|score\w*|result\w*|sign\w*[- ]off|approv\w*|certif\w*|offer\w*|know)\b"
+        r"|\d+\s*%",
+        re.I),
+}
+DETECTOR_HINTS = {
+    "timeframe": "when it should be done by",
+    "evidence": "what would show it happened",
+}
+
+_YES = {"y", "yes", "yep", "yeah", "sure", "true", "correct", "definitely", "absolutely"}
+_NO = {"n", "no", "nope", "nah", "false", "not really", "definitely not"}
+_INT = re.compile(r"(?<![\d.])-?\d+(?:\.\d+)?(?![\d.])")
+
+
+class PrevalidateStats:
+    def __init__(self):
+        self.sufficient = 0
+        self.insufficient = 0
+        self.escalated = 0
+
+    def record(self, verdict: Optional[Verdict]):
+        if verdict is None:
+            self.escalated += 1
+        elif verdict[0] == "sufficient":
+            self.sufficient += 1
+        else:
+            self.insufficient += 1
+
+    def stats(self) -> Dict[str, float]:
+        total = self.sufficient + self.insufficient + self.escalated
+        return {
+            "local_sufficient": self.sufficient,
+            "local_insufficient": self.insufficient,
+            "escalated": self.escalated,
+            "local_share": round((self.sufficient + self.insufficient) / total, 4) if total else 0.0,
+        }
+
+
+STATS = PrevalidateStats()
+
+
+def type_check(ask_type: str):
+    def register(fn):
+        TYPE_CHECKS[ask_type] = fn
+        return fn
+    return register
+
+
+def criterion_check(name: str):
+    def register(fn):
+        CRITERION_CHECKS[name] = fn
+        return fn
+    return register
+
+
+def _examples_hint(ask) -> str:
+    return f" For example: {ask.examples[0]}" if ask.examples else ""
+
+
+@type_check("scale_1_5")
+def _scale(ask, text: str, _opt=None) -> Optional[Verdict]:
+    nums = _INT.findall(text)
+    if len(nums) != 1:
+        return None            # words only ("moderate") or several numbers: let the LLM judge
+    n = float(nums[0])
+    if n.is_integer() and 1 <= n <= 5:
+        return ("sufficient", "", str(int(n)))
+    return ("insufficient", "Please answer with a whole number from 1 to 5.", "")
+
+
+@type_check("yesno")
+def _yesno(ask, text: str, _opt=None) -> Optional[Verdict]:
+    t = text.strip().lower().rstrip(".!")
+    if t in _YES:
+        return ("sufficient", "", "yes")
+    if t in _NO:
+        return ("sufficient", "", "no")
+    return None
+
+
+@criterion_check("min_words")
+def _min_words(ask, text: str, n) -> Optional[Verdict]:
+    if len(text.split()) < int(n):
+        return ("insufficient", "Could you say a bit more so I can pin this down?" + _examples_hint(ask), "")
+    return None
+
+
+@criterion_check("require")
+def _require(ask, text: str, names: List[str]) -> Optional[Verdict]:
+    missing = [n for n in names if n in DETECTORS and not DETECTORS[n].search(text)]
+    if not missing:
+        return None
+    hints = " and ".join(DETECTOR_HINTS.get(n, n) for n in missing)
+    return ("insufficient", f"Could you add {hints}?" + _examples_hint(ask), "")
+
+
+def normalize(ask, value: str) -> Optional[str]:
+    """`value` in the form the ask's type check accepts, or None if it does not fit (asked again later)."""
+    check = TYPE_CHECKS.get(ask.type)
+    if check is None:
+        return value
+    verdict = check(ask, value)
+    return verdict[2] if verdict is not None and verdict[0] == "sufficient" else None
+
+
+def prevalidate(ask, field_chat, truncated: bool = False) -> Optional[Verdict]:
+    """
+    Decide locally if possible. Type checks look at the latest answer line; criterion checks at
+    every answer line for this question (pieces may arrive across turns, as with the LLM judge).
+    `truncated`: older lines were truncated out of field_chat, so a detector miss proves nothing.
+    """
+    user_lines = [m["content"] for m in field_chat if m["role"] == "user" and m.get("kind") != "question"]
+    if not user_lines:
+        return None
+
+    verdict = None
+    if ask.type in TYPE_CHECKS:
+        verdict = TYPE_CHECKS[ask.type](ask, user_lines[-1])
+
+    local = ask.criterion.get("local") or {}
+    if truncated:
+        local = {k: v for k, v in local.items() if k != "require"}
+    if verdict is None and local:
+        text = " ".join(user_lines)
+        # insufficiency checks run first so a too-short answer never passes on a regex hit
+        for name in sorted(local, key=lambda k: k != "min_words"):
+            if name not in CRITERION_CHECKS:
+                continue
+            verdict = CRITERION_CHECKS[name](ask, text, local[name])
+            if verdict is not None:
+                break
+
+    STATS.record(verdict)
+    return verdict
+
@@ -0,0 +1,152 @@
+# backend/semantic_cache.py
+"""
+Near-duplicate cache: reuse a stored reply when a new text is close enough to one seen before.
+
+Texts are embedded locally: content words (stop words dropped, trailing 's' stripped) plus
+down-weighted character 3-grams of those words, hashed into `dim` buckets and L2-normalized. So
+"what counts as evidence of done?" and "what counts as evidence?" are neighbours, while "base case"
+and "best case" are not. Entries live in one preallocated float32 matrix (`max_entries` rows);
+get() scores every row of the text's scope with one matrix-vector product and returns the best
+match at or above `threshold`. When full, the least recently used row is overwritten.
+
+Negation and numbers barely move the embedding ("a measurable goal" vs "a not measurable goal",
+"3 months" vs "6 months") but flip the answer, so each entry also keeps the text's signature: its
+negators and numbers. A match only counts when the signatures are identical.
+
+Scopes keep unrelated entries apart (main.py uses flow id, flow version and ask id).
+"""
+import re
+import threading
+import zlib
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+STOP_WORDS = frozenset("""
+a an the of to for in on at by be is are am was were do does did i me my you your we it this that
+what which how why can could should would will please just so as with about mean means meaning
+here there some any
+""".split())
+_WORD = re.compile(r"[a-z0-9']+")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+NEGATORS = frozenset("not no never none nothing nobody nor neither without cannot".split())
+NUMBER_WORDS = {w: str(i) for i, w in enumerate(
+    "zero one two three four five six seven eight nine ten eleven twelve".split())}
+
+
+def signature(text: str) -> frozenset:
+    """Negators (any n't form counts as "not") and numbers (digits or zero..twelve) in `text`."""
+    sig = set()
+    for w in _WORD.findall(text.lower().replace("’", "'")):
+        if w in NEGATORS:
+            sig.add(w)
+        elif w.endswith("n't") or w in ("dont", "doesnt", "didnt", "isnt", "arent", "cant", "wont"):
+            sig.add("not")
+        elif w in NUMBER_WORDS:
+            sig.add(NUMBER_WORDS[w])
+        else:
+            sig.update(_NUMBER.findall(w))
+    return frozenset(sig)
+
+
+def embed(text: str, dim: int, char_weight: float = 0.35):
+    import numpy as np
+    v = np.zeros(dim, dtype=np.float32)
+    mask = dim - 1
+    for w in _WORD.findall(text.lower().replace("’", "'")):
+        if w in STOP_WORDS:
+            continue
+        if len(w) > 3:
+            w = w.rstrip("s")
+        v[zlib.crc32(("w:" + w).encode("utf-8")) & mask] += 1.0
+        padded = f"<{w}>"
+        for i in range(len(padded) - 2):
+            v[zlib.crc32(("c:" + padded[i:i + 3]).encode("utf-8")) & mask] += char_weight
+    norm = float(np.linalg.norm(v))
+    return v / norm if norm else v
+
+
+class SemanticCache:
+    def __init__(self, max_entries: int = 1024, threshold: float = 0.82, dim: int = 1024):
+        if dim & (dim - 1):
+            raise ValueError("dim must be a power of two")
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.dim = dim
+        self._vecs = None                     # (max_entries, dim) float32, allocated on first put
+        self._used = None                     # last-use tick per row (0 = free)
+        self._rows: Dict[Hashable, List[int]] = {}
+        self._entries: List[Optional[Tuple[Hashable, Any, float, frozenset]]] = [None] * max_entries
+        # (scope, value, cost, signature)
+        self._tick = 0
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0
+
+    def get(self, scope: Hashable, text: str) -> Optional[Tuple[Any, float]]:
+        """(value, similarity) of the closest entry in `scope` at or above the threshold."""
+        self.lookups += 1
+        rows = self._rows.get(scope)
+        if not rows:
+            return None
+        q = embed(text, self.dim)
+        sig = signature(text)
+        with self._lock:
+            rows = self._rows.get(scope)
+            if not rows:
+                return None
+            sims = self._vecs[rows] @ q
+            for best in sims.argsort()[::-1]:
+                sim = float(sims[best])
+                if sim < self.threshold:
+                    return None
+                row = rows[best]
+                if self._entries[row][3] == sig:
+                    break
+            else:
+                return None
+            self._tick += 1
+            self._used[row] = self._tick
+            _, value, cost, _ = self._entries[row]
+        self.hits += 1
+        self.saved_seconds += cost
+        return value, sim
+
+    def put(self, scope: Hashable, text: str, value: Any, cost: float = 0.0):
+        """Store `value` for `text`; `cost` (seconds it took to produce) is credited on every hit."""
+        import numpy as np
+        if self.max_entries <= 0:
+            return
+        v = embed(text, self.dim)
+        if not v.any():
+            return          # nothing but stop words: no meaningful neighbours
+        with self._lock:
+            if self._vecs is None:
+                self._vecs = np.zeros((self.max_entries, self.dim), dtype=np.float32)
+                self._used = np.zeros(self.max_entries, dtype=np.int64)
+            row = int(self._used.argmin())
+            old = self._entries[row]
+            if old is not None:
+                self._rows[old[0]].remove(row)
+                if not self._rows[old[0]]:
+                    del self._rows[old[0]]
+                self.evictions += 1
+            self._tick += 1
+            self._vecs[row] = v
+            self._used[row] = self._tick
+            self._entries[row] = (scope, value, cost, signature(text))
+            self._rows.setdefault(scope, []).append(row)
+
+    def size(self) -> int:
+        return sum(len(r) for r in self._rows.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": self.size(),
+            "scopes": len(self._rows),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+            "evictions": self.evictions,
+            "saved_seconds": round(self.saved_seconds, 3),
+        }
@@ -0,0 +1,194 @@
+# backend/serve.py
+"""
+Prefork server for main.app: one master process, N forked uvicorn workers on one listening socket.
+
+    python serve.py --workers 4 [--host 127.0.0.1] [--port 8000] [--graceful-timeout 30]
+
+The master imports main once (flows compiled, or read from the artifact), runs main.warm_up()
+(intent classifier training, model library imports, token encoders), binds the socket and forks.
+Workers share all of that copy-on-write; gc.freeze() keeps the collector from writing to those
+pages. Each worker reopens its database handles and event-log writer (main.after_fork), builds its
+model clients (main.warm_worker) and serves the inherited socket.
+
+Sessions must be visible to every worker: with more than one worker SESSION_BACKEND defaults to
+sqlite and "memory" is refused, as is EVENT_LOG=file (one appender per file). Workers of one master
+share its cursor key; set FLOW_CURSOR_SECRET when several masters/hosts serve the same clients.
+Caches, metrics and background work stay per worker (a /metrics scrape sees one worker); pending
+axes are mirrored into a store of their own (next to the sessions, outside their key space) so any
+worker can answer /session/{id}/axes.
+
+Flows reload in every worker at once: POST /flows/reload in any worker, SIGHUP to the master, or
+FLOWS_WATCH (polled by the master) makes the master reload its own registry, so workers it forks
+later match, and send SIGHUP to each worker.
+
+SIGTERM / SIGINT to the master: workers stop accepting connections and finish in-flight dialogue
+turns (HTTP and websocket) for up to --graceful-timeout seconds, then exit. A worker that dies
+unexpectedly is replaced.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+
+STOP_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+MASTER_SIGNALS = STOP_SIGNALS + (signal.SIGHUP,)
+
+
+def prepare_env(workers: int):
+    """Settings that must be in place before main is imported."""
+    if workers <= 1:
+        return
+    backend = os.environ.setdefault("SESSION_BACKEND", "sqlite").lower()
+    if backend == "memory":
+        sys.exit("serve.py: SESSION_BACKEND=memory is per process; use sqlite or redis with --workers > 1")
+    if os.getenv("EVENT_LOG", "sqlite").lower() == "file":
+        sys.exit("serve.py: EVENT_LOG=file takes one writer; use sqlite (or off) with --workers > 1")
+    for var in ("OPENBLAS_NUM_THREADS", "OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(var, "1")     # one worker per core already; no BLAS thread pools
+
+
+def bind(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock: socket.socket, args):
+    import uvicorn
+    import main
+
+    class DrainingServer(uvicorn.Server):
+        async def shutdown(self, sockets=None):
+            # stop accepting, let running turns finish, then uvicorn closes the connections
+            for server in self.servers:
+                server.close()
+            if not await main.drain(args.graceful_timeout):
+                print("DRAIN_TIMEOUT:", os.getpid(), main.TURNS_IN_FLIGHT, "turns cut short")
+            await super().shutdown(sockets)
+
+    main.after_fork(master_pid=os.getppid())
+    main.warm_worker()
+    config = uvicorn.Config(main.app, log_level=args.log_level, access_log=args.access_log,
+                            timeout_graceful_shutdown=args.graceful_timeout)
+    DrainingServer(config).run(sockets=[sock])
+
+
+def serve(args):
+    prepare_env(args.workers)
+    import main
+
+    t0 = time.perf_counter()
+    main.warm_up()
+    main.EVENT_LOG.flush()
+    sock = bind(args.host, args.port)
+    gc.collect()
+    gc.freeze()
+    print(f"SERVE: warmed up in {time.perf_counter() - t0:.2f}s; {args.workers} workers on "
+          f"http://{args.host}:{args.port} (master {os.getpid()})", flush=True)
+
+    children = {}           # pid -> start time
+    stopping = 0.0          # monotonic time the stop signal arrived
+    reload_requested = False
+    next_watch = time.monotonic() + main.FLOWS_WATCH
+
+    def spawn():
+        signal.pthread_sigmask(signal.SIG_BLOCK, MASTER_SIGNALS)
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                for sig in STOP_SIGNALS:
+                    signal.signal(sig, signal.SIG_DFL)      # uvicorn installs its own handlers
+                signal.signal(signal.SIGHUP, signal.SIG_IGN)    # until main's startup handles it
+                signal.pthread_sigmask(signal.SIG_UNBLOCK, MASTER_SIGNALS)
+                run_worker(sock, args)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                sys.stdout.flush()
+                os._exit(code)
+        children[pid] = time.monotonic()
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, MASTER_SIGNALS)
+
+    def stop(sig, frame):
+        nonlocal stopping
+        if not stopping:
+            stopping = time.monotonic()
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def request_reload(sig, frame):
+        nonlocal reload_requested
+        reload_requested = True
+
+    def reload_flows():
+        try:
+            report = main.FLOW_REGISTRY.reload()
+            print("FLOWS_RELOADED:" if report["ok"] else "FLOWS_RELOAD_FAIL:",
+                  report["changed"] or report["errors"], flush=True)
+        except Exception as e:
+            print("FLOWS_RELOAD_FAIL:", e, flush=True)
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGHUP)
+            except ProcessLookupError:
+                pass
+
+    for sig in STOP_SIGNALS:
+        signal.signal(sig, stop)
+    signal.signal(signal.SIGHUP, request_reload)
+    for _ in range(args.workers):
+        spawn()
+
+    while children:
+        if not stopping:
+            if main.FLOWS_WATCH > 0 and time.monotonic() >= next_watch:
+                next_watch = time.monotonic() + main.FLOWS_WATCH
+                reload_requested = reload_requested or main.FLOW_REGISTRY.changed()
+            if reload_requested:
+                reload_requested = False
+                reload_flows()
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid == 0:
+            if stopping and time.monotonic() - stopping > args.graceful_timeout + 5:
+                for pid in list(children):
+                    print("WORKER_KILL:", pid)
+                    os.kill(pid, signal.SIGKILL)
+            time.sleep(0.1)
+            continue
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        print("WORKER_EXIT:", pid, os.waitstatus_to_exitcode(status), flush=True)
+        if time.monotonic() - started < 1.0:
+            time.sleep(1.0)         # crashing at startup: don't spin
+        spawn()
+    sock.close()
+    main.EVENT_LOG.close()
+
+
+def cli():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    ap.add_argument("--host", default=os.getenv("HOST", "127.0.0.1"))
+    ap.add_argument("--port", type=int, default=int(os.getenv("PORT", 8000)))
+    ap.add_argument("--graceful-timeout", type=float, default=30.0,
+                    help="seconds a worker waits for running turns on shutdown")
+    ap.add_argument("--log-level", default="warning")
+    ap.add_argument("--access-log", action="store_true")
+    serve(ap.parse_args())
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,237 @@
+# backend/session_store.py
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+def new_session() -> Dict[str, Any]:
+    return {
+        "flow_id": None,
+        "flow_version": None,    # version of the flow this session started on (pinned until it ends)
+        "node_id": None,
+        "awaiting": None,        # ask.id currently being filled
+        "answers": {},
+        "field_chat": [],        # transcript for this ask.id (user + assistant lines)
+        "field_summary": [],     # clipped lines truncated out of field_chat (see transcript.py)
+        "context": {},           # client context for prompt placeholders ({axis}, ...)
+    }
+
+
+class SessionStore:
+    """
+    Session state keyed by session_id. `get` returns None for unknown/expired ids and never
+    allocates; callers mutate the returned dict and hand it back with `put`.
+    """
+    shared = False      # visible to other worker processes
+
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def put(self, session_id: str, sess: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def after_fork(self) -> None:
+        """Reopen per-process handles in a forked worker (serve.py)."""
+
+    def delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    def size(self) -> int:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self).__name__,
+            "size": self.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _count(self, sess):
+        if sess is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return sess
+
+
+class MemorySessionStore(SessionStore):
+    """Process-local LRU with idle TTL. Oldest session is evicted once max_size is reached."""
+
+    def __init__(self, max_size: int = 10_000, ttl: Optional[float] = 6 * 3600):
+        super().__init__(ttl)
+        self.max_size = max_size
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()   # id -> (touched_at, sess)
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(session_id)
+            if item is not None and self.ttl and now - item[0] > self.ttl:
+                del self._data[session_id]
+                self.evictions += 1
+                item = None
+            if item is not None:
+                self._data[session_id] = (now, item[1])
+                self._data.move_to_end(session_id)
+            return self._count(item[1] if item else None)
+
+    def put(self, session_id, sess):
+        with self._lock:
+            self._data[session_id] = (time.monotonic(), sess)
+            self._data.move_to_end(session_id)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, session_id):
+        with self._lock:
+            self._data.pop(session_id, None)
+
+    def size(self):
+        return len(self._data)
+
+
+class SqliteSessionStore(SessionStore):
+    """File-backed store; several workers on one host can share the same database file."""
+    shared = True
+
+    def __init__(self, path: str, max_size: Optional[int] = None, ttl: Optional[float] = 6 * 3600,
+                 evict_every: float = 30.0, table: str = "sessions"):
+        super().__init__(ttl)
+        self.table = table
+        self.max_size = max_size
+        self.path = path
+        self.evict_every = evict_every      # seconds between eviction sweeps (max_size may overshoot in between)
+        self._next_evict = 0.0
+        self._connect()
+        self._db.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (id TEXT PRIMARY KEY, data TEXT NOT NULL, touched REAL NOT NULL)")
+        self._db.execute(f"CREATE INDEX IF NOT EXISTS {table}_touched ON {table} (touched)")
+
+    def _connect(self):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+
+    def after_fork(self):
+        self._connect()         # a SQLite handle must not be used across fork
+
+    def get(self, session_id):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(f"SELECT data, touched FROM {self.table} WHERE id = ?", (session_id,)).fetchone()
+            if row is not None and self.ttl and now - row[1] > self.ttl:
+                self._db.execute(f"DELETE FROM {self.table} WHERE id = ?", (session_id,))
+                self.evictions += 1
+                row = None
+            if row is not None:
+                self._db.execute(f"UPDATE {self.table} SET touched = ? WHERE id = ?", (now, session_id))
+        return self._count(json.loads(row[0]) if row else None)
+
+    def put(self, session_id, sess):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                f"INSERT INTO {self.table} (id, data, touched) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET data = excluded.data, touched = excluded.touched",
+                (session_id, json.dumps(sess), now),
+            )
+            if time.monotonic() >= self._next_evict:
+                self._evict(now)
+
+    def _evict(self, now):
+        # periodic sweep: both deletes walk the touched index from the oldest end
+        self._next_evict = time.monotonic() + self.evict_every
+        if self.ttl:
+            cur = self._db.execute(f"DELETE FROM {self.table} WHERE touched < ?", (now - self.ttl,))
+            self.evictions += max(cur.rowcount, 0)
+        if self.max_size:
+            excess = self._db.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0] - self.max_size
+            if excess > 0:
+                cur = self._db.execute(
+                    f"DELETE FROM {self.table} WHERE id IN (SELECT id FROM {self.table} ORDER BY touched LIMIT ?)", (excess,))
+                self.evictions += max(cur.rowcount, 0)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._db.execute(f"DELETE FROM {self.table} WHERE id = ?", (session_id,))
+
+    def size(self):
+        with self._lock:
+            return self._db.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Store on any Redis-protocol server. `client` only needs get/set(ex=)/expire/delete and
+    zadd/zrem/zcard/zremrangebyscore, so a local stand-in (e.g. fakeredis) works for tests.
+    Expiry is left to the server's TTL; a sorted set of last-touched times keeps size() off the keyspace.
+    """
+    shared = True
+
+    def __init__(self, client=None, url: str = "redis://localhost:6379/0",
+                 ttl: Optional[float] = 6 * 3600, prefix: str = "dm:session:"):
+        super().__init__(ttl)
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.index = prefix.rstrip(":") + "s:touched"
+
+    def get(self, session_id):
+        key = self.prefix + session_id
+        raw = self.client.get(key)
+        if raw is not None and self.ttl:
+            self.client.expire(key, int(self.ttl))   # sliding TTL, like the other backends
+            self.client.zadd(self.index, {session_id: time.time()})
+        return self._count(json.loads(raw) if raw is not None else None)
+
+    def put(self, session_id, sess):
+        self.client.set(self.prefix + session_id, json.dumps(sess), ex=int(self.ttl) if self.ttl else None)
+        self.client.zadd(self.index, {session_id: time.time()})
+
+    def delete(self, session_id):
+        self.client.delete(self.prefix + session_id)
+        self.client.zrem(self.index, session_id)
+
+    def size(self):
+        if self.ttl:    # drop index entries whose keys the server has expired
+            self.evictions += self.client.zremrangebyscore(self.index, "-inf", time.time() - self.ttl) or 0
+        return self.client.zcard(self.index)
+
+
+def make_session_store(name: str = "sessions") -> SessionStore:
+    """
+    Build the store from env:
+      SESSION_BACKEND = memory (default) | sqlite | redis
+      SESSION_MAX_SIZE, SESSION_TTL (seconds, 0 disables), SESSION_DB (sqlite path), REDIS_URL
+    `name` keeps other per-session records (e.g. background axes) out of the sessions' key space and
+    size limit: its own sqlite table / redis prefix.
+    """
+    backend = os.getenv("SESSION_BACKEND", "memory").lower()
+    ttl = float(os.getenv("SESSION_TTL", 6 * 3600)) or None
+    max_size = int(os.getenv("SESSION_MAX_SIZE", 10_000)) or None
+
+    if backend == "sqlite":
+        path = os.getenv("SESSION_DB", os.path.join(os.path.dirname(__file__), "sessions.db"))
+        return SqliteSessionStore(path, max_size=max_size, ttl=ttl, table=name)
+    if backend == "redis":
+        return RedisSessionStore(url=os.getenv("REDIS_URL", "redis://localhost:6379/0"), ttl=ttl,
+                                 prefix="dm:session:" if name == "sessions" else f"dm:{name}:")
+    if backend != "memory":
+        raise ValueError(f"unknown SESSION_BACKEND: {backend}")
+    return MemorySessionStore(max_size=max_size or 10_000, ttl=ttl)
@@ -0,0 +1,117 @@
+# backend/speculative.py
+"""
+Speculative background work per session: start an LLM call as soon as its inputs are known,
+and pick the result up later (end-of-flow reply, GET endpoint) without blocking a turn on it.
+
+Work is keyed by (session_id, name). Finished results outlive the session for `ttl` seconds so
+clients can fetch them after a flow closes.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class _Entry:
+    __slots__ = ("task", "input_key", "created")
+
+    def __init__(self, task: asyncio.Task, input_key: Hashable):
+        self.task = task
+        self.input_key = input_key
+        self.created = time.monotonic()
+
+
+class SpeculativeWork:
+    def __init__(self, ttl: float = 900, max_entries: int = 10_000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self.started = 0
+        self.used_ready = 0         # result was already there when asked for
+        self.used_waited = 0        # caller had to wait for it
+        self.missed = 0             # not ready within the caller's wait
+
+    def start(self, session_id: str, name: str, factory: Callable[[], Awaitable[Any]],
+              input_key: Hashable = None) -> asyncio.Task:
+        """Start `factory()` in the background unless the same work (same input_key) already exists."""
+        self._expire()
+        key = (session_id, name)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.input_key == input_key:
+                return entry.task
+            entry.task.cancel()      # inputs changed; the old result would be stale
+
+        task = asyncio.create_task(factory())
+        self._entries[key] = _Entry(task, input_key)
+        self._entries.move_to_end(key)
+        self.started += 1
+        while len(self._entries) > self.max_entries:
+            _, old = self._entries.popitem(last=False)
+            old.task.cancel()
+        return task
+
+    def status(self, session_id: str, name: str) -> str:
+        entry = self._entries.get((session_id, name))
+        if entry is None:
+            return "missing"
+        if not entry.task.done():
+            return "pending"
+        if entry.task.cancelled() or entry.task.exception() is not None:
+            return "error"
+        return "ready"
+
+    def on_done(self, session_id: str, name: str, fn: Callable[[str, Any], None]):
+        """Call fn(status, result) when the work finishes ("ready" | "error"; at once if it has)."""
+        entry = self._entries.get((session_id, name))
+        if entry is None:
+            return
+
+        def report(task: asyncio.Task):
+            if task.cancelled() or task.exception() is not None:
+                fn("error", None)
+            else:
+                fn("ready", task.result())
+        entry.task.add_done_callback(report)
+
+    def peek(self, session_id: str, name: str) -> Optional[Any]:
+        """Result if ready, else None."""
+        if self.status(session_id, name) != "ready":
+            return None
+        return self._entries[(session_id, name)].task.result()
+
+    async def wait(self, session_id: str, name: str, timeout: float) -> Optional[Any]:
+        """Result if ready within `timeout` seconds, else None (the work keeps running)."""
+        entry = self._entries.get((session_id, name))
+        if entry is None:
+            return None
+        if entry.task.done():
+            self.used_ready += 1
+            return self.peek(session_id, name)
+        try:
+            await asyncio.wait_for(asyncio.shield(entry.task), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.missed += 1
+            return None
+        except Exception:
+            return None
+        self.used_waited += 1
+        return self.peek(session_id, name)
+
+    def _expire(self):
+        now = time.monotonic()
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if now - entry.created <= self.ttl:
+                break
+            entry.task.cancel()
+            del self._entries[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "started": self.started,
+            "used_ready": self.used_ready,
+            "used_waited": self.used_waited,
+            "missed": self.missed,
+        }
@@ -0,0 +1,126 @@
+# backend/transcript.py
+"""
+Bounded per-question transcripts for validator/helper prompts.
+
+`field_chat` keeps the last turns verbatim. Once the rendered transcript goes over the model's
+token budget, the oldest turns are truncated: each one is clipped to a single line and moved to
+`field_summary` (the stored key predates the name; nothing is summarized), which keeps only its
+newest lines within its own budget and drops the rest. Token counts are taken once per line and
+kept as running totals, so truncation does not re-tokenize the transcript.
+"""
+import os
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+DEFAULT_BUDGETS = {"gpt-4o-mini": 1500, "gpt-4o": 3000}
+
+
+@lru_cache(maxsize=8)
+def _encoder(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:      # encoding files are downloaded on first use; offline hosts estimate
+        print("TIKTOKEN_UNAVAILABLE:", repr(e))
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """tiktoken count when available, else the usual ~4 chars/token estimate."""
+    if not text:
+        return 0
+    enc = _encoder(model)
+    if enc is None:
+        return max(1, len(text) // 4)
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def _lines(field_chat: List[Dict[str, str]]) -> List[str]:
+    return [f'{m["role"].upper()}: {m["content"]}' for m in field_chat]
+
+
+def render_lines(field_chat: List[Dict[str, str]]) -> str:
+    return "\n".join(_lines(field_chat))
+
+
+def render_known_answers(answers: Optional[Dict[str, Any]], max_chars: int = 160) -> str:
+    """`key: value` lines with every value clipped the same way; 'None' when empty."""
+    pairs = []
+    for k, v in (answers or {}).items():
+        if not v:
+            continue
+        sv = str(v)
+        if len(sv) > max_chars:
+            sv = sv[:max_chars - 3] + "..."
+        pairs.append(f"{k}: {sv}")
+    return "\n".join(pairs) if pairs else "None"
+
+
+class TranscriptManager:
+    """
+    Budgets are prompt tokens allowed for the transcript section, per model name
+    (TRANSCRIPT_BUDGET_<MODEL> env overrides, e.g. TRANSCRIPT_BUDGET_GPT_4O_MINI=800).
+    """
+
+    def __init__(self, budgets: Optional[Dict[str, int]] = None, keep_last: int = 6,
+                 clipped_budget: int = 300, line_chars: int = 160, default_budget: int = 1500):
+        self.budgets = dict(DEFAULT_BUDGETS, **(budgets or {}))
+        self.keep_last = keep_last
+        self.clipped_budget = clipped_budget
+        self.line_chars = line_chars
+        self.default_budget = default_budget
+        self.truncated_turns = 0
+        self.tokens_truncated = 0     # verbatim tokens removed from prompts by truncation
+
+    def budget(self, model: str) -> int:
+        env = os.getenv("TRANSCRIPT_BUDGET_" + model.upper().replace("-", "_").replace(".", "_"))
+        return int(env) if env else self.budgets.get(model, self.default_budget)
+
+    def truncate(self, sess: Dict[str, Any], model: str) -> None:
+        """Move the oldest turns of sess['field_chat'] into clipped lines while over budget."""
+        chat = sess["field_chat"]
+        if len(chat) <= self.keep_last:
+            return
+        budget = self.budget(model)
+        clipped = list(sess.get("field_summary") or [])
+        chat_tokens = [count_tokens(line, model) + 1 for line in _lines(chat)]
+        clipped_tokens = [count_tokens(line, model) + 1 for line in clipped]
+        total = sum(chat_tokens) + sum(clipped_tokens)
+        if total <= budget:
+            return
+
+        kept = sum(clipped_tokens)
+        while len(chat) > self.keep_last and total > budget:
+            m = chat.pop(0)
+            n = chat_tokens.pop(0)
+            self.truncated_turns += 1
+            self.tokens_truncated += n
+            text = " ".join(m["content"].split())
+            if len(text) > self.line_chars:
+                text = text[:self.line_chars - 3] + "..."
+            line = f'{m["role"]}: {text}'
+            clipped.append(line)
+            clipped_tokens.append(count_tokens(line, model) + 1)
+            kept += clipped_tokens[-1]
+            while len(clipped) > 1 and kept > self.clipped_budget:
+                clipped.pop(0)
+                kept -= clipped_tokens.pop(0)
+            total = sum(chat_tokens) + kept
+        sess["field_summary"] = clipped
+
+    def render(self, sess: Dict[str, Any]) -> str:
+        """Transcript text for a prompt: clipped older turns, then verbatim recent turns."""
+        recent = render_lines(sess["field_chat"])
+        clipped = sess.get("field_summary") or []
+        if not clipped:
+            return recent or "EMPTY"
+        return "EARLIER (truncated):\n- " + "\n- ".join(clipped) + "\n\nRECENT:\n" + (recent or "EMPTY")
+
+    def stats(self) -> Dict[str, int]:
+        return {"truncated_turns": self.truncated_turns, "tokens_truncated": self.tokens_truncated}
@@ -3,6 +3,8 @@
 
 import { useEffect, useLayoutEffect, useMemo, useRef, useState } from "react";
 import { useSearchParams } from "next/navigation";
+import { dialogueSocket, socketEnabled } from "./dialogueSocket";
+import { DEFAULT_AXES } from "./tools/axes/Axes";
 
 export default function LLMDialog({
   tool = "purpose_finder",
@@ -17,6 +19,20 @@ export default function LLMDialog({
   const isGoalTool = tool === "smart-goal";
   const currentAxis = isGoalTool ? "" : (sp.get("axis") || "");
 
+  // flow prompts like "THIS decision about {axis}" are filled server-side from this context
+  const [axisLabels, setAxisLabels] = useState({});
+  useEffect(() => {
+    const onUpdate = (e) => {
+      const list = Array.isArray(e.detail) ? e.detail : [];
+      setAxisLabels((prev) => ({ ...prev, ...Object.fromEntries(list.map((a) => [a.key, a.label])) }));
+    };
+    window.addEventListener("axes:update", onUpdate);
+    return () => window.removeEventListener("axes:update", onUpdate);
+  }, []);
+  const promptContext = currentAxis
+    ? { axis: axisLabels[currentAxis] || DEFAULT_AXES.find((a) => a.id === currentAxis)?.label || currentAxis }
+    : null;
+
   const rid = () =>
     (typeof crypto !== "undefined" && crypto.randomUUID)
       ? crypto.randomUUID()
@@ -41,6 +57,21 @@ export default function LLMDialog({
   const [thinking, setThinking] = useState(false);
   const [err, setErr] = useState("");
 
+  // this panel's channel on the shared dialogue socket; background axes arrive as pushes
+  const channelRef = useRef(null);
+  if (!channelRef.current) channelRef.current = `panel_${rid()}`;
+  useEffect(() => {
+    if (!socketEnabled()) return;
+    const sock = dialogueSocket(API_URL);
+    const channel = channelRef.current;
+    const off = sock.subscribe(channel, (ev) => {
+      if (ev.type === "axes" && ev.status === "ready") {
+        window.dispatchEvent(new CustomEvent("axes:update", { detail: ev.axes || [] }));
+      }
+    });
+    return () => { off(); sock.close(channel); };
+  }, [API_URL]);
+
   const listRef = useRef(null);
   useEffect(() => {
     const el = listRef.current;
@@ -173,18 +204,14 @@ export default function LLMDialog({
 
     (async () => {
       try {
-        const res = await fetch(`${API_URL}/dialogue`, {
-          method: "POST",
-          headers: { "Content-Type": "application/json" },
-          body: JSON.stringify({
-            session_id: "current",
-            message: "__init__",
-            history: [],
-            tool,
-            system_override: systemOverride || null,
-          }),
+        const { data } = await runTurn({
+          session_id: "current",
+          message: "__init__",
+          history: [],
+          tool,
+          system_override: systemOverride || null,
+          context: promptContext,
         });
-        const data = await res.json();
         const opener = typeof data?.reply === "string" ? data.reply : "What decision are we working on?";
 
         if (!alive.v) return;
@@ -219,6 +246,83 @@ export default function LLMDialog({
   // tiny flag helper
   function TrueFlag(){ return { v: true }; }
 
+  // Parse a text/event-stream body into JSON events ("data: {...}\n\n")
+  async function* readSSE(res) {
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buf = "";
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buf += decoder.decode(value, { stream: true });
+      let sep;
+      while ((sep = buf.indexOf("\n\n")) !== -1) {
+        const frame = buf.slice(0, sep);
+        buf = buf.slice(sep + 2);
+        const payload = frame
+          .split("\n")
+          .filter((l) => l.startsWith("data:"))
+          .map((l) => l.slice(5).trimStart())
+          .join("\n");
+        if (payload) yield JSON.parse(payload);
+      }
+    }
+  }
+
+  // POST /dialogue/stream: same events as the socket, one request per turn
+  async function postTurn(body, onToken) {
+    const res = await fetch(`${API_URL}/dialogue/stream`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify(body),
+    });
+    if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+    for await (const ev of readSSE(res)) {
+      if (ev.type === "token") onToken?.(ev.text);
+      else if (ev.type === "done") return ev;
+      else if (ev.type === "error") throw new Error(ev.error || "stream error");
+    }
+    throw new Error("stream ended early");
+  }
+
+  // One turn over the shared socket, or over HTTP if the socket can't be opened.
+  // Resolves with { data: done event, pushed: axes will arrive as a socket push }.
+  async function runTurn(body, onToken) {
+    if (socketEnabled()) {
+      let streamed = false;
+      try {
+        const data = await dialogueSocket(API_URL).turn(channelRef.current, body, (t) => {
+          streamed = true;
+          onToken?.(t);
+        });
+        return { data, pushed: true };
+      } catch (e) {
+        // server-side turn errors are final; a lost connection mid-turn can't be retried safely
+        if (e?.message !== "websocket unavailable" || streamed) throw e;
+      }
+    }
+    return { data: await postTurn(body, onToken), pushed: false };
+  }
+
+  // Axes are extracted in the background; poll until they land, then broadcast them
+  async function pollAxes(sessionId, tries = 20, delayMs = 1500) {
+    for (let i = 0; i < tries; i++) {
+      await new Promise((r) => setTimeout(r, delayMs));
+      try {
+        const res = await fetch(`${API_URL}/session/${encodeURIComponent(sessionId)}/axes`);
+        if (!res.ok) return;
+        const data = await res.json();
+        if (data.status === "ready") {
+          window.dispatchEvent(new CustomEvent("axes:update", { detail: data.axes || [] }));
+          return;
+        }
+        if (data.status !== "pending") return;
+      } catch {
+        return;
+      }
+    }
+  }
+
   function toBackendHistory(msgs) {
     return msgs
       .filter((m) => m.role === "user" || m.role === "assistant")
@@ -251,22 +355,37 @@ export default function LLMDialog({
         history: toBackendHistory(msgsNow),
         tool,
         system_override: systemOverride || null,
+        context: promptContext,
       };
-      const res = await fetch(`${API_URL}/dialogue`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify(body),
+
+      // Stream tokens into a single assistant bubble as they arrive
+      const replyId = rid();
+      let streamed = "";
+      let started = false;
+      const upsertReply = (textNow) => {
+        if (!started) {
+          started = true;
+          setThinking(false);
+          setSelectedMessages((prev) => [...prev, { id: replyId, role: "assistant", text: textNow }]);
+        } else {
+          setSelectedMessages((prev) => prev.map((m) => (m.id === replyId ? { ...m, text: textNow } : m)));
+        }
+      };
+
+      const { data, pushed } = await runTurn(body, (chunk) => {
+        streamed += chunk;
+        upsertReply(streamed);
       });
-      if (!res.ok) throw new Error(`HTTP ${res.status}`);
-      const data = await res.json();
 
-      // Broadcast axes if present
-      if (Array.isArray(data?.axes)) {
+      // Broadcast axes if present (over the socket, pending axes are pushed when ready)
+      if (data?.axes_pending) {
+        if (!pushed) pollAxes(body.session_id);
+      } else if (Array.isArray(data?.axes)) {
         window.dispatchEvent(new CustomEvent("axes:update", { detail: data.axes }));
       }
 
       const reply = typeof data?.reply === "string" ? data.reply : JSON.stringify(data);
-      setSelectedMessages((prev) => [...prev, { role: "assistant", text: reply }]);
+      upsertReply(reply);
     } catch (e) {
       setErr(e?.message || "Failed to contact LLM backend.");
       setSelectedMessages((prev) => [
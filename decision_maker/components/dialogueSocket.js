@@ -0,0 +1,110 @@
+// components/dialogueSocket.js
+// One websocket per page for every dialogue panel (backend /ws). Each panel is a "channel";
+// the server keeps the channel's session, tool and history between turns, so a turn only sends
+// the message (plus the binding and history the first time on a connection). Server pushes that
+// are not part of a turn (background axes) go to subscribe() listeners.
+//
+// Set NEXT_PUBLIC_DIALOGUE_TRANSPORT=http to keep the per-turn POST /dialogue(/stream) path.
+
+const sockets = new Map(); // ws url -> DialogueSocket
+
+class DialogueSocket {
+  constructor(url) {
+    this.url = url;
+    this.ws = null;
+    this.connecting = null;
+    this.nextId = 0;
+    this.pending = new Map(); // turn id -> { resolve, reject, onToken }
+    this.bound = new Map();   // channel -> binding key sent on this connection
+    this.listeners = new Map(); // channel -> Set(handler)
+  }
+
+  connect() {
+    if (this.ws && this.ws.readyState === WebSocket.OPEN) return Promise.resolve(this);
+    if (this.connecting) return this.connecting;
+    this.connecting = new Promise((resolve, reject) => {
+      const ws = new WebSocket(this.url);
+      ws.onopen = () => {
+        this.ws = ws;
+        this.connecting = null;
+        resolve(this);
+      };
+      ws.onmessage = (m) => {
+        try { this.dispatch(JSON.parse(m.data)); } catch { /* ignore malformed frames */ }
+      };
+      ws.onerror = () => {
+        if (this.connecting) { this.connecting = null; reject(new Error("websocket unavailable")); }
+      };
+      ws.onclose = () => {
+        if (this.ws === ws) this.ws = null;
+        this.connecting = null;
+        // the server drops channel state with the connection: rebind on the next turn
+        this.bound.clear();
+        for (const p of this.pending.values()) p.reject(new Error("connection closed"));
+        this.pending.clear();
+      };
+    });
+    return this.connecting;
+  }
+
+  dispatch(ev) {
+    const p = ev.id != null ? this.pending.get(ev.id) : null;
+    if (p) {
+      if (ev.type === "token") {
+        p.onToken?.(ev.text);
+      } else if (ev.type === "done") {
+        this.pending.delete(ev.id);
+        p.resolve(ev);
+      } else if (ev.type === "error") {
+        this.pending.delete(ev.id);
+        p.reject(Object.assign(new Error(ev.error || "turn failed"), { retryAfter: ev.retry_after }));
+      }
+      return;
+    }
+    for (const h of this.listeners.get(ev.channel) || []) h(ev);
+  }
+
+  // Run one turn on `channel`; resolves with the `done` event (same body as POST /dialogue).
+  async turn(channel, { session_id, tool, system_override = null, message, history, context }, onToken) {
+    await this.connect();
+    const id = ++this.nextId;
+    const key = JSON.stringify([session_id, tool, system_override]);
+    const frame = { type: "turn", channel, id, message };
+    if (context) frame.context = context;
+    if (this.bound.get(channel) !== key) {
+      Object.assign(frame, { session_id, tool, system_override });
+      if (history) frame.history = history;
+      this.bound.set(channel, key);
+    }
+    return new Promise((resolve, reject) => {
+      this.pending.set(id, { resolve, reject, onToken });
+      this.ws.send(JSON.stringify(frame));
+    });
+  }
+
+  close(channel) {
+    this.bound.delete(channel);
+    this.listeners.delete(channel);
+    if (this.ws && this.ws.readyState === WebSocket.OPEN) {
+      this.ws.send(JSON.stringify({ type: "close", channel }));
+    }
+  }
+
+  // Server pushes for `channel` (e.g. {type: "axes", axes, status}); returns an unsubscribe fn.
+  subscribe(channel, handler) {
+    if (!this.listeners.has(channel)) this.listeners.set(channel, new Set());
+    this.listeners.get(channel).add(handler);
+    return () => this.listeners.get(channel)?.delete(handler);
+  }
+}
+
+export function socketEnabled() {
+  return typeof WebSocket !== "undefined" && process.env.NEXT_PUBLIC_DIALOGUE_TRANSPORT !== "http";
+}
+
+// Shared socket for an API base URL (http(s)://host -> ws(s)://host/ws).
+export function dialogueSocket(apiUrl) {
+  const url = apiUrl.replace(/^http/, "ws") + "/ws";
+  if (!sockets.has(url)) sockets.set(url, new DialogueSocket(url));
+  return sockets.get(url);
+}